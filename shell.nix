@@ -10,7 +10,12 @@ pkgs.mkShell {
     python3Packages.requests        # For downloading PDFs
     python3Packages.python-dotenv   # For loading .env files
     python3Packages.networkx        # For graph manipulation
+    python3Packages.numpy           # Concept embedding index (vector search)
     python3Packages.openai          # For LLM interaction (initial choice)
+    python3Packages.pdf2image       # For rendering PDF pages for the Vision LLM
+    python3Packages.pillow          # Image encoding for rendered pages
+    python3Packages.pyarrow         # Parquet/Arrow output of 'export'
+    poppler_utils                   # pdftoppm backend used by pdf2image
 
     # AI coding assistant
     aider-chat
@@ -21,6 +26,7 @@ pkgs.mkShell {
 
     # Development Tools from nixpkgs
     black                           # Code formatter
+    python3Packages.pytest          # Unit tests in tests/
     ruff                            # Linter
     git
 
@@ -1,12 +1,13 @@
 import re
 import sys
-from typing import List, Tuple, Optional, Dict
+from typing import List, Optional, Dict
 
 # Expected format for paper specifiers in the batch file:
 # y<YYYY>p<XX>
 # y[<YYYY>-<YYYY>]p<XX>
 # y<YYYY>p[<XX>-<XX>]
 # y[<YYYY>-<YYYY>]p[<XX>-<XX>]
+# Optional question suffix: ...q<ZZ> or ...q[<ZZ>-<ZZ>] (e.g., y2022p06q[01-03])
 # Optional course hint: "Course Name: y<YYYY>p<XX>"
 
 # Regex to capture the course hint and the main specifier part
@@ -15,7 +16,8 @@ LINE_PATTERN = re.compile(r"^(?:([^:]+):\s*)?(.*)$")
 # Regex to parse the paper specifier part (e.g., y2022p06 or y[2020-2022]p[01-03])
 SPECIFIER_PATTERN = re.compile(
     r"y(?:(\d{4})|\[(\d{4})-(\d{4})\])"  # Year or Year Range
-    r"p(?:(\d{1,2})|\[(\d{1,2})-(\d{1,2})\])",  # Paper or Paper Range
+    r"p(?:(\d{1,2})|\[(\d{1,2})-(\d{1,2})\])"  # Paper or Paper Range
+    r"(?:q(?:(\d{1,2})|\[(\d{1,2})-(\d{1,2})\]))?",  # Optional Question or Question Range
     re.IGNORECASE,
 )
 
@@ -44,10 +46,12 @@ def parse_batch_file_line(line: str) -> List[Dict[str, any]]:
     - "y[<YYYY>-<YYYY>]p<XX>"
     - "y<YYYY>p[<XX>-<XX>]"
     - "y[<YYYY>-<YYYY>]p[<XX>-<XX>]"
+    - any of the above followed by "q<ZZ>" or "q[<ZZ>-<ZZ>]"
     - "Optional Course Hint: <specifier>"
 
     Returns:
-        A list of dictionaries, each containing 'year', 'paper_code', 
+        A list of dictionaries, each containing 'year', 'paper_code',
+        'question_num' (e.g. "q01", or None if no question was specified)
         and 'course_hint' (which can be None).
         Returns an empty list if parsing fails for the line.
     """
@@ -68,16 +72,19 @@ def parse_batch_file_line(line: str) -> List[Dict[str, any]]:
     spec_match = SPECIFIER_PATTERN.fullmatch(specifier_str.strip())
     if not spec_match:
         print(f"Warning: Invalid paper specifier format: '{specifier_str}' in line: '{line}'", file=sys.stderr)
-        print("Expected format like: yYYYYpXX or y[YYYY-YYYY]p[XX-XX]", file=sys.stderr)
+        print("Expected format like: yYYYYpXX, y[YYYY-YYYY]p[XX-XX] or yYYYYpXXq[ZZ-ZZ]", file=sys.stderr)
         return []
 
     year_single, year_range_start, year_range_end, \
-    paper_single, paper_range_start, paper_range_end = spec_match.groups()
+    paper_single, paper_range_start, paper_range_end, \
+    question_single, question_range_start, question_range_end = spec_match.groups()
 
     years = _parse_range(year_single, year_range_start, year_range_end)
     papers = _parse_range(paper_single, paper_range_start, paper_range_end)
+    has_question_spec = bool(question_single or question_range_start)
+    questions = _parse_range(question_single, question_range_start, question_range_end)
 
-    if not years or not papers:
+    if not years or not papers or (has_question_spec and not questions):
         print(f"Warning: Could not extract valid years or papers from specifier: '{specifier_str}'", file=sys.stderr)
         return []
 
@@ -86,11 +93,14 @@ def parse_batch_file_line(line: str) -> List[Dict[str, any]]:
         for paper_val in papers:
             # Format paper_code consistently (e.g., p6 -> p06)
             paper_code = f"p{paper_val:02d}"
-            parsed_items.append({
-                "year": year_val,
-                "paper_code": paper_code,
-                "course_hint": course_hint
-            })
+            # Without a question suffix we still emit one item per paper
+            for question_val in (questions if has_question_spec else [None]):
+                parsed_items.append({
+                    "year": year_val,
+                    "paper_code": paper_code,
+                    "question_num": f"q{question_val:02d}" if question_val is not None else None,
+                    "course_hint": course_hint
+                })
     
     return parsed_items
 
@@ -104,7 +114,8 @@ def load_batch_file(filepath: str) -> List[Dict[str, any]]:
 
     Returns:
         A list of all parsed paper specifications from the file.
-        Each item is a dictionary: {'year': int, 'paper_code': str, 'course_hint': Optional[str]}
+        Each item is a dictionary: {'year': int, 'paper_code': str,
+        'question_num': Optional[str], 'course_hint': Optional[str]}
     """
     all_paper_specs = []
     try:
@@ -138,6 +149,8 @@ if __name__ == '__main__':
         "  ",
         "Operating Systems: y[2022-2021]p01", # Invalid year range
         "Further Topics: y2020p99", # Valid format, specific paper
+        "Data Science: y2022p06q[01-03]", # Question range
+        "y2021p04q7", # Single question
     ]
 
     print("--- Testing parse_batch_file_line ---")
@@ -161,7 +174,7 @@ if __name__ == '__main__':
     if all_specs:
         print(f"Total paper specifications loaded: {len(all_specs)}")
         for i, spec in enumerate(all_specs):
-            print(f"  {i+1}. Year: {spec['year']}, Paper: {spec['paper_code']}, Hint: {spec['course_hint']}")
+            print(f"  {i+1}. Year: {spec['year']}, Paper: {spec['paper_code']}, Question: {spec['question_num']}, Hint: {spec['course_hint']}")
     else:
         print("No specifications loaded from dummy file.")
     
@@ -0,0 +1,746 @@
+import contextlib
+import csv
+import functools
+import http.client
+import json
+import os
+import platform
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+import networkx as nx
+from concurrent.futures import ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from . import config, downloader, exporter, graph_store, llm_extractor, metrics, page_optimizer, query_api
+
+# End-to-end benchmark harness: builds a synthetic corpus of solutions PDFs,
+# serves it from a local stand-in for the CL solutions site, runs the pipeline
+# stages against it with the deterministic fake extractor, and writes timings
+# as a JSON baseline that can be compared between commits.
+
+DEFAULT_SIZES = (10, 100, 500)
+STAGES = (
+    "download",
+    "process",
+    "render",
+    "stream_extract",
+    "page_optimize",
+    "graph_load",
+    "compact_load",
+    "query_api",
+    "graph_save",
+    "export",
+    "visualize",
+)
+QUERY_REQUESTS = 1000
+# PDFs whose rendered pages go through the page optimizer (rendering is simulated)
+PAGE_OPTIMIZE_PDFS = 50
+# Worker counts the page rendering stage is timed at; 'render' reports the largest
+RENDER_WORKERS = (1, 2, 4)
+# PDFs extracted through the stand-in's streaming chat completions endpoint
+STREAM_PDFS = 10
+# Shape of the synthetic graph for the export comparison ('benchmark --export-edges')
+EXPORT_QUESTIONS_PER_PAPER = 10
+EXPORT_CONCEPTS_PER_QUESTION = 8
+
+
+def make_synthetic_pdf(lines: list[str], pages: int = 2) -> bytes:
+    """Builds a small but valid multi-page PDF containing the given text lines on each page."""
+    objects = []  # object bodies; object number = index + 1
+    page_ids = [3 + 2 * i for i in range(pages)]
+    font_id = 3 + 2 * pages
+
+    objects.append(b"<< /Type /Catalog /Pages 2 0 R >>")
+    kids = " ".join(f"{pid} 0 R" for pid in page_ids)
+    objects.append(f"<< /Type /Pages /Kids [{kids}] /Count {pages} >>".encode())
+    for i, page_id in enumerate(page_ids):
+        text_ops = ["BT", "/F1 11 Tf", "14 TL", "72 770 Td"]
+        for line in [f"Page {i + 1}"] + lines:
+            escaped = line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+            text_ops.append(f"({escaped}) Tj T*")
+        text_ops.append("ET")
+        stream = "\n".join(text_ops).encode("latin-1", "replace")
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            f"/Resources << /Font << /F1 {font_id} 0 R >> >> /Contents {page_id + 1} 0 R >>".encode()
+        )
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+    objects.append(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+
+    out = bytearray(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref_offset = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        out += b"%010d 00000 n \n" % offset
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref_offset)
+    return bytes(out)
+
+
+def make_synthetic_pages(lines: list[str], pages: int, rng: random.Random) -> list:
+    """
+    Draws page images like pdf2image would render a scanned solutions PDF at 150 dpi.
+
+    Each PDF starts with an identical cover sheet (some repeat it before a later
+    part), text sits inside wide white margins, and some PDFs have a trailing
+    blank page. Requires Pillow.
+    """
+    from PIL import Image, ImageDraw
+
+    width, height = 1240, 1754  # A4 at 150 dpi
+    cover = Image.new("RGB", (width, height), "white")
+    draw = ImageDraw.Draw(cover)
+    draw.text((480, 300), "UNIVERSITY OF CAMBRIDGE", fill="black")
+    draw.text((500, 340), "Computer Science Tripos", fill="black")
+    draw.rectangle((300, 260, 940, 400), outline="black", width=3)
+    images = [cover]
+    for page in range(pages):
+        image = Image.new("RGB", (width, height), "white")
+        draw = ImageDraw.Draw(image)
+        for j, line in enumerate(lines[: rng.randint(8, len(lines))]):
+            draw.text((150, 180 + 28 * j), f"{page + 1}.{j} {line}", fill=(20, 20, 20))
+        images.append(image)
+        if page < pages - 1 and rng.random() < 0.3:
+            images.append(cover)
+    if rng.random() < 0.5:
+        images.append(Image.new("RGB", (width, height), "white"))
+    return images
+
+
+def _run_page_optimizer(count: int, seed: int = 0) -> dict:
+    """Optimizes synthetic rendered pages of `count` PDFs. Returns timing and token totals."""
+    rng = random.Random(seed)
+    lines = [" ".join(rng.choice("abcdefgh") * 4 for _ in range(12)) for _ in range(30)]
+    page_sets = [make_synthetic_pages(lines, rng.randint(1, 4), rng) for _ in range(count)]
+    totals = {"tokens_before": 0, "tokens_after": 0, "pages_in": 0, "pages_out": 0}
+    start = time.perf_counter()
+    for pages in page_sets:
+        _, report = page_optimizer.optimize_pages(pages)
+        for key in totals:
+            totals[key] += report[key]
+    totals["seconds"] = time.perf_counter() - start
+    return totals
+
+
+def generate_corpus(corpus_dir: str, count: int, seed: int = 0) -> list[dict]:
+    """
+    Writes `count` synthetic solutions PDFs laid out as <corpus_dir>/<year>/<YYYY-pXX-qYY-solutions.pdf>.
+
+    Returns:
+        The corpus manifest: dicts with 'year', 'paper_code', 'question_num' and 'filename'.
+    """
+    rng = random.Random(seed)
+    manifest = []
+    for i in range(count):
+        year = 2000 + (i // 100) % 25
+        paper_code = f"p{(i // 10) % 10 + 1:02d}"
+        question_num = f"q{i % 10 + 1:02d}"
+        filename = f"{year}-{paper_code}-{question_num}-solutions.pdf"
+        year_dir = os.path.join(corpus_dir, str(year))
+        os.makedirs(year_dir, exist_ok=True)
+        lines = [f"Solution to {year} {paper_code} {question_num}"]
+        lines += [f"Step {j}: " + " ".join(rng.choice("abcdefgh") * 4 for _ in range(10)) for j in range(20)]
+        with open(os.path.join(year_dir, filename), "wb") as f:
+            f.write(make_synthetic_pdf(lines, pages=rng.randint(1, 4)))
+        manifest.append(
+            {"year": year, "paper_code": paper_code, "question_num": question_num, "filename": filename}
+        )
+    return manifest
+
+
+class _StandInHandler(BaseHTTPRequestHandler):
+    """
+    Serves <corpus_dir>/<year>/<file> with configurable 403/404/corrupt/slow/flaky responses,
+    and POST .../chat/completions as a fake streaming (SSE) LLM endpoint.
+    """
+
+    def do_GET(self):
+        server = self.server
+        filename = os.path.basename(self.path)
+        with server.lock:
+            server.request_count += 1
+            failures_left = server.flaky.get(filename, 0)
+            if failures_left:
+                server.flaky[filename] = failures_left - 1
+        if server.outage or failures_left:
+            self._send(503, b"Service Unavailable", "text/plain")
+            return
+        if filename in server.slow:
+            time.sleep(server.slow_delay)
+        if filename in server.forbidden:
+            self._send(403, b"<html><body>Raven login required</body></html>", "text/html")
+            return
+        if filename in server.corrupt:
+            self._send(200, b"\x00" * 2048, "application/octet-stream")
+            return
+        path = os.path.join(server.corpus_dir, *self.path.strip("/").split("/")[-2:])
+        if filename in server.missing or not os.path.isfile(path):
+            self._send(404, b"Not Found", "text/plain")
+            return
+        with open(path, "rb") as f:
+            self._send(200, f.read(), "application/pdf")
+
+    def do_POST(self):
+        """
+        Streams the fake extractor's concepts for the 'Source file:' named in the prompt.
+
+        The answer is a fenced JSON list sent a few characters per event, with
+        `token_delay` seconds between events. For file names in `truncated` the
+        stream stops partway through with finish_reason "length". When the request
+        asks for usage (stream_options.include_usage), a last event with empty
+        choices reports it: one completion token per event and a rough four
+        characters per prompt token.
+        """
+        server = self.server
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        if not self.path.endswith("/chat/completions") or not body.get("stream"):
+            self._send(404, b"Not Found", "text/plain")
+            return
+        with server.lock:
+            server.request_count += 1
+        match = re.search(r"Source file: ([\w.-]+)", json.dumps(body["messages"]))
+        filename = match.group(1) if match else "unknown.pdf"
+        answer = "```json\n" + json.dumps(llm_extractor.fake_extract_concepts(filename), indent=2) + "\n```"
+        finish_reason = "stop"
+        if filename in server.truncated:
+            answer, finish_reason = answer[: len(answer) * 3 // 5], "length"
+        # Chunked transfer encoding, like real APIs: clients see each event as it is sent
+        self.protocol_version = "HTTP/1.1"
+        try:
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            for start in range(0, len(answer), 6):
+                event = {"choices": [{"index": 0, "delta": {"content": answer[start : start + 6]}, "finish_reason": None}]}
+                self._send_chunk(f"data: {json.dumps(event)}\n\n")
+                time.sleep(server.token_delay)
+            event = {"choices": [{"index": 0, "delta": {}, "finish_reason": finish_reason}]}
+            self._send_chunk(f"data: {json.dumps(event)}\n\n")
+            if (body.get("stream_options") or {}).get("include_usage"):
+                prompt_tokens = len(json.dumps(body["messages"])) // 4
+                usage = {"prompt_tokens": prompt_tokens, "completion_tokens": -(-len(answer) // 6)}
+                usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+                self._send_chunk(f"data: {json.dumps({'choices': [], 'usage': usage})}\n\n")
+            self._send_chunk("data: [DONE]\n\n")
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def _send_chunk(self, text: str):
+        data = text.encode()
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+
+    def _send(self, status: int, body: bytes, content_type: str):
+        try:
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # The client gave up (e.g., its read timeout expired on a slow response)
+
+    def log_message(self, format, *args):
+        pass  # Keep benchmark output clean
+
+
+class StandInServer:
+    """
+    Local HTTP stand-in for the CL solutions site, run in a background thread.
+
+    Use as a context manager; `base_url` is suitable for config.CL_SOLUTIONS_BASE_URL.
+    File names in `forbidden` get 403 (like an expired cookie), in `missing` get 404,
+    in `corrupt` get a 200 response that is not a PDF, and in `slow` are delayed by
+    `slow_delay` seconds before responding. `flaky` maps file names to how many
+    requests for them fail with 503 before one succeeds; setting `httpd.outage`
+    makes every request fail with 503. `base_url` + "/v1" is suitable for
+    config.OPENAI_BASE_URL: streamed answers are cut off for names in `truncated`.
+    """
+
+    def __init__(
+        self,
+        corpus_dir: str,
+        forbidden=(),
+        missing=(),
+        slow=(),
+        slow_delay: float = 0.2,
+        corrupt=(),
+        flaky: dict = None,
+        truncated=(),
+        token_delay: float = 0.0005,
+    ):
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), _StandInHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.corpus_dir = corpus_dir
+        self.httpd.forbidden = set(forbidden)
+        self.httpd.missing = set(missing)
+        self.httpd.corrupt = set(corrupt)
+        self.httpd.flaky = dict(flaky or {})
+        self.httpd.outage = False
+        self.httpd.truncated = set(truncated)
+        self.httpd.token_delay = token_delay
+        self.httpd.lock = threading.Lock()
+        self.httpd.slow = set(slow)
+        self.httpd.slow_delay = slow_delay
+        self.httpd.request_count = 0
+        self.base_url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+@contextlib.contextmanager
+def _patched_config(**overrides):
+    """Temporarily overrides attributes of the config module."""
+    saved = {name: getattr(config, name) for name in overrides}
+    for name, value in overrides.items():
+        setattr(config, name, value)
+    try:
+        yield
+    finally:
+        for name, value in saved.items():
+            setattr(config, name, value)
+
+
+def _timed(fn) -> float:
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def _render_pages(pdf_path: str, cache_dir: str) -> int:
+    """Process-pool entry point for _run_render_scaling. Returns the number of pages written."""
+    return len(llm_extractor.prepare_pdf_pages(pdf_path, cache_dir))
+
+
+def _run_render_scaling(paths: list[str], work_dir: str, worker_counts=RENDER_WORKERS) -> dict:
+    """
+    Renders and encodes the pages of `paths` with prepare_pdf_pages at each worker count.
+
+    This is the CPU-bound work extract_concepts_batch spreads over its process
+    pool (the fake backend skips it). Every run starts from an empty page cache.
+
+    Returns:
+        {'seconds': {workers: seconds}, 'speedup': {workers: serial seconds / seconds},
+        'pages': pages rendered per run}, with worker counts as strings.
+    """
+    seconds = {}
+    pages = 0
+    for workers in worker_counts:
+        cache_dir = os.path.join(work_dir, f"page-cache-{workers}")
+        start = time.perf_counter()
+        if workers <= 1:
+            pages = sum(_render_pages(path, cache_dir) for path in paths)
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                pages = sum(executor.map(_render_pages, paths, [cache_dir] * len(paths)))
+        seconds[str(workers)] = time.perf_counter() - start
+    serial = seconds[str(min(worker_counts))]
+    return {
+        "seconds": seconds,
+        "speedup": {workers: round(serial / elapsed, 2) for workers, elapsed in seconds.items()},
+        "pages": pages,
+    }
+
+
+def _run_stream_extract(paths: list[str], corpus_dir: str, truncated: set) -> dict:
+    """
+    Extracts `paths` through the stand-in's streaming endpoint.
+
+    Returns the total seconds, the mean seconds to the first concept, and
+    whether every answer matched the fake backend (the truncated ones must be a
+    non-empty prefix of it).
+    """
+    first_latencies = []
+    matches = True
+    with StandInServer(corpus_dir, truncated=truncated) as server, _patched_config(
+        LLM_BACKEND="openai", OPENAI_BASE_URL=f"{server.base_url}/v1", OPENAI_API_KEY="benchmark"
+    ):
+        start = time.perf_counter()
+        for path in paths:
+            began = time.perf_counter()
+            concepts = []
+            for concept in llm_extractor.stream_concepts_from_pdf(path):
+                if not concepts:
+                    first_latencies.append(time.perf_counter() - began)
+                concepts.append(concept)
+            expected = llm_extractor.fake_extract_concepts(path)
+            if os.path.basename(path) in truncated:
+                matches &= 0 < len(concepts) < len(expected) and concepts == expected[: len(concepts)]
+            else:
+                matches &= concepts == expected
+        elapsed = time.perf_counter() - start
+    return {
+        "seconds": elapsed,
+        "first_concept": sum(first_latencies) / len(first_latencies) if first_latencies else None,
+        "matches": matches,
+    }
+
+
+def _run_queries(graph_path: str, count: int = QUERY_REQUESTS) -> float:
+    """
+    Serves `graph_path` with query_api on an ephemeral port and issues `count` GETs over one connection.
+
+    Returns the seconds taken by the requests, including loading the graph and
+    building the index on the first one (server start/stop is not counted).
+    """
+    index = query_api.GraphIndex(graph_store.load_graph(graph_path), "bench")
+    paths = ["/concepts?limit=50", "/papers", "/courses", "/courses/Unknown/top?k=10"]
+    paths += [f"/questions?concept={c['name']}".replace(" ", "%20") for c in index.by_frequency[:20]]
+    service = query_api.QueryService(query_api.file_source(graph_path))
+    httpd = query_api.make_server(service, "127.0.0.1", 0)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    try:
+        conn = http.client.HTTPConnection(*httpd.server_address[:2])
+        start = time.perf_counter()
+        for i in range(count):
+            conn.request("GET", paths[i % len(paths)])
+            conn.getresponse().read()
+        elapsed = time.perf_counter() - start
+        conn.close()
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+    return elapsed
+
+
+def make_synthetic_graph(edges: int, seed: int = 0) -> nx.DiGraph:
+    """
+    Builds a concept graph with about `edges` PART_OF and MENTIONS edges: papers of
+    EXPORT_QUESTIONS_PER_PAPER questions, each mentioning EXPORT_CONCEPTS_PER_QUESTION
+    concepts drawn from a vocabulary with a long tail. CO_OCCURS edges are left out
+    so the edge count is what is asked for.
+    """
+    rng = random.Random(seed)
+    num_questions = max(1, edges // (EXPORT_CONCEPTS_PER_QUESTION + 1))
+    num_concepts = max(EXPORT_CONCEPTS_PER_QUESTION, num_questions // 5)
+    courses = [f"Course {i}" for i in range(40)]
+    concept_ids = [f"concept_synthetic_{i}" for i in range(num_concepts)]
+    # Zipf-like popularity: concept i is mentioned about 1/(i+1) as often as concept 0
+    cum_weights = []
+    total = 0.0
+    for i in range(num_concepts):
+        total += 1.0 / (i + 1)
+        cum_weights.append(total)
+
+    graph = nx.DiGraph()
+    graph.add_nodes_from(
+        (
+            concept_id,
+            {"type": "Concept", "name": f"synthetic {i}", "definition": f"Synthetic definition of concept {i}."},
+        )
+        for i, concept_id in enumerate(concept_ids)
+    )
+    for q in range(num_questions):
+        paper_num, question_num = divmod(q, EXPORT_QUESTIONS_PER_PAPER)
+        year, paper = 1990 + paper_num // 100, paper_num % 100
+        paper_code = f"{year}-p{paper:02d}"
+        paper_id = f"paper_{year}_p{paper:02d}"
+        question_id = f"q_{year}_p{paper:02d}_q{question_num + 1:02d}"
+        if question_num == 0:
+            graph.add_node(paper_id, type="Paper", code=paper_code, year=year, tripos_part="Unknown")
+        graph.add_node(question_id, type="Question", number=f"{question_num + 1:02d}", course=rng.choice(courses))
+        graph.add_edge(question_id, paper_id, type="PART_OF")
+        mentioned = set()
+        while len(mentioned) < EXPORT_CONCEPTS_PER_QUESTION:
+            mentioned.update(rng.choices(concept_ids, cum_weights=cum_weights, k=EXPORT_CONCEPTS_PER_QUESTION - len(mentioned)))
+        graph.add_edges_from(((question_id, concept_id) for concept_id in mentioned), type="MENTIONS")
+    return graph
+
+
+def _dir_bytes(path: str) -> int:
+    return sum(entry.stat().st_size for entry in os.scandir(path) if entry.is_file())
+
+
+def benchmark_export(edges: int, work_dir: str, seed: int = 0) -> dict:
+    """
+    Compares GraphML with the columnar export on a synthetic graph of `edges` edges.
+
+    Returns:
+        Seconds for 'graphml_save', 'graphml_load' (NetworkX, what analysts used
+        to load), 'compact_load' (the streaming load 'export' starts with) and
+        per available export format 'export_<fmt>' (writing only) and
+        'read_<fmt>' (loading every table back), plus 'graphml_bytes' and '<fmt>_bytes'.
+    """
+    graph_path = os.path.join(work_dir, "export-scale.graphml")
+    results = _save_synthetic_graph(edges, graph_path, seed)
+    results["graphml_bytes"] = os.path.getsize(graph_path)
+    results["graphml_load"] = _timed(lambda: graph_store.load_graph(graph_path))
+
+    loaded = {}
+    results["compact_load"] = _timed(lambda: loaded.update(compact=graph_store.load_compact_graph(graph_path)))
+    for fmt in exporter.available_formats():
+        export_dir = os.path.join(work_dir, f"export-scale-{fmt}")
+        manifest = {}
+        results[f"export_{fmt}"] = _timed(
+            functools.partial(_export_into, manifest, loaded["compact"], export_dir, fmt)
+        )
+        results[f"{fmt}_bytes"] = _dir_bytes(export_dir)
+        results[f"read_{fmt}"] = _timed(functools.partial(_read_export, export_dir, manifest))
+    return results
+
+
+def _export_into(manifest: dict, compact, export_dir: str, fmt: str):
+    """Exports `compact` and fills `manifest` with the written manifest (left empty on failure)."""
+    manifest.update(exporter.export_graph(compact, export_dir, fmt) or {})
+
+
+def _save_synthetic_graph(edges: int, path: str, seed: int) -> dict:
+    """Builds and saves the synthetic graph; it is freed on return, before the loads are timed."""
+    graph = make_synthetic_graph(edges, seed=seed)
+    return {
+        "nodes": graph.number_of_nodes(),
+        "edges": graph.number_of_edges(),
+        "graphml_save": _timed(lambda: graph_store.save_graph(graph, path)),
+    }
+
+
+def _read_export(export_dir: str, manifest: dict):
+    """Loads every exported table the way an analyst would (whole tables, or all CSV rows)."""
+    for table in manifest.get("tables", {}).values():
+        for name in table["files"]:
+            path = os.path.join(export_dir, name)
+            if manifest["format"] == "parquet":
+                exporter.pq.read_table(path)
+            elif manifest["format"] == "arrow":
+                exporter.feather.read_table(path)
+            else:
+                with open(path, newline="", encoding="utf-8") as f:
+                    for _ in csv.reader(f):
+                        pass
+
+
+def benchmark_size(size: int, work_dir: str, seed: int = 0) -> dict:
+    """Runs every stage once against a fresh corpus of `size` PDFs. Returns {stage: seconds}."""
+    corpus_dir = os.path.join(work_dir, "corpus")
+    manifest = generate_corpus(corpus_dir, size, seed=seed)
+    rng = random.Random(seed)
+    names = [item["filename"] for item in manifest]
+    # Roughly 5% corrupt bodies, 5% 404s, 5% transient 503s (retried) and 2% slow
+    # responses, chosen deterministically. (A 403 would stop the whole run as an
+    # authentication failure, see downloader.auth_failed.)
+    corrupt = set(rng.sample(names, max(1, size // 20)))
+    flaky = {name: 1 for name in rng.sample(names, max(1, size // 20))}
+    missing = set(rng.sample(names, max(1, size // 20)))
+    slow = set(rng.sample(names, max(1, size // 50)))
+    graph_path = os.path.join(work_dir, "graph.graphml")
+    os.makedirs("downloads", exist_ok=True)
+    results = {"items": size}
+
+    downloader.reset_auth_failure()
+    downloader.reset_circuit_breakers()
+    with StandInServer(
+        corpus_dir, missing=missing, slow=slow, corrupt=corrupt, flaky=flaky
+    ) as server, _patched_config(
+        CL_SOLUTIONS_BASE_URL=server.base_url,
+        CL_AUTH_COOKIE="benchmark",
+        LLM_BACKEND="fake",
+        DOWNLOAD_BACKOFF_BASE=0.01,
+    ):
+        downloaded = []
+
+        def run_download():
+            for item in manifest:
+                path = downloader.download_pdf(item["year"], item["paper_code"], item["question_num"])
+                if path:
+                    downloaded.append((item, path))
+
+        results["download"] = _timed(run_download)
+        results["downloaded"] = len(downloaded)
+        results["http_requests"] = server.httpd.request_count
+
+    items_by_path = {path: item for item, path in downloaded}
+
+    def run_process():
+        extracted = list(llm_extractor.extract_concepts_batch(list(items_by_path), workers=1))
+
+        def apply_changes(graph):
+            for path, concepts in extracted:
+                graph_store.ingest_extraction(graph, items_by_path[path], concepts)
+
+        graph_store.commit_changes(apply_changes, graph_path)
+
+    with _patched_config(LLM_BACKEND="fake"):
+        results["process"] = _timed(run_process)
+
+    if llm_extractor.convert_from_path is not None:
+        render = _run_render_scaling(sorted(items_by_path), work_dir)
+        results["render"] = render["seconds"][str(max(RENDER_WORKERS))]
+        results["render_seconds"] = render["seconds"]
+        results["render_speedup"] = render["speedup"]
+        results["pages_rendered"] = render["pages"]
+    else:
+        results["render"] = None  # pdf2image not installed
+
+    stream_paths = sorted(items_by_path)[:STREAM_PDFS]
+    stream = _run_stream_extract(stream_paths, corpus_dir, truncated={os.path.basename(p) for p in stream_paths[:1]})
+    results["stream_extract"] = stream["seconds"]
+    results["stream_first_concept"] = stream["first_concept"]
+    results["stream_matches_fake"] = stream["matches"]
+
+    if page_optimizer.available():
+        pages = _run_page_optimizer(min(size, PAGE_OPTIMIZE_PDFS), seed=seed)
+        results["page_optimize"] = pages["seconds"]
+        results["vision_tokens_before"] = pages["tokens_before"]
+        results["vision_tokens_after"] = pages["tokens_after"]
+        results["pages_kept"] = f"{pages['pages_out']}/{pages['pages_in']}"
+    else:
+        results["page_optimize"] = None  # Pillow not installed
+
+    graph = graph_store.load_graph(graph_path)
+    results["graph_nodes"] = graph.number_of_nodes()
+    results["graph_edges"] = graph.number_of_edges()
+    results["graph_load"] = _timed(lambda: graph_store.load_graph(graph_path))
+    results["compact_load"] = _timed(lambda: graph_store.load_compact_graph(graph_path))
+    results["query_api"] = _run_queries(graph_path)
+    results["query_rps"] = round(QUERY_REQUESTS / results["query_api"], 1)
+    results["graph_save"] = _timed(lambda: graph_store.save_graph(graph, graph_path))
+    export_dir = os.path.join(work_dir, "export")
+    results["export"] = _timed(
+        lambda: exporter.export_graph(graph_store.load_compact_graph(graph_path), export_dir)
+    )
+
+    try:
+        from .cli import render_visualization
+
+        results["visualize"] = _timed(
+            lambda: render_visualization(graph, os.path.join(work_dir, "graph.html"))
+        )
+    except ImportError:
+        results["visualize"] = None  # pyvis not installed
+    return results
+
+
+def run_benchmarks(sizes=DEFAULT_SIZES, seed: int = 0, keep_dir: str = None, export_edges: int = None) -> dict:
+    """
+    Benchmarks all stages at each corpus size.
+
+    Args:
+        sizes: Corpus sizes (number of question PDFs) to run.
+        seed: Seed for the synthetic corpus and failure injection.
+        keep_dir: If given, work in this directory and keep the artifacts; otherwise use a temp dir.
+        export_edges: If given, also compare GraphML with the columnar export on a
+            synthetic graph of this many edges (see benchmark_export).
+
+    Returns:
+        A baseline dict: {'meta': {...}, 'results': {str(size): {stage: seconds, ...}}},
+        plus 'export_scale' with the benchmark_export results if `export_edges` was given.
+    """
+    baseline = {
+        "meta": {
+            "created_at": time.time(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "seed": seed,
+        },
+        "results": {},
+    }
+    original_cwd = os.getcwd()
+    with contextlib.ExitStack() as stack:
+        root = keep_dir or stack.enter_context(tempfile.TemporaryDirectory(prefix="ppa-bench-"))
+        # Recording graph history would add to every timed save depending on the local .env
+        stack.enter_context(_patched_config(GRAPH_HISTORY=False))
+        for size in sizes:
+            work_dir = os.path.abspath(os.path.join(root, f"size-{size}"))
+            os.makedirs(work_dir, exist_ok=True)
+            # downloader writes to ./downloads, so run each size in its own directory
+            os.chdir(work_dir)
+            print(f"Benchmarking corpus of {size} PDF(s)...", file=sys.stderr)
+            metrics.reset()
+            try:
+                with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                    result = benchmark_size(size, work_dir, seed=seed)
+            finally:
+                os.chdir(original_cwd)
+            result["metrics"] = metrics.snapshot()
+            baseline["results"][str(size)] = result
+        if export_edges:
+            print(f"Benchmarking export of a {export_edges}-edge graph...", file=sys.stderr)
+            baseline["export_scale"] = benchmark_export(export_edges, os.path.abspath(root), seed=seed)
+    return baseline
+
+
+def compare(baseline: dict, current: dict, threshold: float = 0.2, min_delta: float = 0.01) -> list[str]:
+    """
+    Compares two benchmark results.
+
+    Returns:
+        Human-readable lines for every stage that got slower than the baseline by
+        more than `threshold` (a fraction, e.g. 0.2 for 20%) and by at least
+        `min_delta` seconds, so timer noise on tiny stages is not reported.
+    """
+    regressions = []
+    for size, stages in current.get("results", {}).items():
+        base_stages = baseline.get("results", {}).get(size)
+        if not base_stages:
+            continue
+        for stage in STAGES:
+            new, old = stages.get(stage), base_stages.get(stage)
+            if not new or not old:
+                continue
+            if new > old * (1 + threshold) and new - old >= min_delta:
+                regressions.append(
+                    f"size {size}: {stage} {old:.3f}s -> {new:.3f}s (+{100 * (new / old - 1):.0f}%)"
+                )
+    return regressions
+
+
+def format_results(results: dict) -> str:
+    """Renders benchmark results as a plain-text table."""
+    header = f"{'size':>6} " + " ".join(f"{stage:>11}" for stage in STAGES)
+    rows = [header]
+    for size, stages in results["results"].items():
+        cells = []
+        for stage in STAGES:
+            value = stages.get(stage)
+            cells.append(f"{value:>10.3f}s" if value is not None else f"{'n/a':>11}")
+        rows.append(f"{size:>6} " + " ".join(cells))
+    for size, stages in results["results"].items():
+        if stages.get("render_speedup"):
+            speedups = ", ".join(f"{w} worker(s) {x:.2f}x" for w, x in stages["render_speedup"].items())
+            rows.append(f"Render speed-up for {size} PDF(s): {speedups}")
+    scale = results.get("export_scale")
+    if scale:
+        rows.append(f"Export of {scale['nodes']} nodes / {scale['edges']} edges:")
+        rows.append(
+            f"  {'graphml':<8} save {scale['graphml_save']:8.3f}s  load {scale['graphml_load']:8.3f}s"
+            f"  {scale['graphml_bytes'] / 2**20:9.1f} MiB"
+        )
+        rows.append(f"  {'compact':<8} load {scale['compact_load']:8.3f}s")
+        for fmt in exporter.FORMATS:
+            if f"export_{fmt}" in scale:
+                rows.append(
+                    f"  {fmt:<8} save {scale[f'export_{fmt}']:8.3f}s  read {scale[f'read_{fmt}']:8.3f}s"
+                    f"  {scale[f'{fmt}_bytes'] / 2**20:9.1f} MiB"
+                )
+    return "\n".join(rows)
+
+
+def save_results(results: dict, path: str):
+    """Writes benchmark results as JSON."""
+    out_dir = os.path.dirname(path)
+    if out_dir:
+        os.makedirs(out_dir, exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+
+
+# Example usage (for direct testing):
+# if __name__ == '__main__':
+#     results = run_benchmarks(sizes=(10,))
+#     print(format_results(results))
@@ -0,0 +1,243 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import time
+from typing import Callable
+from . import config
+
+# Persistent catalogue of the downloads directory, so "which PDFs are new" is an
+# indexed query rather than a directory walk plus filename parsing.
+#
+# One row per (year, paper_code, question_num) with the file's path, size, mtime,
+# SHA-256 and processing state. The downloader records every file it writes,
+# process/ingest/watch mark files processed once the graph containing them is
+# saved, and `scan` reconciles the table with the directory for files that
+# arrived some other way (copied in by hand, downloaded before the catalogue).
+
+logger = logging.getLogger(__name__)
+
+STATE_DOWNLOADED = "downloaded"  # On disk, not yet in the graph
+STATE_PROCESSED = "processed"
+STATE_FAILED = "failed"  # Extraction returned nothing
+STATE_MISSING = "missing"  # Catalogued, but no longer on disk
+STATES = (STATE_DOWNLOADED, STATE_PROCESSED, STATE_FAILED, STATE_MISSING)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    year INTEGER NOT NULL,
+    paper_code TEXT NOT NULL,
+    question_num TEXT NOT NULL,
+    path TEXT NOT NULL,
+    size INTEGER,
+    mtime REAL,
+    sha256 TEXT,
+    state TEXT NOT NULL,
+    graph_path TEXT,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (year, paper_code, question_num)
+);
+CREATE INDEX IF NOT EXISTS files_state ON files (state, updated_at);
+CREATE INDEX IF NOT EXISTS files_path ON files (path);
+"""
+
+_HASH_CHUNK_SIZE = 1 << 20
+
+
+def connect(path: str = config.CATALOGUE_DB_PATH) -> sqlite3.Connection:
+    """Opens (and if necessary creates) the catalogue database."""
+    db_dir = os.path.dirname(path)
+    if db_dir:
+        os.makedirs(db_dir, exist_ok=True)
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row
+    conn.executescript(_SCHEMA)
+    return conn
+
+
+def file_sha256(path: str) -> str:
+    """Returns the hex SHA-256 of the file at `path`."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _key(metadata: dict) -> tuple:
+    return int(metadata["year"]), metadata["paper_code"], metadata["question_num"]
+
+
+def mark(
+    conn: sqlite3.Connection,
+    entries: list[tuple[dict, str]],
+    state: str,
+    graph_path: str = None,
+    sha256: str = None,
+):
+    """
+    Records the current size, mtime and state of each file.
+
+    The hash is only recomputed for files whose size or mtime changed since they
+    were last catalogued. Marking a file STATE_DOWNLOADED keeps its current state
+    if its hash is unchanged (e.g., an already processed file downloaded again).
+
+    Args:
+        conn: Open catalogue connection.
+        entries: (metadata, path) pairs; metadata holds 'year', 'paper_code', 'question_num'.
+        state: One of STATES.
+        graph_path: For STATE_PROCESSED, the graph the files were merged into.
+        sha256: Known hash of the file (only when `entries` has a single entry, e.g. from the downloader).
+    """
+    now = time.time()
+    rows = []
+    for metadata, path in entries:
+        key = _key(metadata)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            logger.warning("Cannot catalogue %s: file not found.", path)
+            continue
+        digest = sha256
+        if digest is None:
+            known = conn.execute(
+                "SELECT size, mtime, sha256 FROM files WHERE year = ? AND paper_code = ? AND question_num = ? AND path = ?",
+                (*key, path),
+            ).fetchone()
+            if known and known["size"] == stat.st_size and known["mtime"] == stat.st_mtime and known["sha256"]:
+                digest = known["sha256"]
+            else:
+                digest = file_sha256(path)
+        rows.append((*key, path, stat.st_size, stat.st_mtime, digest, state, graph_path, now))
+    with conn:
+        conn.executemany(
+            "INSERT INTO files (year, paper_code, question_num, path, size, mtime, sha256, state, graph_path, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (year, paper_code, question_num) DO UPDATE SET "
+            "path = excluded.path, size = excluded.size, mtime = excluded.mtime, sha256 = excluded.sha256, "
+            f"state = CASE WHEN excluded.state = '{STATE_DOWNLOADED}' AND excluded.sha256 = files.sha256 "
+            f"AND files.state != '{STATE_MISSING}' THEN files.state ELSE excluded.state END, "
+            "graph_path = COALESCE(excluded.graph_path, graph_path), "
+            "updated_at = excluded.updated_at",
+            rows,
+        )
+
+
+def set_state(conn: sqlite3.Connection, entries: list[dict], state: str):
+    """Changes the state of catalogued files without re-reading them; entries hold 'year', 'paper_code', 'question_num'."""
+    now = time.time()
+    with conn:
+        conn.executemany(
+            "UPDATE files SET state = ?, updated_at = ? WHERE year = ? AND paper_code = ? AND question_num = ?",
+            [(state, now, *_key(entry)) for entry in entries],
+        )
+
+
+def record_download(conn: sqlite3.Connection, metadata: dict, path: str, sha256: str = None):
+    """Records a freshly downloaded file as new (needing processing), unless the same bytes were already catalogued."""
+    mark(conn, [(metadata, path)], STATE_DOWNLOADED, sha256=sha256)
+
+
+def scan(
+    conn: sqlite3.Connection,
+    directory: str,
+    parse_filename: Callable[[str], dict | None],
+    is_processed: Callable[[dict], bool] = None,
+) -> dict[str, int]:
+    """
+    Reconciles the catalogue with the PDFs in `directory`.
+
+    Only files that are not catalogued yet, or whose size or mtime changed, are
+    parsed and hashed. Changed files go back to STATE_DOWNLOADED unless their
+    hash is unchanged. Catalogued files that are gone become STATE_MISSING.
+
+    Args:
+        conn: Open catalogue connection.
+        directory: Directory to scan (not recursive; dot-files are skipped).
+        parse_filename: Returns metadata for a filename, or None (see cli.parse_filename).
+        is_processed: Optional predicate telling whether a newly found file's
+            question is already in the graph; such files are catalogued as processed.
+
+    Returns:
+        Counts of 'added', 'changed', 'unchanged', 'missing' and 'unparsed' files.
+    """
+    known = {
+        row["path"]: row
+        for row in conn.execute("SELECT year, paper_code, question_num, path, size, mtime, sha256, state FROM files")
+    }
+    counts = {"added": 0, "changed": 0, "unchanged": 0, "missing": 0, "unparsed": 0}
+    seen = set()
+    now = time.time()
+    rows = []
+    try:
+        entries = list(os.scandir(directory))
+    except FileNotFoundError:
+        entries = []
+    for entry in entries:
+        if entry.name.startswith(".") or not entry.name.lower().endswith(".pdf") or not entry.is_file():
+            continue
+        stat = entry.stat()
+        row = known.get(entry.path)
+        seen.add(entry.path)
+        if row is not None and row["size"] == stat.st_size and row["mtime"] == stat.st_mtime:
+            if row["state"] == STATE_MISSING:
+                rows.append((row["year"], row["paper_code"], row["question_num"], entry.path, stat.st_size, stat.st_mtime, row["sha256"], STATE_DOWNLOADED, now))
+            counts["unchanged"] += 1
+            continue
+        metadata = parse_filename(entry.name)
+        if metadata is None:
+            counts["unparsed"] += 1
+            continue
+        digest = file_sha256(entry.path)
+        if row is None:
+            state = STATE_PROCESSED if is_processed and is_processed(metadata) else STATE_DOWNLOADED
+            counts["added"] += 1
+        else:
+            state = row["state"] if digest == row["sha256"] and row["state"] != STATE_MISSING else STATE_DOWNLOADED
+            counts["changed"] += 1
+        rows.append((*_key(metadata), entry.path, stat.st_size, stat.st_mtime, digest, state, now))
+
+    gone = [path for path, row in known.items() if path not in seen and row["state"] != STATE_MISSING]
+    counts["missing"] = len(gone)
+    with conn:
+        conn.executemany(
+            "INSERT INTO files (year, paper_code, question_num, path, size, mtime, sha256, state, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (year, paper_code, question_num) DO UPDATE SET "
+            "path = excluded.path, size = excluded.size, mtime = excluded.mtime, sha256 = excluded.sha256, "
+            "state = excluded.state, updated_at = excluded.updated_at",
+            rows,
+        )
+        conn.executemany(
+            "UPDATE files SET state = ?, updated_at = ? WHERE path = ?",
+            [(STATE_MISSING, now, path) for path in gone],
+        )
+    return counts
+
+
+def files_in_state(conn: sqlite3.Connection, state: str = STATE_DOWNLOADED, since: float = None) -> list[dict]:
+    """Returns catalogued files in `state` (optionally updated at or after `since`), oldest question first."""
+    query = "SELECT * FROM files WHERE state = ?"
+    params = [state]
+    if since is not None:
+        query += " AND updated_at >= ?"
+        params.append(since)
+    rows = conn.execute(query + " ORDER BY year, paper_code, question_num", params)
+    return [dict(row) for row in rows]
+
+
+def summary(conn: sqlite3.Connection) -> dict[str, int]:
+    """Returns {state: file count} for every state."""
+    counts = dict.fromkeys(STATES, 0)
+    for row in conn.execute("SELECT state, COUNT(*) AS n FROM files GROUP BY state"):
+        counts[row["state"]] = row["n"]
+    return counts
+
+
+# Example usage (for direct testing):
+# if __name__ == '__main__':
+#     from past_paper_analyzer.cli import parse_filename
+#     conn = connect(":memory:")
+#     print(scan(conn, "downloads", parse_filename))
+#     print(summary(conn))
+#     print([f["path"] for f in files_in_state(conn)])
@@ -1,8 +1,26 @@
 import argparse
+import json
+import logging
 import os
 import sys
 import re
-from . import config, downloader, llm_extractor, graph_store, batch_parser
+import time
+from concurrent.futures import ThreadPoolExecutor
+from . import (
+    config,
+    downloader,
+    llm_extractor,
+    graph_store,
+    batch_parser,
+    job_queue,
+    extraction_store,
+    catalogue,
+    graph_history,
+    metrics,
+    log,
+)
+
+logger = logging.getLogger(__name__)
 
 
 def parse_filename(filename: str) -> dict | None:
@@ -33,10 +51,10 @@ def parse_filename(filename: str) -> dict | None:
             "question_num": f"q{int(match2.group(3)):02d}",  # e.g., q01
         }
 
-    print(
-        f"Warning: Could not parse metadata from filename: {filename}", file=sys.stderr
+    logger.warning(
+        "Could not parse metadata from filename: %s (expected format like: YYYY-pXX-qYY-solutions.pdf)",
+        filename,
     )
-    print("Expected format like: YYYY-pXX-qYY-solutions.pdf", file=sys.stderr)
     return None
 
 
@@ -55,47 +73,29 @@ def handle_download(args):
             print("No valid paper specifications found in the batch file. Nothing to download.", file=sys.stderr)
             sys.exit(1)
 
-        download_count = 0
-        fail_count = 0
-        print(f"Found {len(paper_specs)} paper(s) to download from batch file.")
-
+        # Specs without a question suffix keep the old per-paper "all" placeholder;
+        # the CL site serves single-question PDFs, so prefer yYYYYpXXq[ZZ-ZZ] specs.
         for spec in paper_specs:
-            year = spec['year']
-            paper_code = spec['paper_code'] # Should be 'pXX'
-            course_hint = spec['course_hint'] # Optional
-
-            print(f"Attempting to download: Year={year}, Paper={paper_code}" + (f" (Hint: {course_hint})" if course_hint else ""))
-            
-            # --- IMPORTANT ---
-            # The current downloader.download_pdf expects (year, paper_code, question_number).
-            # For downloading a full paper's solutions PDF, the concept of a single 'question_number'
-            # might not apply directly to the URL structure or the PDF itself.
-            # We are using "all" as a placeholder for question_number.
-            # `downloader.py` will need to be adapted to handle this,
-            # or a new function like `download_paper_solutions(year, paper_code, course_hint)`
-            # should be created in `downloader.py`.
-            # The `course_hint` should also be utilized by the downloader or stored
-            # with the downloaded file's metadata for later processing.
-            # For now, we'll just pass it along if the downloader can take it.
-            # Placeholder for question_number, assuming solutions are per-paper.
-            question_placeholder = "all" # This needs to be reconciled with downloader.py's capabilities
-
-            downloaded_path = downloader.download_pdf(year, paper_code, question_placeholder)
-            # If downloader is updated to use course_hint:
-            # downloaded_path = downloader.download_pdf(year, paper_code, question_placeholder, course_hint=course_hint)
+            if spec["question_num"] is None:
+                spec["question_num"] = "all"
 
+        # Jobs are persisted so an interrupted batch resumes where it stopped
+        conn = job_queue.connect()
+        added = job_queue.enqueue(conn, paper_specs)
+        print(f"Queued {added} new job(s) from batch file ({len(paper_specs) - added} already known).")
 
-            if downloaded_path:
-                print(f"  Success: {downloaded_path}")
-                download_count += 1
-            else:
-                print(f"  Failed to download Year={year}, Paper={paper_code}.")
-                fail_count += 1
-        
+        download_count, fail_count = _run_download_stage(conn)
         print(f"Batch download summary: {download_count} successful, {fail_count} failed.")
         if fail_count > 0:
             sys.exit(1) # Exit with error if any downloads failed
 
+    elif args.resume:
+        conn = job_queue.connect()
+        download_count, fail_count = _run_download_stage(conn)
+        print(f"Resumed download summary: {download_count} successful, {fail_count} failed.")
+        if fail_count > 0:
+            sys.exit(1)
+
     elif args.year and args.paper and args.question:
         # Original single file download logic
         print(f"Requesting single download: Year={args.year}, Paper={args.paper}, Question={args.question}")
@@ -118,20 +118,321 @@ def handle_download(args):
             print("Download failed.")
             sys.exit(1)
     else:
-        print("Error: For download, you must specify EITHER --batch-file OR (--year, --paper, AND --question).", file=sys.stderr)
+        print("Error: For download, you must specify EITHER --batch-file, --resume OR (--year, --paper, AND --question).", file=sys.stderr)
         parser.print_help(sys.stderr) # Accessing parser might be tricky here, print usage manually
         sys.exit(1)
         
     print("--- End Download ---")
 
 
+def _run_download_stage(conn) -> tuple[int, int]:
+    """Downloads every pending job in the queue. Returns (successful, failed) counts."""
+    with metrics.timer("stage.download"):
+        return _download_pending(conn)
+
+
+def _download_pending(conn) -> tuple[int, int]:
+    pending = job_queue.jobs_in_state(conn, job_queue.STATE_PENDING)
+    logger.info("Found %d pending download(s) in the job queue.", len(pending))
+    download_count = 0
+    fail_count = 0
+    with log.Progress(len(pending), "download") as progress:
+        for position, job in enumerate(pending):
+            if downloader.auth_failed():
+                # Remaining jobs stay pending (without a failed attempt) for 'download --resume'
+                logger.error(
+                    "Stopped after an authentication failure; %d job(s) left pending. "
+                    "Refresh CL_AUTH_COOKIE and run 'download --resume'.",
+                    len(pending) - position,
+                )
+                break
+            if downloader.breaker_open():
+                # An outage is not the jobs' fault either; failing fast here would use up their attempts
+                logger.error(
+                    "Stopped because the solutions site keeps failing (circuit breaker open); %d job(s) left "
+                    "pending. Run 'download --resume' once it recovers.",
+                    len(pending) - position,
+                )
+                break
+            year = job["year"]
+            paper_code = job["paper_code"]
+            question_num = job["question_num"]
+            logger.debug(
+                "Downloading Year=%s, Paper=%s, Question=%s (Hint: %s)",
+                year, paper_code, question_num, job["course_hint"],
+            )
+
+            downloaded_path = downloader.download_pdf(year, paper_code, question_num)
+
+            if downloaded_path:
+                job_queue.advance(conn, job, job_queue.STATE_DOWNLOADED, pdf_path=downloaded_path)
+                download_count += 1
+            else:
+                logger.info("Failed to download Year=%s, Paper=%s, Question=%s.", year, paper_code, question_num)
+                if not downloader.auth_failed() and not downloader.breaker_open():
+                    # An expired cookie or a site outage is not the job's fault; don't use up its attempts
+                    job_queue.record_failure(conn, job, "download failed")
+                fail_count += 1
+            progress.advance(ok=downloaded_path is not None)
+    return download_count, fail_count
+
+
+def _run_extract_stage(conn, workers: int = config.EXTRACT_WORKERS) -> tuple[int, int]:
+    """Runs LLM extraction for every downloaded job. Returns (successful, failed) counts."""
+    with metrics.timer("stage.extract"):
+        return _extract_downloaded(conn, workers)
+
+
+def _extract_downloaded(conn, workers: int) -> tuple[int, int]:
+    downloaded = job_queue.jobs_in_state(conn, job_queue.STATE_DOWNLOADED)
+    logger.info("Found %d downloaded PDF(s) awaiting extraction.", len(downloaded))
+    ok_count = 0
+    fail_count = 0
+    jobs_by_path = {}
+    failed = []
+    for job in downloaded:
+        pdf_path = job["pdf_path"]
+        if not pdf_path or not os.path.exists(pdf_path):
+            logger.warning("PDF missing for %s; re-queueing download.", job_queue.job_key(job))
+            job_queue.advance(conn, job, job_queue.STATE_PENDING)
+            fail_count += 1
+            continue
+        jobs_by_path[pdf_path] = job
+
+    # Workers run the CPU-bound rendering; results are recorded here as each PDF finishes
+    with log.Progress(len(jobs_by_path), "extract") as progress:
+        for pdf_path, concepts_data in llm_extractor.extract_concepts_batch(list(jobs_by_path), workers=workers):
+            job = jobs_by_path[pdf_path]
+            if concepts_data:
+                job_queue.advance(conn, job, job_queue.STATE_EXTRACTED, concepts=concepts_data)
+                ok_count += 1
+            else:
+                logger.info("No concepts extracted from %s.", pdf_path)
+                job_queue.record_failure(conn, job, "no concepts extracted")
+                failed.append((job, pdf_path))
+                fail_count += 1
+            progress.advance(ok=bool(concepts_data))
+    if failed:
+        catalogue.mark(catalogue.connect(), failed, catalogue.STATE_FAILED)
+    return ok_count, fail_count
+
+
+def _graph_path_for(args) -> str:
+    """Returns the graph file a command should write to: a shard file if --shard is given."""
+    if getattr(args, "shard", None):
+        return graph_store.shard_path(args.shard)
+    return config.GRAPH_DATA_PATH
+
+
+def _run_merge_stage(
+    conn, tripos_part: str = "Unknown", course: str = None, graph_path: str = config.GRAPH_DATA_PATH
+) -> int:
+    """Merges every extracted job into the graph in one locked commit. Returns the merged count."""
+    extracted = job_queue.jobs_in_state(conn, job_queue.STATE_EXTRACTED)
+    if not extracted:
+        logger.info("No extracted results awaiting merge.")
+        return 0
+
+    # Keep the raw results first, so a failed commit never loses LLM output
+    store = extraction_store.connect()
+    applied = []
+    for job in extracted:
+        metadata = {
+            "year": job["year"],
+            "paper_code": job["paper_code"],
+            "question_num": job["question_num"],
+            "tripos_part": tripos_part,
+        }
+        digest = extraction_store.record(
+            store,
+            metadata,
+            job["concepts"],
+            llm_extractor.model_name(),
+            llm_extractor.PROMPT_VERSION,
+            course=course or job["course_hint"],
+            source_pdf=job["pdf_path"],
+            graph_path=graph_path,
+        )
+        applied.append((metadata, digest))
+
+    def apply_changes(graph):
+        for job, (metadata, _) in zip(extracted, applied):
+            graph_store.ingest_extraction(
+                graph, metadata, job["concepts"], course_module=course or job["course_hint"]
+            )
+
+    with metrics.timer("stage.merge"):
+        committed = graph_store.commit_changes(apply_changes, graph_path)
+    if committed is None:
+        for job in extracted:
+            job_queue.record_failure(conn, job, "graph save failed")
+        return 0
+    # Only mark jobs merged once the graph containing them is on disk
+    extraction_store.mark_applied(store, graph_path, applied)
+    catalogue.mark(
+        catalogue.connect(),
+        [(metadata, job["pdf_path"]) for job, (metadata, _) in zip(extracted, applied) if job["pdf_path"]],
+        catalogue.STATE_PROCESSED,
+        graph_path=graph_path,
+    )
+    for job in extracted:
+        job_queue.advance(conn, job, job_queue.STATE_MERGED)
+    logger.info("Merged %d question(s) into the graph.", len(extracted))
+    return len(extracted)
+
+
+def _process_new(args) -> tuple[int, int]:
+    """
+    Extracts and merges every catalogued PDF that is not in the graph yet, in one commit.
+
+    PDFs whose extraction failed before are only tried again with --retry-failed.
+
+    Returns:
+        A tuple (processed, failed) counts.
+    """
+    cat = catalogue.connect()
+    new_files = catalogue.files_in_state(cat, catalogue.STATE_DOWNLOADED)
+    logger.info("Found %d new PDF(s) in the catalogue.", len(new_files))
+    if args.retry_failed:
+        failed_before = catalogue.files_in_state(cat, catalogue.STATE_FAILED)
+        logger.info("Retrying %d PDF(s) whose extraction failed before.", len(failed_before))
+        new_files += failed_before
+    metadata_by_path = {
+        f["path"]: {
+            "year": f["year"],
+            "paper_code": f["paper_code"],
+            "question_num": f["question_num"],
+            "tripos_part": args.tripos_part,
+        }
+        for f in new_files
+        if os.path.exists(f["path"])
+    }
+    graph_path = _graph_path_for(args)
+    store = extraction_store.connect()
+    extracted = []
+    failed = []
+    with log.Progress(len(metadata_by_path), "extract") as progress:
+        for pdf_path, concepts_data in llm_extractor.extract_concepts_batch(list(metadata_by_path), workers=args.workers):
+            metadata = metadata_by_path[pdf_path]
+            if concepts_data:
+                digest = extraction_store.record(
+                    store,
+                    metadata,
+                    concepts_data,
+                    llm_extractor.model_name(),
+                    llm_extractor.PROMPT_VERSION,
+                    course=args.course,
+                    source_pdf=pdf_path,
+                    graph_path=graph_path,
+                )
+                extracted.append((pdf_path, metadata, concepts_data, digest))
+            else:
+                logger.info("No concepts extracted from %s.", pdf_path)
+                failed.append((metadata, pdf_path))
+            progress.advance(ok=bool(concepts_data))
+    catalogue.mark(cat, failed, catalogue.STATE_FAILED)
+    if not extracted:
+        return 0, len(failed)
+
+    def apply_changes(graph):
+        for _, metadata, concepts_data, _ in extracted:
+            graph_store.ingest_extraction(graph, metadata, concepts_data, course_module=args.course)
+
+    with metrics.timer("stage.merge"):
+        committed = graph_store.commit_changes(apply_changes, graph_path)
+    if committed is None:
+        logger.error("Could not save the updated graph; the new PDFs stay queued in the catalogue.")
+        return 0, len(failed) + len(extracted)
+    extraction_store.mark_applied(store, graph_path, [(metadata, digest) for _, metadata, _, digest in extracted])
+    catalogue.mark(
+        cat,
+        [(metadata, pdf_path) for pdf_path, metadata, _, _ in extracted],
+        catalogue.STATE_PROCESSED,
+        graph_path=graph_path,
+    )
+    return len(extracted), len(failed)
+
+
+def _stream_into_graph(pdf_path: str, metadata: dict, course: str, graph_path: str) -> tuple[list[dict], object]:
+    """
+    Streams the concepts of one PDF and applies each to the graph as soon as it arrives.
+
+    The graph is loaded in a background thread while the model is still
+    generating, so when the answer ends only the (version-checked) save is left.
+
+    Returns:
+        A tuple (concepts, graph already containing them) for commit_changes.
+    """
+    concepts = []
+    applied = 0
+    graph = question_id = None
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        loading = pool.submit(graph_store.load_graph, graph_path)
+        with metrics.timer("extract.pdf"):
+            for concept in llm_extractor.stream_concepts_from_pdf(pdf_path):
+                concepts.append(concept)
+                logger.info("Concept %d: %s", len(concepts), concept["concept_name"])
+                if graph is None and loading.done():
+                    graph = loading.result()
+                    question_id = graph_store.ingest_question(graph, metadata, course_module=course)
+                if graph is not None:
+                    for pending in concepts[applied:]:
+                        graph_store.ingest_concept(graph, question_id, pending)
+                    applied = len(concepts)
+        if graph is None:
+            graph = loading.result()
+            question_id = graph_store.ingest_question(graph, metadata, course_module=course)
+    for pending in concepts[applied:]:
+        graph_store.ingest_concept(graph, question_id, pending)
+    return concepts, graph
+
+
 def handle_process(args):
     """Handles the 'process' command."""
     print("--- Process Command ---")
+    if not args.pdf_path and (args.year or args.paper or args.question):
+        # The queue and --new take metadata from the job or filename of each PDF
+        print(
+            "Error: --year/--paper/--question describe a single PDF; give its path as well.",
+            file=sys.stderr,
+        )
+        sys.exit(1)
+    if args.new and args.pdf_path:
+        print("Error: --new processes every new PDF in the catalogue; do not give a PDF path.", file=sys.stderr)
+        sys.exit(1)
+    if args.stream and not args.pdf_path:
+        print("Error: --stream processes a single PDF; give its path.", file=sys.stderr)
+        sys.exit(1)
+    if args.retry_failed and not args.new:
+        print("Error: --retry-failed only applies to --new.", file=sys.stderr)
+        sys.exit(1)
+    if args.new:
+        skipped = 0 if args.retry_failed else catalogue.summary(catalogue.connect())[catalogue.STATE_FAILED]
+        ok_count, fail_count = _process_new(args)
+        print(f"Process summary: {ok_count} new PDF(s) merged, {fail_count} failed.")
+        if skipped:
+            print(f"  Skipped {skipped} PDF(s) that failed in an earlier run (rerun with 'process --new --retry-failed').")
+        print("--- End Process ---")
+        if fail_count > 0:
+            sys.exit(1)
+        return
+    if not args.pdf_path:
+        # No PDF given: work through downloaded and extracted jobs in the queue
+        conn = job_queue.connect()
+        ok_count, fail_count = _run_extract_stage(conn, workers=args.workers)
+        print(f"Extraction summary: {ok_count} successful, {fail_count} failed.")
+        _run_merge_stage(
+            conn, tripos_part=args.tripos_part, course=args.course, graph_path=_graph_path_for(args)
+        )
+        print("--- End Process ---")
+        if fail_count > 0:
+            sys.exit(1)
+        return
+
     pdf_path = args.pdf_path
-    print(f"Processing PDF: {pdf_path}")
+    logger.info("Processing PDF: %s", pdf_path)
     if not os.path.exists(pdf_path):
-        print(f"Error: PDF file not found at {pdf_path}", file=sys.stderr)
+        logger.error("PDF file not found at %s", pdf_path)
         sys.exit(1)
 
     # --- Get Metadata ---
@@ -142,9 +443,7 @@ def handle_process(args):
         if not re.match(r"p\d{1,2}", args.paper, re.IGNORECASE) or not re.match(
             r"q\d{1,2}", args.question, re.IGNORECASE
         ):
-            print(
-                "Error: Invalid --paper or --question format provided.", file=sys.stderr
-            )
+            logger.error("Invalid --paper or --question format provided.")
             sys.exit(1)
         metadata = {
             "year": args.year,
@@ -154,10 +453,10 @@ def handle_process(args):
                 args.tripos_part if args.tripos_part else "Unknown"
             ),  # Use provided or default
         }
-        print("Using metadata from command-line arguments.")
+        logger.info("Using metadata from command-line arguments.")
     else:
         # Fallback to filename parsing
-        print("Attempting to parse metadata from filename...")
+        logger.debug("Attempting to parse metadata from filename...")
         filename = os.path.basename(pdf_path)
         parsed_meta = parse_filename(filename)
         if parsed_meta:
@@ -166,91 +465,616 @@ def handle_process(args):
             metadata["tripos_part"] = (
                 args.tripos_part if args.tripos_part else "Unknown"
             )  # Use provided or default
-            print(f"Parsed metadata: {metadata}")
+            logger.info("Parsed metadata: %s", metadata, extra={"metadata": metadata})
         else:
-            print(
-                "Error: Could not determine paper metadata. Use --year, --paper, --question arguments or ensure filename format is YYYY-pXX-qYY-solutions.pdf.",
-                file=sys.stderr,
+            logger.error(
+                "Could not determine paper metadata. Use --year, --paper, --question arguments or ensure filename format is YYYY-pXX-qYY-solutions.pdf."
             )
             sys.exit(1)
 
     # --- LLM Extraction ---
-    print("Starting LLM concept extraction...")
+    logger.info("Starting LLM concept extraction...")
     # TODO: Pass course_hint to llm_extractor if available from batch download metadata
     # (e.g., if batch download stores this hint alongside the PDF or passes it to process)
-    concepts_data = llm_extractor.extract_concepts_from_pdf(pdf_path)
+    graph_path = _graph_path_for(args)
+    graph = None
+    if args.stream:
+        concepts_data, graph = _stream_into_graph(pdf_path, metadata, args.course, graph_path)
+    else:
+        with metrics.timer("extract.pdf"):
+            concepts_data = llm_extractor.extract_concepts_from_pdf(pdf_path)
     if not concepts_data:
-        print("Error: No concepts extracted or LLM call failed.", file=sys.stderr)
+        logger.error("No concepts extracted or LLM call failed.")
         sys.exit(1)
-    print(f"LLM extraction returned {len(concepts_data)} concepts.")
+    logger.info("LLM extraction returned %d concepts.", len(concepts_data))
+    store = extraction_store.connect()
+    digest = extraction_store.record(
+        store,
+        metadata,
+        concepts_data,
+        llm_extractor.model_name(),
+        llm_extractor.PROMPT_VERSION,
+        course=args.course,
+        source_pdf=pdf_path,
+        graph_path=graph_path,
+    )
 
     # --- Update Graph ---
-    print("Loading concept graph...")
-    graph = graph_store.load_graph()
-    print("Updating graph with extracted data...")
-
+    # The graph is loaded, updated and saved under a file lock as one version-checked
+    # commit, so parallel 'process' runs merge instead of overwriting each other.
+    logger.info("Updating graph with extracted data...")
     full_paper_code = f"{metadata['year']}-{metadata['paper_code']}"
+    counts = {}
+
+    def apply_changes(graph):
+        # Each PDF (e.g., YYYY-pXX-qYY-solutions.pdf) contains the solution for a single
+        # question, so `metadata['question_num']` directly identifies its Question node.
+        _, counts["concepts"], counts["links"] = graph_store.ingest_extraction(
+            graph,
+            metadata,
+            concepts_data,
+            course_module=args.course, # This could also come from batch file's course_hint
+        )
+
+    # With --stream the graph already holds the concepts; re-applying them is a
+    # no-op unless another writer saved meanwhile and the commit replays them
+    if graph_store.commit_changes(apply_changes, graph_path, graph=graph) is None:
+        logger.error("Could not save the updated graph.")
+        sys.exit(1)
+    extraction_store.mark_applied(store, graph_path, [(metadata, digest)])
+    catalogue.mark(catalogue.connect(), [(metadata, pdf_path)], catalogue.STATE_PROCESSED, graph_path=graph_path)
 
-    paper_id = graph_store.add_paper(
-        graph,
-        paper_code=full_paper_code,
-        year=metadata["year"],
-        tripos_part=metadata["tripos_part"],
-    )
-
-    # Clarification: Each PDF (e.g., YYYY-pXX-qYY-solutions.pdf) contains the solution
-    # for a single question. Therefore, the `metadata['question_num']` obtained from
-    # filename parsing or arguments directly corresponds to the content of this PDF.
-    # No further segmentation of questions within the PDF is needed.
-    # The LLM will process the entire PDF as the solution for this one question.
-    question_id = graph_store.add_question(
-        graph,
-        paper_node_id=paper_id,
-        question_number=metadata["question_num"],
-        course_module=args.course, # This could also come from batch file's course_hint
-    )
-
-    concepts_added_count = 0
-    links_added_count = 0
-    for concept_info in concepts_data:
-        concept_name = concept_info.get("concept_name")
-        if not concept_name:
+    logger.info(
+        "Processed %d unique concepts and created/verified %d links for question %s in paper %s.",
+        counts["concepts"],
+        counts["links"],
+        metadata.get("question_num", "N/A"),
+        full_paper_code,
+        extra={"concepts": counts["concepts"], "links": counts["links"]},
+    )
+    logger.info("Successfully processed '%s' and saved updated graph.", os.path.basename(pdf_path))
+    print("--- End Process ---")
+
+
+def handle_ingest(args):
+    """Handles the 'ingest' command: runs all pending queue work (download, extract, merge)."""
+    print("--- Ingest Command ---")
+    conn = job_queue.connect()
+    if args.batch_file:
+        paper_specs = batch_parser.load_batch_file(args.batch_file)
+        for spec in paper_specs:
+            if spec["question_num"] is None:
+                spec["question_num"] = "all"
+        added = job_queue.enqueue(conn, paper_specs)
+        print(f"Queued {added} new job(s) from {args.batch_file}.")
+    if args.retry_failed:
+        print(f"Reset failure count on {job_queue.reset_attempts(conn)} job(s).")
+
+    download_ok, download_failed = _run_download_stage(conn)
+    extract_ok, extract_failed = _run_extract_stage(conn, workers=args.workers)
+    merged = _run_merge_stage(
+        conn, tripos_part=args.tripos_part, course=args.course, graph_path=_graph_path_for(args)
+    )
+
+    print(
+        f"Ingest summary: {download_ok} downloaded ({download_failed} failed), "
+        f"{extract_ok} extracted ({extract_failed} failed), {merged} merged."
+    )
+    print("--- End Ingest ---")
+    if download_failed or extract_failed:
+        sys.exit(1)
+
+
+def handle_status(args):
+    """Handles the 'status' command: shows job queue progress and throughput."""
+    conn = job_queue.connect()
+    summary = job_queue.status_summary(conn, window_seconds=args.window * 60)
+    total = summary["total"]
+    if total == 0:
+        print("Job queue is empty. Queue work with 'download --batch-file' or 'ingest --batch-file'.")
+        return
+
+    print(f"Job queue: {config.JOB_DB_PATH} ({total} job(s))")
+    for state, count in summary["counts"].items():
+        print(f"  {state:<11} {count:>6}  ({100.0 * count / total:5.1f}%)")
+    if summary["exhausted"]:
+        print(f"  {summary['exhausted']} job(s) exceeded {config.JOB_MAX_ATTEMPTS} attempts (rerun with 'ingest --retry-failed').")
+
+    print(f"Throughput over the last {args.window:g} minute(s):")
+    for state, rate in summary["throughput"].items():
+        print(f"  -> {state:<11} {rate:8.2f} job(s)/min")
+
+    failures = job_queue.failed_jobs(conn)
+    if failures:
+        print("Recent failures:")
+        for job in failures[:10]:
+            print(f"  {job['year']}-{job['paper_code']}-{job['question_num']} [{job['state']}, {job['attempts']} attempt(s)]: {job['error']}")
+
+
+def handle_catalogue(args):
+    """Handles the 'catalogue' command: updates or queries the catalogue of downloaded PDFs."""
+    conn = catalogue.connect()
+    if args.action == "scan":
+        graph_path = _graph_path_for(args)
+        applied = extraction_store.applied_hashes(extraction_store.connect(), graph_path)
+        graph = graph_store.load_graph(graph_path) if args.from_graph else None
+
+        def is_processed(metadata):
+            if (metadata["year"], metadata["paper_code"], metadata["question_num"]) in applied:
+                return True
+            return graph is not None and graph_store.question_node_id(metadata) in graph
+
+        with metrics.timer("catalogue.scan"):
+            counts = catalogue.scan(conn, args.dir, parse_filename, is_processed=is_processed)
+        print(
+            f"Scanned {args.dir}: {counts['added']} added, {counts['changed']} changed, "
+            f"{counts['unchanged']} unchanged, {counts['missing']} missing, {counts['unparsed']} unparsed."
+        )
+    elif args.action == "new":
+        # One path per line, so the output can be piped into other tools
+        for entry in catalogue.files_in_state(conn, catalogue.STATE_DOWNLOADED):
+            print(entry["path"])
+        return
+
+    counts = catalogue.summary(conn)
+    print(f"Catalogue: {config.CATALOGUE_DB_PATH} ({sum(counts.values())} file(s))")
+    for state, count in counts.items():
+        print(f"  {state:<11} {count:>6}")
+
+
+def _format_attrs(attrs: dict) -> str:
+    """One-line summary of a node's attributes for 'history diff' (long values shortened)."""
+    label = attrs.get("name") or attrs.get("code") or attrs.get("number")
+    text = f"{attrs.get('type', '?')} {label!r}" if label is not None else str(attrs.get("type", "?"))
+    return text if len(text) <= 80 else text[:77] + "..."
+
+
+def _print_changes(title: str, changes: dict, limit: int, describe):
+    counts = ", ".join(f"{len(changes[kind])} {kind}" for kind in ("added", "changed", "removed"))
+    print(f"{title}: {counts}")
+    for kind, sign in (("added", "+"), ("removed", "-"), ("changed", "~")):
+        items = sorted(changes[kind].items(), key=lambda item: str(item[0]))
+        for key, value in items[:limit]:
+            print(f"  {sign} {describe(key, value, kind)}")
+        if len(items) > limit:
+            print(f"  {sign} ... and {len(items) - limit} more")
+
+
+def _describe_node(node, value, kind) -> str:
+    if kind != "changed":
+        return f"{node} ({_format_attrs(value)})"
+    old, new = value
+    fields = [
+        f"{name}: {str(old.get(name))[:40]!r} -> {str(new.get(name))[:40]!r}"
+        for name in sorted(set(old) | set(new))
+        if old.get(name) != new.get(name)
+    ]
+    return f"{node}: {'; '.join(fields)}"
+
+
+def _describe_edge(edge, value, kind) -> str:
+    source, target = edge
+    attrs = value[1] if kind == "changed" else value
+    text = f"{source} -[{attrs.get('type', '?')}]-> {target}"
+    if kind == "changed":
+        old, new = value
+        text += f" ({', '.join(f'{k}: {old.get(k)} -> {new.get(k)}' for k in sorted(set(old) | set(new)) if old.get(k) != new.get(k))})"
+    return text
+
+
+def handle_history(args):
+    """Handles the 'history' command: lists, compares and restores recorded graph versions."""
+    graph_path = _graph_path_for(args)
+    if not os.path.exists(graph_history.history_path(graph_path)):
+        print(f"No history recorded for {graph_path} yet (it is written on every save while GRAPH_HISTORY is on).")
+        return
+    conn = graph_history.connect(graph_path)
+
+    if args.action == "list":
+        versions = graph_history.list_versions(conn, limit=args.limit)
+        stats = graph_history.summary(conn)
+        graph_bytes = os.path.getsize(graph_path) if os.path.exists(graph_path) else 0
+        print(
+            f"History of {graph_path}: {stats['versions']} version(s), {stats['snapshots']} snapshot(s), "
+            f"{(stats['delta_bytes'] + stats['snapshot_bytes']) / 1024:.1f} KiB "
+            f"(graph file {graph_bytes / 1024:.1f} KiB)"
+        )
+        print(f"{'version':>8}  {'saved at':<19} {'nodes':>7} {'edges':>8}  {'nodes +/~/-':<18} {'edges +/~/-':<20}")
+        for row in versions:
+            saved_at = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(row["saved_at"]))
+            node_changes = f"{row['nodes_added']}/{row['nodes_changed']}/{row['nodes_removed']}"
+            edge_changes = f"{row['edges_added']}/{row['edges_changed']}/{row['edges_removed']}"
             print(
-                f"Warning: Skipping concept with missing name: {concept_info}",
-                file=sys.stderr,
+                f"{row['version']:>8}  {saved_at:<19} {row['nodes']:>7} {row['edges']:>8}  "
+                f"{node_changes:<18} {edge_changes:<20}{' snapshot' if row['snapshot'] else ''}"
             )
-            continue
+        return
+
+    if not args.versions:
+        print(f"Error: 'history {args.action}' needs a version number.", file=sys.stderr)
+        sys.exit(1)
+    if args.action == "diff":
+        versions = graph_history.list_versions(conn, limit=1)
+        from_version = args.versions[0]
+        to_version = args.versions[1] if len(args.versions) > 1 else (versions[0]["version"] if versions else 0)
+        changes = graph_history.diff(conn, from_version, to_version)
+        if changes is None:
+            sys.exit(1)
+        print(f"Changes from version {from_version} to {to_version}:")
+        _print_changes("Nodes", changes["nodes"], args.limit, _describe_node)
+        _print_changes("Edges", changes["edges"], args.limit, _describe_edge)
+        return
 
-        concept_id = graph_store.add_concept(
-            graph, concept_name=concept_name, definition=concept_info.get("definition")
+    # checkout
+    version = args.versions[0]
+    graph = graph_history.load_version(conn, version)
+    if graph is None:
+        sys.exit(1)
+    if args.restore:
+        # Saved as a new version on top of the current one, so the restore itself can be undone
+        if not graph_store.save_graph(graph, graph_path):
+            sys.exit(1)
+        kept, reset = _resync_after_restore(graph, graph_path)
+        print(f"Restored version {version} as the current graph {graph_path} (new version {graph.graph['version']}).")
+        print(
+            f"{kept} stored extraction result(s) still match the graph; "
+            f"{reset} catalogued file(s) no longer in it are marked downloaded again."
         )
-        if concept_id: # True if concept was added or already existed
-            # Check if link already exists before incrementing (graph_store.link_question_to_concept might do this)
-            # For now, assume link_question_to_concept handles duplicates gracefully or we count all attempts.
-            graph_store.link_question_to_concept(graph, question_id, concept_id)
-            links_added_count += 1
-        
-        # How to count concepts_added_count? Only if new node created?
-        # graph_store.add_concept returns node_id. We can check if it was new.
-        # For simplicity, let's assume it's fine for now.
-        # A more accurate count would be:
-        # if graph.nodes[concept_id].get('is_new', False): concepts_added_count +=1
-        # (requires add_concept to mark new nodes)
+        return
+    output = args.output or f"{os.path.splitext(graph_path)[0]}.v{version}.graphml"
+    if not graph_history.write_graphml(graph, output):
+        sys.exit(1)
+    print(
+        f"Wrote version {version} ({graph.number_of_nodes()} nodes, {graph.number_of_edges()} edges) to {output}."
+    )
 
-    # A simple count of unique concepts processed in this run:
-    unique_concept_names_processed = {c.get("concept_name") for c in concepts_data if c.get("concept_name")}
-    concepts_added_count = len(unique_concept_names_processed)
 
+def _resync_after_restore(graph, graph_path: str) -> tuple[int, int]:
+    """
+    Brings the records of what the graph contains in line with a restored version.
 
-    print(
-        f"Processed {concepts_added_count} unique concepts and created/verified {links_added_count} links for question {metadata.get('question_num', 'N/A')} in paper {full_paper_code}."
+    A stored result (current model and prompt version) stays applied only if the
+    restored graph links its question to exactly its concepts, so 'rebuild'
+    re-applies the rest. Files catalogued as processed into this graph whose
+    question is no longer in it go back to downloaded.
+
+    Returns:
+        A tuple (results still applied, catalogue files reset).
+    """
+    store = extraction_store.connect()
+    stored = extraction_store.results(store, llm_extractor.model_name(), llm_extractor.PROMPT_VERSION)
+    still_applied = []
+    for result in stored:
+        question_id = graph_store.question_node_id(result)
+        if question_id not in graph:
+            continue
+        linked = {
+            target for _, target, data in graph.out_edges(question_id, data=True) if data.get("type") == "MENTIONS"
+        }
+        expected = {
+            graph_store.generate_node_id("concept", graph_store.normalize_concept_name(concept["concept_name"]))
+            for concept in result["concepts"]
+            if concept.get("concept_name")
+        }
+        if linked == expected:
+            still_applied.append((result, result["content_hash"]))
+    extraction_store.forget_applied(store, graph_path)
+    extraction_store.mark_applied(store, graph_path, still_applied)
+
+    conn = catalogue.connect()
+    graph_key = os.path.abspath(graph_path)
+    gone = [
+        row
+        for row in catalogue.files_in_state(conn, catalogue.STATE_PROCESSED)
+        if row["graph_path"] and os.path.abspath(row["graph_path"]) == graph_key
+        and graph_store.question_node_id(row) not in graph
+    ]
+    catalogue.set_state(conn, gone, catalogue.STATE_DOWNLOADED)
+    return len(still_applied), len(gone)
+
+
+def handle_merge(args):
+    """Handles the 'merge' command: unions shard graphs into the main graph."""
+    print("--- Merge Command ---")
+    shard_paths = sorted(args.shards) if args.shards else graph_store.list_shard_paths()
+    if not shard_paths:
+        print(f"No shard files given or found in {config.SHARD_DIR}. Nothing to merge.", file=sys.stderr)
+        sys.exit(1)
+
+    output_path = args.output if args.output else config.GRAPH_DATA_PATH
+    shards = []
+    for path in shard_paths:
+        if not os.path.exists(path):
+            print(f"Error: Shard file not found: {path}", file=sys.stderr)
+            sys.exit(1)
+        shards.append(graph_store.load_graph(path))
+
+    counts = {"pruned": 0}
+
+    def merge_into(graph):
+        if args.fresh:
+            merged = graph_store.merge_graphs(shards, definition_policy=args.policy)
+        else:
+            # Start from the current output graph so repeated merges are incremental and idempotent
+            merged, counts["pruned"] = graph_store.merge_shards(graph, shards, definition_policy=args.policy)
+        graph.clear()
+        graph.update(merged)
+
+    print(f"Merging {len(shard_paths)} shard(s) with definition policy '{args.policy}'...")
+    # Merge under the graph lock so commits made while the shards were loading are kept
+    if graph_store.commit_changes(merge_into, output_path) is None:
+        sys.exit(1)
+    # Record the shards' applied results for the output too, so 'rebuild' there does not redo them
+    store = extraction_store.connect()
+    if args.fresh:
+        extraction_store.forget_applied(store, output_path)
+    merged_results = []
+    for path, shard in zip(shard_paths, shards):
+        for key, digest in extraction_store.applied_hashes(store, path).items():
+            metadata = dict(zip(("year", "paper_code", "question_num"), key))
+            if graph_store.question_node_id(metadata) in shard:
+                merged_results.append((metadata, digest))
+    extraction_store.mark_applied(store, output_path, merged_results)
+    if counts["pruned"]:
+        print(f"Removed {counts['pruned']} concept(s) the shards no longer mention.")
+    print("--- End Merge ---")
+
+
+def _questions_without_results(graph, stored) -> list[str]:
+    """Returns the Question nodes of `graph` that have no stored extraction result (a full rebuild would lose them)."""
+    stored_ids = {graph_store.question_node_id(result) for result in stored}
+    return sorted(
+        node_id for node_id, data in graph.nodes(data=True)
+        if data.get("type") == "Question" and node_id not in stored_ids
     )
 
-    graph_store.save_graph(graph)
+
+def handle_rebuild(args):
+    """Handles the 'rebuild' command: regenerates the graph from stored extraction results (no LLM calls)."""
+    print("--- Rebuild Command ---")
+    store = extraction_store.connect()
+    model = args.model or llm_extractor.model_name()
+    graph_path = _graph_path_for(args)
+    # Only results extracted for (or already merged into) this graph: not other shards' results
+    stored = extraction_store.results(store, model, args.prompt_version, graph_path)
+    graph = None
+    if args.full:
+        graph = graph_store.load_graph(graph_path)
+        missing = _questions_without_results(graph, stored)
+        if missing:
+            print(
+                f"Error: {len(missing)} question(s) in {graph_path} have no stored result for model '{model}', "
+                f"prompt version {args.prompt_version} (e.g. {', '.join(missing[:3])}); a full rebuild would "
+                "delete them. Re-extract them first, or run 'rebuild' without --full.",
+                file=sys.stderr,
+            )
+            sys.exit(1)
+        changed = stored
+    else:
+        applied = extraction_store.applied_hashes(store, graph_path)
+        changed = [result for result in stored if applied.get(job_queue.job_key(result)) != result["content_hash"]]
     print(
-        f"Successfully processed '{os.path.basename(pdf_path)}' and saved updated graph."
+        f"{len(stored)} stored result(s) for {graph_path} with model '{model}', prompt version {args.prompt_version}; "
+        f"{len(changed)} to apply{' (full rebuild)' if args.full else ''}."
     )
-    print("--- End Process ---")
+    if not changed:
+        print("--- End Rebuild ---")
+        return
+
+    counts = {}
+
+    def apply_changes(graph):
+        if args.full:
+            if _questions_without_results(graph, stored):
+                raise ValueError("questions without stored results were added during the rebuild")
+            # Drop all nodes but keep graph-level attributes (e.g., the version)
+            graph.remove_nodes_from(list(graph.nodes))
+            graph.graph[graph_store.CO_OCCURRENCE_BUILT] = True  # Re-linking rebuilds the projection
+        unlinked = []
+        for result in changed:
+            # Replace this question's concept links with the stored result
+            unlinked.extend(graph_store.unlink_question_concepts(graph, graph_store.question_node_id(result)))
+            graph_store.ingest_extraction(graph, result, result["concepts"], course_module=result["course"])
+        counts["pruned"] = graph_store.prune_orphan_concepts(graph, unlinked)
+
+    with metrics.timer("stage.rebuild"):
+        committed = graph_store.commit_changes(apply_changes, graph_path, graph=graph)
+    if committed is None:
+        logger.error("Could not save the rebuilt graph.")
+        sys.exit(1)
+    if args.full:
+        extraction_store.forget_applied(store, graph_path)
+    extraction_store.mark_applied(store, graph_path, [(result, result["content_hash"]) for result in changed])
+    print(f"Re-applied {len(changed)} question(s); removed {counts['pruned']} orphaned concept(s).")
+    print("--- End Rebuild ---")
+
+
+def handle_watch(args):
+    """Handles the 'watch' command: keeps the graph in memory and ingests PDFs as they land."""
+    from . import daemon  # Only needed for this long-running mode
+
+    print("--- Watch Command ---")
+    watcher = daemon.Watcher(
+        parse_filename,
+        watch_dir=args.dir,
+        graph_path=_graph_path_for(args),
+        tripos_part=args.tripos_part,
+        course=args.course,
+        workers=args.workers,
+    )
+    daemon.run(
+        watcher,
+        poll_interval=args.poll,
+        flush_interval=args.flush_interval,
+        host=args.host,
+        port=None if args.no_http else args.port,
+        once=args.once,
+    )
+    status = watcher.status()
+    print(f"Watch summary: {status['processed']} ingested, {status['failed']} failed.")
+    print("--- End Watch ---")
+
+
+def handle_api(args):
+    """Handles the 'api' command: serves read-only graph queries over HTTP."""
+    from . import query_api  # Only needed for this long-running mode
+
+    query_api.serve(_graph_path_for(args), host=args.host, port=args.port)
+
+
+def handle_export(args):
+    """Handles the 'export' command: writes the graph as columnar tables for analytics tools."""
+    from . import exporter  # pyarrow is only needed for this command
+
+    print("--- Export Command ---")
+    graph_path = _graph_path_for(args)
+    if not os.path.exists(graph_path):
+        print(f"Error: Graph file not found at {graph_path}.", file=sys.stderr)
+        sys.exit(1)
+    compact = graph_store.load_compact_graph(graph_path)
+    fmt = args.format or exporter.default_format()
+    manifest = exporter.export_graph(compact, args.output_dir, fmt)
+    if manifest is None:
+        sys.exit(1)
+    for name, table in manifest["tables"].items():
+        files = table["files"][0] if len(table["files"]) == 1 else f"{len(table['files'])} files"
+        print(f"  {name:<10} {table['rows']:>9} row(s)  {', '.join(table['columns'])}  [{files}]")
+    print(f"Exported graph version {manifest['graph_version']} to {args.output_dir} ({fmt}).")
+    print("--- End Export ---")
+
+
+def handle_embed(args):
+    """Handles the 'embed' command: builds the concept embedding index."""
+    from . import embeddings  # numpy is only needed for this command and 'similar'
+
+    print("--- Embed Command ---")
+    graph = graph_store.load_graph()
+    embedder = embeddings.get_embedder(args.backend)
+    if embedder is None:
+        sys.exit(1)
+    index = embeddings.build_index(graph, embedder)
+    if index is None:
+        sys.exit(1)
+    if args.ivf is not None:
+        embeddings.build_ivf(index, nlist=args.ivf)
+    print(f"Indexed {len(index)} concept(s) with the '{embedder.name}' embedder (dim {embedder.dim}).")
+    print("--- End Embed ---")
+
+
+def handle_similar(args):
+    """Handles the 'similar' command: semantic search over concepts, or near-duplicate pairs."""
+    from . import embeddings
+
+    index = embeddings.load_index()
+    if index is None:
+        sys.exit(1)
+    if args.exact:
+        index.ivf = None
+
+    if args.duplicates:
+        pairs = index.near_duplicates(threshold=args.threshold)
+        print(f"{len(pairs)} concept pair(s) with similarity >= {args.threshold}:")
+        for left, right, score in pairs[: args.k if args.k else None]:
+            print(f"  {score:.3f}  {left}  <->  {right}")
+        return
+
+    if not args.query:
+        print("Error: give one or more query texts, or use --duplicates.", file=sys.stderr)
+        sys.exit(1)
+    embedder = embeddings.embedder_for(index)
+    if embedder is None:
+        sys.exit(1)
+    queries = []
+    for text in args.query:
+        # A known concept name queries by its stored vector (name plus definition)
+        node_id = graph_store.generate_node_id("concept", graph_store.normalize_concept_name(text))
+        vector = index.vector(node_id)
+        queries.append(vector if vector is not None else embedder.embed([text])[0])
+    results = index.search(embeddings.np.stack(queries), k=args.k, nprobe=args.nprobe)
+    for text, hits in zip(args.query, results):
+        print(f"Concepts similar to '{text}':")
+        for node_id, score in hits:
+            print(f"  {score:.3f}  {node_id}")
+
+
+def handle_related(args):
+    """Handles the 'related' command: concepts most often mentioned in the same questions."""
+    graph = graph_store.load_graph()
+    if not graph_store.has_co_occurrence(graph):
+        # Graphs saved before the projection was maintained: backfill it once
+        logger.warning("Graph has no co-occurrence edges yet; computing them from MENTIONS edges.")
+        graph = graph_store.commit_changes(graph_store.rebuild_co_occurrence, graph=graph)
+        if graph is None:
+            sys.exit(1)
+
+    for name in args.concept:
+        concept_id = graph_store.generate_node_id("concept", graph_store.normalize_concept_name(name))
+        if concept_id not in graph:
+            print(f"Concept '{name}' not found in the graph.", file=sys.stderr)
+            continue
+        print(f"Concepts co-occurring with '{graph.nodes[concept_id].get('name', name)}':")
+        for other_id, weight in graph_store.top_co_occurring(graph, concept_id, k=args.k):
+            print(f"  {weight:>4}  {graph.nodes[other_id].get('name', other_id)}")
+
+
+def render_visualization(graph, output_file: str, co_occurs: bool = False):
+    """
+    Writes an interactive pyvis HTML rendering of the graph to `output_file`.
+
+    CO_OCCURS edges (one pair per co-mentioned concept pair) would swamp the
+    rendering, so they are left out unless `co_occurs` is set, in which case
+    each pair is drawn once with its width scaled by the weight.
+
+    Raises:
+        ImportError: If pyvis is not installed.
+    """
+    from pyvis.network import Network
+
+    co_occurrence_edges = [
+        (u, v, data.get("weight", 1))
+        for u, v, data in graph.edges(data=True)
+        if data.get("type") == graph_store.CO_OCCURS
+    ]
+    if co_occurrence_edges:
+        graph = graph.copy()
+        graph.remove_edges_from((u, v) for u, v, _ in co_occurrence_edges)
+
+    net = Network(
+        notebook=False,
+        directed=True,
+        height="800px",
+        width="100%",
+        bgcolor="#222222",
+        font_color="white",
+    )
+    net.from_nx(graph)
+
+    for node in net.nodes:
+        node_id = node["id"]
+        if node_id in graph.nodes:
+            node_data = graph.nodes[node_id]
+            node_type = node_data.get("type", "Unknown")
+            color_map = {
+                "Paper": "#FFD700", "Question": "#ADD8E6", "Concept": "#90EE90"
+            }
+            size_map = {"Paper": 25, "Question": 15, "Concept": 10}
+            
+            node["color"] = color_map.get(node_type, "#FFFFFF") # Default white
+            node["size"] = size_map.get(node_type, 10)
+            
+            title_parts = [f"ID: {node_id}"]
+            for k, v in node_data.items():
+                title_parts.append(f"{k}: {v}")
+            node["title"] = "\n".join(title_parts)
+
+    if co_occurs:
+        for u, v, weight in co_occurrence_edges:
+            net.add_edge(
+                u, v, arrows="", dashes=True, width=min(1 + weight, 10), title=f"co-occurs in {weight} question(s)"
+            )
+    
+    net.show_buttons(filter_=["physics"])
+    net.save_graph(output_file)
 
 
 def handle_visualize(args):
@@ -273,38 +1097,8 @@ def handle_visualize(args):
     print(f"Generating interactive visualization to: {output_file}")
 
     try:
-        from pyvis.network import Network
-
-        net = Network(
-            notebook=False,
-            directed=True,
-            height="800px",
-            width="100%",
-            bgcolor="#222222",
-            font_color="white",
-        )
-        net.from_nx(graph)
-
-        for node in net.nodes:
-            node_id = node["id"]
-            if node_id in graph.nodes:
-                node_data = graph.nodes[node_id]
-                node_type = node_data.get("type", "Unknown")
-                color_map = {
-                    "Paper": "#FFD700", "Question": "#ADD8E6", "Concept": "#90EE90"
-                }
-                size_map = {"Paper": 25, "Question": 15, "Concept": 10}
-                
-                node["color"] = color_map.get(node_type, "#FFFFFF") # Default white
-                node["size"] = size_map.get(node_type, 10)
-                
-                title_parts = [f"ID: {node_id}"]
-                for k, v in node_data.items():
-                    title_parts.append(f"{k}: {v}")
-                node["title"] = "\n".join(title_parts)
-        
-        net.show_buttons(filter_=["physics"])
-        net.save_graph(output_file)
+        with metrics.timer("visualize.render"):
+            render_visualization(graph, output_file, co_occurs=args.co_occurs)
         print("Interactive graph visualization saved successfully.")
 
     except ImportError:
@@ -319,6 +1113,35 @@ def handle_visualize(args):
 
     print("--- End Visualize ---")
 
+def handle_benchmark(args):
+    """Handles the 'benchmark' command: times the pipeline on synthetic corpora with local stand-ins."""
+    from . import benchmark
+
+    try:
+        sizes = [int(size) for size in args.sizes.split(",") if size.strip()]
+    except ValueError:
+        print(f"Error: Invalid --sizes '{args.sizes}'. Expected comma-separated integers.", file=sys.stderr)
+        sys.exit(1)
+
+    results = benchmark.run_benchmarks(
+        sizes=sizes, seed=args.seed, keep_dir=args.keep_dir, export_edges=args.export_edges
+    )
+    print(benchmark.format_results(results))
+    benchmark.save_results(results, args.output)
+    print(f"Benchmark results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = benchmark.compare(baseline, results, threshold=args.threshold)
+        if regressions:
+            print(f"Regressions against {args.compare} (threshold {args.threshold:.0%}):")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print(f"No regressions against {args.compare} (threshold {args.threshold:.0%}).")
+
+
 # Store the global parser instance to access it from handle_download if needed for help text
 parser = None
 
@@ -335,6 +1158,38 @@ def main():
         description="Past Paper Concept Analyzer: Extract and visualize concepts from Cambridge CS Tripos solutions.",
         formatter_class=argparse.RawTextHelpFormatter,
     )
+    # --- Logging (global options, given before the command) ---
+    parser.add_argument(
+        "--log-level",
+        choices=log.LEVELS,
+        default=config.LOG_LEVEL,
+        help="Minimum log level (default: LOG_LEVEL or INFO)",
+    )
+    parser.add_argument(
+        "--log-format",
+        choices=log.FORMATS,
+        default=config.LOG_FORMAT,
+        help="Log output format: human-readable text or JSON lines (default: LOG_FORMAT or text)",
+    )
+    parser.add_argument(
+        "-q", "--quiet", action="store_true", help="Only log warnings and errors (same as --log-level WARNING)"
+    )
+    parser.add_argument(
+        "--progress",
+        action="store_true",
+        help="Show a summarizing progress line for batch stages instead of per-item messages",
+    )
+
+    # --- Instrumentation (global options, given before the command) ---
+    parser.add_argument(
+        "--metrics-out", type=str, help="Write a JSON report of per-stage timers and counters to this path"
+    )
+    parser.add_argument(
+        "--prometheus-out", type=str, help="Write the run's metrics in Prometheus text format to this path"
+    )
+    parser.add_argument(
+        "--profile", type=str, help="Run the command under cProfile and write the stats to this path"
+    )
     subparsers = parser.add_subparsers(
         dest="command", required=True, help="Available commands"
     )
@@ -342,7 +1197,7 @@ def main():
     # --- Download Command ---
     parser_download = subparsers.add_parser(
         "download", 
-        help="Download solutions PDF(s). Use EITHER --batch-file OR (--year, --paper, --question)."
+        help="Download solutions PDF(s). Use EITHER --batch-file, --resume OR (--year, --paper, --question)."
     )
     # Arguments for single download (mutually exclusive with batch)
     parser_download.add_argument("--year", type=int, help="Exam year (e.g., 2022) for single download.")
@@ -354,17 +1209,36 @@ def main():
     parser_download.add_argument(
         "--batch-file", type=str, help="Path to a batch file specifying multiple papers to download."
     )
+    parser_download.add_argument(
+        "--resume", action="store_true", help="Download the pending jobs left in the job queue by earlier batch runs."
+    )
     parser_download.set_defaults(func=handle_download)
 
     # --- Process Command ---
     parser_process = subparsers.add_parser(
         "process",
-        help="Process a downloaded PDF: extract concepts via LLM and update the graph.",
+        help="Process a downloaded PDF (or all downloaded jobs in the queue): extract concepts via LLM and update the graph.",
     )
     parser_process.add_argument(
         "pdf_path",
         type=str,
-        help="Path to the downloaded solutions PDF file (e.g., downloads/2022-p06-q01-solutions.pdf)",
+        nargs="?",
+        help="Path to the downloaded solutions PDF file (e.g., downloads/2022-p06-q01-solutions.pdf). If omitted, processes the job queue.",
+    )
+    parser_process.add_argument(
+        "--new",
+        action="store_true",
+        help="Process every PDF the catalogue lists as downloaded but not yet in the graph (see 'catalogue')",
+    )
+    parser_process.add_argument(
+        "--retry-failed",
+        action="store_true",
+        help="With --new: also retry PDFs whose extraction failed in an earlier run",
+    )
+    parser_process.add_argument(
+        "--stream",
+        action="store_true",
+        help="Stream the LLM answer and apply each concept to the graph as it arrives (single PDF only)",
     )
     parser_process.add_argument(
         "--year",
@@ -391,8 +1265,327 @@ def main():
     parser_process.add_argument(
         "--course", type=str, help="Optional: Specify associated course module name (can also come from batch file hint)"
     )
+    parser_process.add_argument(
+        "--workers",
+        type=int,
+        default=config.EXTRACT_WORKERS,
+        help="Worker processes for queue extraction (default: EXTRACT_WORKERS or CPU count)",
+    )
+    parser_process.add_argument(
+        "--shard",
+        type=str,
+        help="Optional: Write to the named shard graph under SHARD_DIR instead of the main graph (combine later with 'merge')",
+    )
     parser_process.set_defaults(func=handle_process)
 
+    # --- Ingest Command ---
+    parser_ingest = subparsers.add_parser(
+        "ingest",
+        help="Run all pending queued work: download, extract and merge into the graph.",
+    )
+    parser_ingest.add_argument(
+        "--batch-file", type=str, help="Optional: Queue the papers in this batch file before running."
+    )
+    parser_ingest.add_argument(
+        "--retry-failed", action="store_true", help="Retry jobs that exceeded JOB_MAX_ATTEMPTS."
+    )
+    parser_ingest.add_argument(
+        "--tripos-part",
+        type=str,
+        choices=["IA", "IB", "II", "Unknown"],
+        default="Unknown",
+        help="Specify Tripos Part (IA, IB, II)",
+    )
+    parser_ingest.add_argument(
+        "--course", type=str, help="Optional: Course module name (overrides batch file hints)"
+    )
+    parser_ingest.add_argument(
+        "--workers",
+        type=int,
+        default=config.EXTRACT_WORKERS,
+        help="Worker processes for extraction (default: EXTRACT_WORKERS or CPU count)",
+    )
+    parser_ingest.add_argument(
+        "--shard",
+        type=str,
+        help="Optional: Write to the named shard graph under SHARD_DIR instead of the main graph (combine later with 'merge')",
+    )
+    parser_ingest.set_defaults(func=handle_ingest)
+
+    # --- Status Command ---
+    parser_status = subparsers.add_parser(
+        "status", help="Show job queue progress and throughput."
+    )
+    parser_status.add_argument(
+        "--window", type=float, default=10.0, help="Throughput window in minutes (default: 10)"
+    )
+    parser_status.set_defaults(func=handle_status)
+
+    # --- Catalogue Command ---
+    parser_catalogue = subparsers.add_parser(
+        "catalogue",
+        help="Catalogue of downloaded PDFs: 'scan' picks up files added outside 'download', 'new' lists PDFs not yet in the graph.",
+    )
+    parser_catalogue.add_argument(
+        "action",
+        nargs="?",
+        choices=["summary", "scan", "new"],
+        default="summary",
+        help="summary (default): file counts per state; scan: reconcile with the directory; new: print unprocessed paths",
+    )
+    parser_catalogue.add_argument("--dir", type=str, default="downloads", help="Directory to scan (default: downloads)")
+    parser_catalogue.add_argument(
+        "--from-graph",
+        action="store_true",
+        help="When scanning, also treat files whose question is already in the graph as processed (loads the graph)",
+    )
+    parser_catalogue.add_argument(
+        "--shard", type=str, help="Optional: Check processing state against the named shard graph"
+    )
+    parser_catalogue.set_defaults(func=handle_catalogue)
+
+    # --- History Command ---
+    parser_history = subparsers.add_parser(
+        "history",
+        help="Recorded versions of the graph: 'list', 'diff FROM [TO]', 'checkout VERSION [-o FILE | --restore]'.",
+    )
+    parser_history.add_argument(
+        "action",
+        nargs="?",
+        choices=["list", "diff", "checkout"],
+        default="list",
+        help="list (default): versions with change counts; diff: changes between two versions "
+        "(TO defaults to the latest); checkout: rebuild a version",
+    )
+    parser_history.add_argument("versions", nargs="*", type=int, help="Version number(s) for diff/checkout")
+    parser_history.add_argument(
+        "--limit", type=int, default=20, help="Versions to list / changes to show per kind (default: 20)"
+    )
+    parser_history.add_argument(
+        "-o", "--output", type=str, help="checkout: GraphML file to write (default: <graph>.v<VERSION>.graphml)"
+    )
+    parser_history.add_argument(
+        "--restore",
+        action="store_true",
+        help="checkout: make the version the current graph (saved as a new version, so it can be undone)",
+    )
+    parser_history.add_argument(
+        "--shard", type=str, help="Optional: Use the history of the named shard graph under SHARD_DIR"
+    )
+    parser_history.set_defaults(func=handle_history)
+
+    # --- Merge Command ---
+    parser_merge = subparsers.add_parser(
+        "merge",
+        help="Merge shard graphs (from 'process/ingest --shard') into the main graph deterministically.",
+    )
+    parser_merge.add_argument(
+        "shards",
+        nargs="*",
+        help="Shard GraphML files to merge (default: all *.graphml files in SHARD_DIR)",
+    )
+    parser_merge.add_argument(
+        "--policy",
+        choices=graph_store.MERGE_POLICIES,
+        default="longest",
+        help="How to resolve conflicting concept definitions: 'longest' (default, order-independent), "
+        "'first' or 'last' shard in sorted path order",
+    )
+    parser_merge.add_argument(
+        "-o", "--output", type=str, help="Output graph path (default: GRAPH_DATA_PATH)"
+    )
+    parser_merge.add_argument(
+        "--fresh", action="store_true", help="Ignore the existing output graph and build only from the shards"
+    )
+    parser_merge.set_defaults(func=handle_merge)
+
+    # --- Rebuild Command ---
+    parser_rebuild = subparsers.add_parser(
+        "rebuild",
+        help="Regenerate the graph from stored extraction results without calling the LLM.",
+    )
+    parser_rebuild.add_argument(
+        "--full",
+        action="store_true",
+        help="Rebuild the whole graph from scratch (e.g., after changing concept normalization); refused if "
+        "the graph has questions without a stored result. By default only questions whose stored result "
+        "changed are re-applied",
+    )
+    parser_rebuild.add_argument(
+        "--model", type=str, help="Use results from this model (default: the configured backend's model)"
+    )
+    parser_rebuild.add_argument(
+        "--prompt-version",
+        type=str,
+        default=llm_extractor.PROMPT_VERSION,
+        help=f"Use results from this prompt version (default: {llm_extractor.PROMPT_VERSION})",
+    )
+    parser_rebuild.add_argument(
+        "--shard", type=str, help="Rebuild data/shards/SHARD.graphml instead of the main graph"
+    )
+    parser_rebuild.set_defaults(func=handle_rebuild)
+
+    # --- Watch Command ---
+    parser_watch = subparsers.add_parser(
+        "watch",
+        aliases=["serve"],
+        help="Run continuously: keep the graph in memory, ingest new PDFs from downloads/ and serve queries over HTTP.",
+    )
+    parser_watch.add_argument("--dir", type=str, default="downloads", help="Directory to watch (default: downloads)")
+    parser_watch.add_argument(
+        "--poll",
+        type=float,
+        default=config.WATCH_POLL_INTERVAL,
+        help=f"Seconds between directory scans (default: {config.WATCH_POLL_INTERVAL:g})",
+    )
+    parser_watch.add_argument(
+        "--flush-interval",
+        type=float,
+        default=config.WATCH_FLUSH_INTERVAL,
+        help=f"Seconds between graph saves (default: {config.WATCH_FLUSH_INTERVAL:g})",
+    )
+    parser_watch.add_argument("--host", type=str, default=config.DAEMON_HOST, help="HTTP endpoint address")
+    parser_watch.add_argument("--port", type=int, default=config.DAEMON_PORT, help="HTTP endpoint port")
+    parser_watch.add_argument("--no-http", action="store_true", help="Do not start the HTTP endpoint")
+    parser_watch.add_argument(
+        "--once", action="store_true", help="Ingest the PDFs currently in the directory, save and exit"
+    )
+    parser_watch.add_argument(
+        "--tripos-part",
+        type=str,
+        choices=["IA", "IB", "II", "Unknown"],
+        default="Unknown",
+        help="Specify Tripos Part (IA, IB, II)",
+    )
+    parser_watch.add_argument("--course", type=str, help="Optional: Course module name for ingested questions")
+    parser_watch.add_argument(
+        "--workers",
+        type=int,
+        default=config.EXTRACT_WORKERS,
+        help="Worker processes for extraction (default: EXTRACT_WORKERS or CPU count)",
+    )
+    parser_watch.add_argument(
+        "--shard",
+        type=str,
+        help="Optional: Write to the named shard graph under SHARD_DIR instead of the main graph",
+    )
+    parser_watch.set_defaults(func=handle_watch)
+
+    # --- API Command ---
+    parser_api = subparsers.add_parser(
+        "api",
+        aliases=["query"],
+        help="Serve read-only queries (concepts, questions, papers, courses) over HTTP, cached per graph version.",
+    )
+    parser_api.add_argument("--host", type=str, default=config.DAEMON_HOST, help="HTTP endpoint address")
+    parser_api.add_argument("--port", type=int, default=config.QUERY_API_PORT, help="HTTP endpoint port")
+    parser_api.add_argument(
+        "--shard",
+        type=str,
+        help="Optional: Serve the named shard graph under SHARD_DIR instead of the main graph",
+    )
+    parser_api.set_defaults(func=handle_api)
+
+    # --- Export Command ---
+    parser_export = subparsers.add_parser(
+        "export",
+        help="Write papers, questions, concepts and their edges as columnar tables (Parquet/Arrow or chunked CSV).",
+    )
+    parser_export.add_argument(
+        "--format",
+        choices=("parquet", "arrow", "csv"),
+        default=config.EXPORT_FORMAT or None,
+        help="Output format; Parquet and Arrow need pyarrow (default: EXPORT_FORMAT, else parquet if pyarrow is installed, else csv)",
+    )
+    parser_export.add_argument(
+        "-o",
+        "--output-dir",
+        type=str,
+        default=config.EXPORT_DIR,
+        help=f"Directory for the table files and manifest.json (default: {config.EXPORT_DIR})",
+    )
+    parser_export.add_argument(
+        "--shard",
+        type=str,
+        help="Optional: Export the named shard graph under SHARD_DIR instead of the main graph",
+    )
+    parser_export.set_defaults(func=handle_export)
+
+    # --- Embed Command ---
+    parser_embed = subparsers.add_parser(
+        "embed", help="Compute concept embeddings for semantic search ('similar'). Requires numpy."
+    )
+    parser_embed.add_argument(
+        "--backend",
+        type=str,
+        default=config.EMBEDDING_BACKEND,
+        help=f"Embedding backend: 'hashing' or 'sentence-transformers' (default: {config.EMBEDDING_BACKEND})",
+    )
+    parser_embed.add_argument(
+        "--ivf",
+        type=int,
+        nargs="?",
+        const=0,
+        metavar="NLIST",
+        help="Also build an IVF index with NLIST clusters (default: about sqrt of the concept count)",
+    )
+    parser_embed.set_defaults(func=handle_embed)
+
+    # --- Similar Command ---
+    parser_similar = subparsers.add_parser(
+        "similar", help="Find concepts similar to the given texts, or near-duplicate concept pairs."
+    )
+    parser_similar.add_argument("query", nargs="*", help="Concept names or free text (e.g., 'red-black trees')")
+    parser_similar.add_argument("-k", type=int, default=10, help="Results per query (default: 10)")
+    parser_similar.add_argument(
+        "--nprobe", type=int, default=8, help="IVF clusters to scan per query (default: 8)"
+    )
+    parser_similar.add_argument("--exact", action="store_true", help="Ignore the IVF index and scan every concept")
+    parser_similar.add_argument(
+        "--duplicates", action="store_true", help="List concept pairs similar enough to be merge candidates"
+    )
+    parser_similar.add_argument(
+        "--threshold", type=float, default=0.9, help="Similarity threshold for --duplicates (default: 0.9)"
+    )
+    parser_similar.set_defaults(func=handle_similar)
+
+    # --- Related Command ---
+    parser_related = subparsers.add_parser(
+        "related", help="List the concepts most often mentioned in the same questions as the given concepts."
+    )
+    parser_related.add_argument("concept", nargs="+", help="Concept name(s), e.g., 'dynamic programming'")
+    parser_related.add_argument("-k", type=int, default=10, help="Neighbours per concept (default: 10)")
+    parser_related.set_defaults(func=handle_related)
+
+    # --- Benchmark Command ---
+    parser_benchmark = subparsers.add_parser(
+        "benchmark",
+        help="Time download/process/visualize and graph load/save on synthetic corpora against a local stand-in server.",
+    )
+    parser_benchmark.add_argument(
+        "--sizes", type=str, default="10,100,500", help="Comma-separated corpus sizes (default: 10,100,500)"
+    )
+    parser_benchmark.add_argument(
+        "-o", "--output", type=str, default="bench_results.json", help="Where to write the JSON results (default: bench_results.json)"
+    )
+    parser_benchmark.add_argument(
+        "--compare", type=str, help="Baseline JSON from an earlier run; exit non-zero if any stage regressed"
+    )
+    parser_benchmark.add_argument(
+        "--threshold", type=float, default=0.2, help="Allowed slowdown before a stage counts as regressed (default: 0.2 = 20%%)"
+    )
+    parser_benchmark.add_argument("--seed", type=int, default=0, help="Seed for the synthetic corpus (default: 0)")
+    parser_benchmark.add_argument(
+        "--keep-dir", type=str, help="Keep the generated corpora and graphs in this directory instead of a temp dir"
+    )
+    parser_benchmark.add_argument(
+        "--export-edges",
+        type=int,
+        metavar="N",
+        help="Also compare GraphML with the columnar export on a synthetic graph of N edges (e.g. 1000000)",
+    )
+    parser_benchmark.set_defaults(func=handle_benchmark)
+
     # --- Visualize Command ---
     parser_visualize = subparsers.add_parser(
         "visualize",
@@ -404,6 +1597,11 @@ def main():
         type=str,
         help="Output file path for the visualization (default: graph_visualization.html)",
     )
+    parser_visualize.add_argument(
+        "--co-occurs",
+        action="store_true",
+        help="Also draw concept co-occurrence edges (dashed, width by number of shared questions)",
+    )
     parser_visualize.set_defaults(func=handle_visualize)
 
     if len(sys.argv) == 1:
@@ -411,6 +1609,18 @@ def main():
         sys.exit(1)
 
     args = parser.parse_args()
+    log.configure(
+        level="WARNING" if args.quiet else args.log_level,
+        fmt=args.log_format,
+        progress=args.progress,
+    )
+
+    profiler = None
+    if args.profile:
+        import cProfile
+
+        profiler = cProfile.Profile()
+        profiler.enable()
 
     try:
         args.func(args)
@@ -419,6 +1629,16 @@ def main():
         # import traceback # Uncomment for full traceback during development
         # traceback.print_exc()
         sys.exit(1)
+    finally:
+        # Reports are written even when the command exits with an error
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(args.profile)
+            print(f"Profile written to {args.profile} (inspect with 'python -m pstats {args.profile}')", file=sys.stderr)
+        if args.metrics_out:
+            metrics.write_json_report(args.metrics_out, command=args.command)
+        if args.prometheus_out:
+            metrics.write_prometheus(args.prometheus_out)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,464 @@
+import heapq
+import itertools
+import logging
+import sys
+import xml.etree.ElementTree as ET
+from array import array
+from typing import Iterator
+import networkx as nx
+
+# Compact, read-mostly representation of the concept graph.
+#
+# A NetworkX DiGraph keeps a dict of attributes per node and per edge (every
+# MENTIONS edge carries its own {'type': 'MENTIONS'} dict). CompactGraph instead
+# uses integer node indexes, a single table of interned attribute values,
+# one array column per attribute name, and CSR (compressed sparse row)
+# adjacency per edge type. Build it with from_networkx or read_graphml, call
+# freeze() after adding edges, and use to_networkx() wherever NetworkX is
+# needed (e.g., visualization).
+
+logger = logging.getLogger(__name__)
+
+NODE_TYPES = ("Paper", "Question", "Concept")
+# Edges of any other type are kept too, each type in its own (unweighted) CSR
+EDGE_TYPES = ("PART_OF", "MENTIONS", "CO_OCCURS")
+# Edge types whose integer `weight` attribute is kept (in an array parallel to the CSR indices)
+WEIGHTED_EDGE_TYPES = ("CO_OCCURS",)
+
+_MISSING = -1
+_GRAPHML_NS = "{http://graphml.graphdrawing.org/xmlns}"
+
+
+class _CSR:
+    """Immutable adjacency for one edge type: neighbours of node i are indices[indptr[i]:indptr[i + 1]]."""
+
+    __slots__ = ("indptr", "indices", "weights")
+
+    def __init__(self, num_nodes: int, sources: array, targets: array, weights: array = None):
+        # Counting sort by source; neighbours are then sorted and deduplicated per row
+        # (for weighted edges the last weight given for a pair wins)
+        counts = array("i", bytes(4 * (num_nodes + 1)))
+        for s in sources:
+            counts[s + 1] += 1
+        for i in range(num_nodes):
+            counts[i + 1] += counts[i]
+        fill = array("i", counts)
+        indices = array("i", bytes(4 * len(sources)))
+        slot_weights = array("i", bytes(4 * len(sources))) if weights is not None else None
+        for j, (s, t) in enumerate(zip(sources, targets)):
+            indices[fill[s]] = t
+            if slot_weights is not None:
+                slot_weights[fill[s]] = weights[j]
+            fill[s] += 1
+
+        indptr = array("i", [0])
+        deduped = array("i")
+        deduped_weights = array("i") if weights is not None else None
+        for i in range(num_nodes):
+            start, end = counts[i], counts[i + 1]
+            if deduped_weights is None:
+                deduped.extend(sorted(set(indices[start:end])))
+            else:
+                row = dict(zip(indices[start:end], slot_weights[start:end]))
+                for t in sorted(row):
+                    deduped.append(t)
+                    deduped_weights.append(row[t])
+            indptr.append(len(deduped))
+        self.indptr = indptr
+        self.indices = deduped
+        self.weights = deduped_weights
+
+    def row(self, i: int) -> array:
+        return self.indices[self.indptr[i]:self.indptr[i + 1]]
+
+    def row_weights(self, i: int) -> array:
+        return self.weights[self.indptr[i]:self.indptr[i + 1]]
+
+    def degree(self, i: int) -> int:
+        return self.indptr[i + 1] - self.indptr[i]
+
+    def __len__(self) -> int:
+        return len(self.indices)
+
+
+class CompactGraph:
+    """
+    Memory-compact concept graph with integer node IDs and CSR adjacency.
+
+    Nodes are added with add_node and edges with add_edge (buffered until
+    freeze() builds the CSR arrays). Attribute values are interned in one value
+    table, so repeated strings such as course names or node types are stored once.
+    """
+
+    __slots__ = (
+        "_ids",
+        "_index",
+        "_types",
+        "_values",
+        "_value_index",
+        "_columns",
+        "_pending",
+        "_out",
+        "_in",
+        "version",
+        "graph_attrs",
+    )
+
+    def __init__(self):
+        self._ids: list[str] = []
+        self._index: dict[str, int] = {}
+        self._types = array("b")
+        self._values: list = []
+        self._value_index: dict = {}
+        self._columns: dict[str, array] = {}
+        self._pending = _empty_pending()
+        self._out: dict[str, _CSR] = {}
+        self._in: dict[str, _CSR] = {}
+        self.version = 0  # Saved graph version this was loaded from (see graph_store.commit_changes)
+        self.graph_attrs: dict = {}  # Other graph-level attributes (e.g., graph_store.CO_OCCURRENCE_BUILT)
+
+    # --- Construction ---
+
+    def _intern(self, value) -> int:
+        if isinstance(value, str):
+            value = sys.intern(value)
+        # Keyed with the type: 1, 1.0 and True are equal dict keys but must read back as given
+        key = (type(value), value)
+        code = self._value_index.get(key)
+        if code is None:
+            code = len(self._values)
+            self._values.append(value)
+            self._value_index[key] = code
+        return code
+
+    def add_node(self, node_id: str, node_type: str, **attrs) -> int:
+        """
+        Adds a node (or updates its attributes). Returns its integer index.
+
+        Types outside NODE_TYPES are kept as an ordinary "type" attribute.
+        """
+        index = self._index.get(node_id)
+        if index is None:
+            index = len(self._ids)
+            self._ids.append(sys.intern(node_id))
+            self._index[node_id] = index
+            self._types.append(NODE_TYPES.index(node_type) if node_type in NODE_TYPES else _MISSING)
+            for column in self._columns.values():
+                column.append(_MISSING)
+        if node_type not in NODE_TYPES:
+            attrs["type"] = node_type
+        for name, value in attrs.items():
+            if value is None:
+                continue
+            column = self._columns.get(name)
+            if column is None:
+                column = self._columns[name] = array("i", [_MISSING]) * len(self._ids)
+            column[index] = self._intern(value)
+        return index
+
+    def add_edge(self, source_id: str, target_id: str, edge_type: str, weight: int = 1):
+        """
+        Buffers an edge between existing nodes; call freeze() before querying adjacency.
+
+        `weight` is only kept for WEIGHTED_EDGE_TYPES.
+        """
+        if edge_type not in self._pending:
+            self._pending[edge_type] = (array("i"), array("i"), None)
+        sources, targets, weights = self._pending[edge_type]
+        sources.append(self._index[source_id])
+        targets.append(self._index[target_id])
+        if weights is not None:
+            weights.append(int(weight))
+
+    def freeze(self):
+        """Builds (or rebuilds) the CSR adjacency from all buffered edges. Duplicate edges are dropped."""
+        num_nodes = len(self._ids)
+        for edge_type, (sources, targets, weights) in self._pending.items():
+            if edge_type in self._out:
+                # Fold the existing adjacency back in (before the new edges, so new weights win)
+                csr = self._out[edge_type]
+                old_sources, old_targets = array("i"), array("i")
+                for i in range(len(csr.indptr) - 1):
+                    row = csr.row(i)
+                    old_sources.extend([i] * len(row))
+                    old_targets.extend(row)
+                sources, targets = old_sources + sources, old_targets + targets
+                if weights is not None:
+                    weights = csr.weights + weights
+            self._out[edge_type] = _CSR(num_nodes, sources, targets, weights)
+            self._in[edge_type] = _CSR(num_nodes, targets, sources, weights)
+        self._pending = _empty_pending()
+
+    # --- Queries ---
+
+    def number_of_nodes(self) -> int:
+        return len(self._ids)
+
+    def number_of_edges(self, edge_type: str = None) -> int:
+        types = [edge_type] if edge_type else list(self._out)
+        return sum(len(self._out[t]) for t in types if t in self._out)
+
+    def __contains__(self, node_id: str) -> bool:
+        return node_id in self._index
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def index_of(self, node_id: str) -> int:
+        return self._index[node_id]
+
+    def node_id(self, index: int) -> str:
+        return self._ids[index]
+
+    def node_type(self, index: int) -> str | None:
+        code = self._types[index]
+        return NODE_TYPES[code] if code != _MISSING else self.attr(index, "type")
+
+    def attr(self, index: int, name: str, default=None):
+        column = self._columns.get(name)
+        if column is None or column[index] == _MISSING:
+            return default
+        return self._values[column[index]]
+
+    def node_attrs(self, index: int) -> dict:
+        """Returns the attributes of a node as a dict (as NetworkX would store them)."""
+        attrs = {"type": self.node_type(index)} if self._types[index] != _MISSING else {}
+        for name, column in self._columns.items():
+            if column[index] != _MISSING:
+                attrs[name] = self._values[column[index]]
+        return attrs
+
+    def nodes_of_type(self, node_type: str) -> Iterator[int]:
+        code = NODE_TYPES.index(node_type)
+        return (i for i, t in enumerate(self._types) if t == code)
+
+    def successors(self, index: int, edge_type: str) -> array:
+        csr = self._out.get(edge_type)
+        return csr.row(index) if csr else array("i")
+
+    def predecessors(self, index: int, edge_type: str) -> array:
+        csr = self._in.get(edge_type)
+        return csr.row(index) if csr else array("i")
+
+    def top_co_occurring(self, index: int, k: int = 10) -> list[tuple[int, int]]:
+        """
+        Returns up to k (concept index, shared question count) pairs, highest
+        count first and ties by node ID (as graph_store.top_co_occurring).
+        """
+        csr = self._out.get("CO_OCCURS")
+        if csr is None:
+            return []
+        # Each pair is stored once (smaller ID first), so partners come from both directions
+        reverse = self._in["CO_OCCURS"]
+        pairs = itertools.chain(
+            zip(csr.row(index), csr.row_weights(index)), zip(reverse.row(index), reverse.row_weights(index))
+        )
+        return heapq.nsmallest(k, pairs, key=lambda item: (-item[1], self._ids[item[0]]))
+
+    def in_degree(self, index: int, edge_type: str) -> int:
+        csr = self._in.get(edge_type)
+        return csr.degree(index) if csr else 0
+
+    def concept_frequencies(self) -> list[tuple[str, int]]:
+        """Returns (concept name, number of questions mentioning it), most frequent first."""
+        counts = [
+            (self.attr(i, "name", self._ids[i]), self.in_degree(i, "MENTIONS"))
+            for i in self.nodes_of_type("Concept")
+        ]
+        counts.sort(key=lambda item: (-item[1], item[0]))
+        return counts
+
+    def edges(self, edge_type: str) -> Iterator[tuple[int, int]]:
+        """Yields (source, target) index pairs for one edge type."""
+        csr = self._out.get(edge_type)
+        if csr is None:
+            return
+        for i in range(len(csr.indptr) - 1):
+            for t in csr.row(i):
+                yield i, t
+
+    def weighted_edges(self, edge_type: str) -> Iterator[tuple[int, int, int]]:
+        """Yields (source, target, weight) for a weighted edge type."""
+        csr = self._out.get(edge_type)
+        if csr is None or csr.weights is None:
+            return
+        for i in range(len(csr.indptr) - 1):
+            yield from ((i, t, w) for t, w in zip(csr.row(i), csr.row_weights(i)))
+
+    # --- Columnar access (the internal arrays themselves, e.g. for exporter.py; do not modify) ---
+
+    def node_ids(self) -> list[str]:
+        """Node ID per node index."""
+        return self._ids
+
+    def type_codes(self) -> array:
+        """Node type per node index, as a position in NODE_TYPES (-1 if untyped)."""
+        return self._types
+
+    def attr_codes(self, name: str) -> array | None:
+        """Per node index, the position of its `name` value in value_table() (-1 if unset)."""
+        return self._columns.get(name)
+
+    def value_table(self) -> list:
+        """The interned attribute values that attr_codes() point into."""
+        return self._values
+
+    def adjacency(self, edge_type: str, reverse: bool = False) -> tuple[array, array, array | None] | None:
+        """
+        CSR arrays (indptr, indices, weights or None) of one edge type, grouped by
+        source node (by target node if `reverse`), or None if the graph has no such edges.
+        """
+        csr = (self._in if reverse else self._out).get(edge_type)
+        return (csr.indptr, csr.indices, csr.weights) if csr else None
+
+    def memory_bytes(self) -> int:
+        """Approximate size of the arrays and tables (excluding the interned strings themselves)."""
+        total = sys.getsizeof(self._ids) + sys.getsizeof(self._index) + sys.getsizeof(self._types)
+        total += sys.getsizeof(self._values) + sys.getsizeof(self._value_index)
+        total += sum(sys.getsizeof(column) for column in self._columns.values())
+        for csr in list(self._out.values()) + list(self._in.values()):
+            total += sys.getsizeof(csr.indptr) + sys.getsizeof(csr.indices)
+            if csr.weights is not None:
+                total += sys.getsizeof(csr.weights)
+        return total
+
+    # --- Conversion ---
+
+    @classmethod
+    def from_networkx(cls, graph: nx.DiGraph) -> "CompactGraph":
+        """Builds a frozen CompactGraph from a concept DiGraph."""
+        compact = cls()
+        compact.version = graph.graph.get("version", 0)
+        compact.graph_attrs = {k: v for k, v in graph.graph.items() if k != "version"}
+        for node_id, data in graph.nodes(data=True):
+            attrs = {k: v for k, v in data.items() if k != "type"}
+            compact.add_node(node_id, data.get("type"), **attrs)
+        dropped = _DroppedEdgeData()
+        for u, v, data in graph.edges(data=True):
+            edge_type = data.get("type")
+            if dropped.check(edge_type, data):
+                compact.add_edge(u, v, edge_type, data.get("weight", 1))
+        compact.freeze()
+        dropped.warn("NetworkX graph")
+        return compact
+
+    @classmethod
+    def read_graphml(cls, path: str) -> "CompactGraph":
+        """
+        Streams a GraphML file written by graph_store.save_graph straight into a
+        CompactGraph, without building the intermediate NetworkX graph.
+        """
+        compact = cls()
+        keys = {}  # key id -> (attr name, python type)
+        graph_keys = set()
+        casts = {"int": int, "long": int, "float": float, "double": float, "boolean": lambda v: v.lower() == "true"}
+        deferred_edges = []
+        dropped = _DroppedEdgeData()
+        for _, elem in ET.iterparse(path, events=("end",)):
+            tag = elem.tag.replace(_GRAPHML_NS, "")
+            if tag == "key":
+                keys[elem.get("id")] = (elem.get("attr.name"), casts.get(elem.get("attr.type"), str))
+                if elem.get("for") == "graph":
+                    graph_keys.add(elem.get("id"))
+            elif tag == "data" and elem.get("key") in graph_keys:
+                name, cast = keys[elem.get("key")]
+                if name == "version":
+                    compact.version = int(elem.text or 0)  # Embedded by graph_store._write_graph_file
+                else:
+                    compact.graph_attrs[name] = cast(elem.text or "")
+            elif tag == "node":
+                attrs = {}
+                for data in elem.findall(f"{_GRAPHML_NS}data"):
+                    name, cast = keys.get(data.get("key"), (data.get("key"), str))
+                    attrs[name] = cast(data.text or "")
+                node_type = attrs.pop("type", None)
+                compact.add_node(elem.get("id"), node_type, **attrs)
+                elem.clear()
+            elif tag == "edge":
+                attrs = {}
+                for data in elem.findall(f"{_GRAPHML_NS}data"):
+                    attrs[keys.get(data.get("key"), (data.get("key"),))[0]] = data.text
+                edge_type = attrs.get("type")
+                weight = int(float(attrs.get("weight") or 1))
+                if dropped.check(edge_type, attrs):
+                    source, target = elem.get("source"), elem.get("target")
+                    if source in compact and target in compact:
+                        compact.add_edge(source, target, edge_type, weight)
+                    else:
+                        deferred_edges.append((source, target, edge_type, weight))
+                elem.clear()
+        # GraphML allows edges before their nodes; add those once all nodes are known
+        for source, target, edge_type, weight in deferred_edges:
+            if source in compact and target in compact:
+                compact.add_edge(source, target, edge_type, weight)
+        compact.freeze()
+        dropped.warn(path)
+        return compact
+
+    def to_networkx(self) -> nx.DiGraph:
+        """
+        Materializes an equivalent NetworkX DiGraph, with the graph, node and edge
+        attributes that graph_store.load_graph would give.
+
+        This is an adapter for code that needs a DiGraph: it builds the whole
+        NetworkX graph, so it costs as much memory as loading one directly (the
+        'visualize' command therefore still uses graph_store.load_graph).
+        """
+        graph = nx.DiGraph(**self.graph_attrs, version=self.version)
+        for i, node_id in enumerate(self._ids):
+            graph.add_node(node_id, **self.node_attrs(i))
+        for edge_type, csr in self._out.items():
+            if csr.weights is not None:
+                graph.add_edges_from(
+                    (self._ids[u], self._ids[v], {"type": edge_type, "weight": w})
+                    for u, v, w in self.weighted_edges(edge_type)
+                )
+            else:
+                graph.add_edges_from(
+                    ((self._ids[u], self._ids[v]) for u, v in self.edges(edge_type)), type=edge_type
+                )
+        return graph
+
+
+class _DroppedEdgeData:
+    """Counts edge data CompactGraph cannot keep while loading, so it is reported rather than lost silently."""
+
+    def __init__(self):
+        self.untyped = 0
+        self.attrs: dict[str, int] = {}
+
+    def check(self, edge_type: str | None, attrs: dict) -> bool:
+        """Records what of an edge is dropped. Returns False if the whole edge is (it has no type)."""
+        if edge_type is None:
+            self.untyped += 1
+            return False
+        for name in attrs:
+            if name != "type" and not (name == "weight" and edge_type in WEIGHTED_EDGE_TYPES):
+                self.attrs[name] = self.attrs.get(name, 0) + 1
+        return True
+
+    def warn(self, source: str):
+        if self.untyped:
+            logger.warning("Dropped %d edge(s) without a type from %s.", self.untyped, source)
+        if self.attrs:
+            logger.warning(
+                "Dropped edge attributes CompactGraph does not store from %s: %s.",
+                source,
+                ", ".join(f"{name} ({count} edge(s))" for name, count in sorted(self.attrs.items())),
+            )
+
+
+def _empty_pending() -> dict:
+    """Edge buffers per type: (sources, targets, weights or None)."""
+    return {
+        edge_type: (array("i"), array("i"), array("i") if edge_type in WEIGHTED_EDGE_TYPES else None)
+        for edge_type in EDGE_TYPES
+    }
+
+
+# Example usage (for direct testing):
+# if __name__ == '__main__':
+#     from past_paper_analyzer import graph_store
+#     compact = CompactGraph.read_graphml("data/concept_graph.graphml")
+#     print(compact.number_of_nodes(), compact.number_of_edges(), compact.memory_bytes())
+#     print(compact.concept_frequencies()[:10])
@@ -12,9 +12,106 @@ load_dotenv(
 CL_AUTH_COOKIE = os.getenv("CL_AUTH_COOKIE")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 
+# --- Endpoints ---
+# Base URL of the CL solutions archive (overridable to point at a local stand-in, e.g. for benchmarks)
+CL_SOLUTIONS_BASE_URL = os.getenv(
+    "CL_SOLUTIONS_BASE_URL", "https://www.cl.cam.ac.uk/teaching/exams/solutions"
+).rstrip("/")
+# Concept extractor: "openai" (Vision LLM) or "fake" (deterministic, offline; for benchmarks)
+LLM_BACKEND = os.getenv("LLM_BACKEND", "openai")
+# OpenAI-compatible API used by the streaming extractor (LLM_STREAM=1); any server
+# speaking the chat completions SSE protocol works, e.g. the benchmark stand-in
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1").rstrip("/")
+LLM_STREAM = os.getenv("LLM_STREAM", "0").lower() in ("1", "true", "yes")
+LLM_MAX_TOKENS = int(os.getenv("LLM_MAX_TOKENS", "1500"))
+LLM_READ_TIMEOUT = float(os.getenv("LLM_READ_TIMEOUT", "60"))  # Max silence between streamed chunks
+
 # --- File Paths ---
 DEFAULT_GRAPH_PATH = "data/concept_graph.graphml"
 GRAPH_DATA_PATH = os.getenv("GRAPH_DATA_PATH", DEFAULT_GRAPH_PATH)
+# Seconds a writer waits for the graph file lock before giving up
+GRAPH_LOCK_TIMEOUT = float(os.getenv("GRAPH_LOCK_TIMEOUT", "60"))
+# Record every save of a graph as a delta in <graph>.history.sqlite (see graph_history.py);
+# a full snapshot is added once the changes since the last one reach RATIO x graph size
+GRAPH_HISTORY = os.getenv("GRAPH_HISTORY", "1").lower() not in ("0", "false", "no")
+GRAPH_HISTORY_SNAPSHOT_RATIO = float(os.getenv("GRAPH_HISTORY_SNAPSHOT_RATIO", "1.0"))
+# Shard-local graphs written by 'process/ingest --shard' and combined by 'merge'
+SHARD_DIR = os.getenv("SHARD_DIR", "data/shards")
+DEFAULT_JOB_DB_PATH = "data/jobs.sqlite"
+JOB_DB_PATH = os.getenv("JOB_DB_PATH", DEFAULT_JOB_DB_PATH)
+# Raw extraction results per question/model/prompt version, used by 'rebuild'
+EXTRACTION_DB_PATH = os.getenv("EXTRACTION_DB_PATH", "data/extractions.sqlite")
+# Catalogue of downloaded PDFs (size, mtime, hash, processing state), see catalogue.py
+CATALOGUE_DB_PATH = os.getenv("CATALOGUE_DB_PATH", "data/catalogue.sqlite")
+
+# --- Logging ---
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")  # "text" or "json"
+
+# --- Downloads ---
+# Seconds to establish a connection / to wait between bytes of the response
+DOWNLOAD_CONNECT_TIMEOUT = float(os.getenv("DOWNLOAD_CONNECT_TIMEOUT", "5"))
+DOWNLOAD_READ_TIMEOUT = float(os.getenv("DOWNLOAD_READ_TIMEOUT", "30"))
+# Retries for transient failures (5xx, 429, timeouts), with exponential backoff and jitter
+DOWNLOAD_MAX_RETRIES = int(os.getenv("DOWNLOAD_MAX_RETRIES", "3"))
+DOWNLOAD_BACKOFF_BASE = float(os.getenv("DOWNLOAD_BACKOFF_BASE", "0.5"))
+DOWNLOAD_BACKOFF_MAX = float(os.getenv("DOWNLOAD_BACKOFF_MAX", "30"))
+# Per-host circuit breaker: open when the failure rate over the last BREAKER_WINDOW
+# requests (at least BREAKER_MIN_REQUESTS of them) reaches BREAKER_FAILURE_RATE
+BREAKER_WINDOW = int(os.getenv("BREAKER_WINDOW", "20"))
+BREAKER_MIN_REQUESTS = int(os.getenv("BREAKER_MIN_REQUESTS", "10"))
+BREAKER_FAILURE_RATE = float(os.getenv("BREAKER_FAILURE_RATE", "0.5"))
+BREAKER_COOLDOWN = float(os.getenv("BREAKER_COOLDOWN", "30"))
+
+# --- Batch Runs ---
+# Number of times a job may fail before batch runs stop retrying it
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+
+# --- Extraction ---
+# Worker processes used for CPU-bound PDF rendering/encoding during batch extraction
+EXTRACT_WORKERS = int(os.getenv("EXTRACT_WORKERS", str(os.cpu_count() or 1)))
+PAGE_CACHE_DIR = os.getenv("PAGE_CACHE_DIR", "data/page_cache")
+PAGE_RENDER_DPI = int(os.getenv("PAGE_RENDER_DPI", "150"))
+# Page preprocessing before the vision model (page_optimizer.py, needs Pillow): drop
+# blank/duplicate pages, crop margins, grayscale, fit PAGE_TOKEN_BUDGET tokens per PDF.
+# Off by default: the budget is per PDF, so it must be sized for the usual page count
+PAGE_OPTIMIZE = os.getenv("PAGE_OPTIMIZE", "0").lower() not in ("0", "false", "no")
+PAGE_TOKEN_BUDGET = int(os.getenv("PAGE_TOKEN_BUDGET", "2500"))
+PAGE_MIN_SIDE = int(os.getenv("PAGE_MIN_SIDE", "512"))
+PAGE_BLANK_INK = float(os.getenv("PAGE_BLANK_INK", "0.002"))
+PAGE_DUPLICATE_DISTANCE = int(os.getenv("PAGE_DUPLICATE_DISTANCE", "24"))  # of 256 dHash bits
+PAGE_CROP_PADDING = int(os.getenv("PAGE_CROP_PADDING", "16"))
+
+# --- Watch Mode ---
+# 'watch' polls the downloads directory every WATCH_POLL_INTERVAL seconds and saves
+# the resident graph every WATCH_FLUSH_INTERVAL seconds; it answers queries on DAEMON_HOST:DAEMON_PORT
+WATCH_POLL_INTERVAL = float(os.getenv("WATCH_POLL_INTERVAL", "2"))
+WATCH_FLUSH_INTERVAL = float(os.getenv("WATCH_FLUSH_INTERVAL", "30"))
+DAEMON_HOST = os.getenv("DAEMON_HOST", "127.0.0.1")
+DAEMON_PORT = int(os.getenv("DAEMON_PORT", "8765"))
+
+# --- Query API ---
+# 'api' serves read-only graph queries on DAEMON_HOST:QUERY_API_PORT; up to
+# QUERY_CACHE_SIZE encoded responses are kept per graph version
+QUERY_API_PORT = int(os.getenv("QUERY_API_PORT", "8766"))
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "1024"))
+
+# --- Export ---
+# 'export' writes the graph as columnar tables to EXPORT_DIR: "parquet" or "arrow"
+# (need pyarrow) or "csv"; empty means Parquet when pyarrow is installed, else CSV.
+# EXPORT_CHUNK_ROWS is the Parquet row group / Arrow record batch / CSV file size.
+EXPORT_DIR = os.getenv("EXPORT_DIR", "data/export")
+EXPORT_FORMAT = os.getenv("EXPORT_FORMAT", "").lower()
+EXPORT_CHUNK_ROWS = int(os.getenv("EXPORT_CHUNK_ROWS", "1000000"))
+EXPORT_COMPRESSION = os.getenv("EXPORT_COMPRESSION", "zstd")
+
+# --- Embeddings ---
+# Concept vectors are written to <EMBEDDING_PATH>.f32 (+ .json IDs, optional .ivf.npz)
+EMBEDDING_PATH = os.getenv("EMBEDDING_PATH", "data/embeddings")
+# "hashing" (built-in, no model download) or "sentence-transformers" (local model)
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "hashing")
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+EMBEDDING_DIM = int(os.getenv("EMBEDDING_DIM", "256"))  # Used by the hashing backend
 
 
 # --- Validation and Setup ---
@@ -0,0 +1,279 @@
+import json
+import logging
+import os
+import signal
+import threading
+import time
+from http.server import ThreadingHTTPServer
+from typing import Callable
+from urllib.parse import urlparse
+from . import catalogue, config, graph_store, llm_extractor, extraction_store, metrics, query_api
+
+# Long-running watch mode ('python main.py watch'): keeps the graph in memory,
+# polls the downloads directory for new solutions PDFs, extracts and ingests
+# them as they appear, and flushes the accumulated changes to disk through
+# graph_store.commit_changes every `flush_interval` seconds. A small HTTP
+# server on localhost answers query_api queries from the resident graph, plus
+# GET /status with the watcher's progress.
+#
+# Directories are polled with os.scandir rather than inotify: it needs no
+# extra dependency, works on every platform, and a scan of a few thousand
+# entries every couple of seconds is negligible next to one extraction.
+
+logger = logging.getLogger(__name__)
+
+
+class Watcher:
+    """
+    Resident graph plus the state of the watched directory.
+
+    All graph reads and writes happen under `lock`, so the HTTP thread never
+    sees a graph in the middle of an update. Saving works on a copy outside
+    the lock, so queries are not held up by a flush.
+    """
+
+    def __init__(
+        self,
+        parse_filename: Callable[[str], dict | None],
+        watch_dir: str = "downloads",
+        graph_path: str = config.GRAPH_DATA_PATH,
+        tripos_part: str = "Unknown",
+        course: str = None,
+        workers: int = 1,
+    ):
+        self.parse_filename = parse_filename
+        self.watch_dir = watch_dir
+        self.graph_path = graph_path
+        self.tripos_part = tripos_part
+        self.course = course
+        self.workers = workers
+        self.lock = threading.RLock()
+        self.graph = graph_store.load_graph(graph_path)
+        self.store = extraction_store.connect()
+        self.catalogue = catalogue.connect()
+        self.started_at = time.time()
+        self.processed = 0
+        # Bumped on every change to the resident graph; keys the query cache between flushes
+        self.revision = 0
+        self.failed = 0
+        self.last_flush = time.monotonic()
+        # path -> (size, mtime) of files already handled (or deliberately skipped)
+        self._done: dict[str, tuple] = {}
+        # path -> (size, mtime) seen on the previous scan; a file is picked up once it stops changing
+        self._candidates: dict[str, tuple] = {}
+        # Extraction results applied to the resident graph but not yet saved: (metadata, concepts, course, digest, path)
+        self._unsaved: list[tuple] = []
+
+    # --- Directory scanning ---
+
+    def _scan(self) -> dict[str, tuple]:
+        found = {}
+        try:
+            entries = os.scandir(self.watch_dir)
+        except FileNotFoundError:
+            return found
+        with entries:
+            for entry in entries:
+                # Skip the content-addressed store and partial/temporary files
+                if entry.name.startswith(".") or not entry.name.lower().endswith(".pdf"):
+                    continue
+                if not entry.is_file():
+                    continue
+                stat = entry.stat()
+                found[entry.path] = (stat.st_size, stat.st_mtime)
+        return found
+
+    def mark_existing(self):
+        """Treats PDFs whose question is already in the graph as done, so a restart does not redo them."""
+        skipped = 0
+        for path, signature in self._scan().items():
+            metadata = self.parse_filename(os.path.basename(path))
+            if metadata and graph_store.question_node_id(metadata) in self.graph:
+                self._done[path] = signature
+                skipped += 1
+        logger.info("%d PDF(s) in %s are already in the graph.", skipped, self.watch_dir)
+
+    def poll(self) -> list[str]:
+        """Scans the directory once. Returns the paths that are new and have stopped changing."""
+        current = self._scan()
+        ready = [
+            path
+            for path, signature in current.items()
+            if self._done.get(path) != signature and self._candidates.get(path) == signature
+        ]
+        self._candidates = {path: sig for path, sig in current.items() if self._done.get(path) != sig}
+        return sorted(ready)
+
+    # --- Ingestion ---
+
+    def ingest(self, paths: list[str]):
+        """Extracts concepts from the given PDFs and applies them to the resident graph."""
+        metadata_by_path = {}
+        for path in paths:
+            self._done[path] = self._candidates.pop(path, None)
+            metadata = self.parse_filename(os.path.basename(path))
+            if metadata is None:
+                self.failed += 1
+                continue  # parse_filename already logged the problem
+            metadata["tripos_part"] = self.tripos_part
+            metadata_by_path[path] = metadata
+        if not metadata_by_path:
+            return
+
+        for path, concepts in llm_extractor.extract_concepts_batch(list(metadata_by_path), workers=self.workers):
+            metadata = metadata_by_path[path]
+            if not concepts:
+                logger.warning("No concepts extracted from %s.", path)
+                catalogue.mark(self.catalogue, [(metadata, path)], catalogue.STATE_FAILED)
+                self.failed += 1
+                continue
+            digest = extraction_store.record(
+                self.store,
+                metadata,
+                concepts,
+                llm_extractor.model_name(),
+                llm_extractor.PROMPT_VERSION,
+                course=self.course,
+                source_pdf=path,
+                graph_path=self.graph_path,
+            )
+            with self.lock:
+                graph_store.ingest_extraction(self.graph, metadata, concepts, course_module=self.course)
+                self._unsaved.append((metadata, concepts, self.course, digest, path))
+                self.revision += 1
+            self.processed += 1
+            metrics.incr("daemon.files_processed")
+            logger.info("Ingested %s (%d concept(s)); %d change(s) unsaved.", path, len(concepts), len(self._unsaved))
+
+    def flush(self) -> bool:
+        """Saves unsaved changes with one version-checked commit. Returns False if saving failed."""
+        self.last_flush = time.monotonic()
+        with self.lock:
+            if not self._unsaved:
+                return True
+            unsaved = list(self._unsaved)
+            # The GraphML write and history take far longer than a copy; do them without the lock
+            snapshot = self.graph.copy()
+
+        def apply_changes(graph):
+            # Re-applying is a no-op on the resident graph's copy; if another writer saved
+            # in the meantime, commit_changes replays these onto the latest graph instead
+            for metadata, concepts, course, _, _ in unsaved:
+                graph_store.ingest_extraction(graph, metadata, concepts, course_module=course)
+
+        with metrics.timer("daemon.flush"):
+            committed = graph_store.commit_changes(apply_changes, self.graph_path, graph=snapshot)
+        if committed is None:
+            logger.error("Flush failed; keeping %d change(s) for the next attempt.", len(unsaved))
+            return False
+        with self.lock:
+            self.graph = committed
+            self.revision += 1
+            self._unsaved = []
+        extraction_store.mark_applied(self.store, self.graph_path, [(meta, digest) for meta, _, _, digest, _ in unsaved])
+        catalogue.mark(
+            self.catalogue,
+            [(meta, path) for meta, _, _, _, path in unsaved],
+            catalogue.STATE_PROCESSED,
+            graph_path=self.graph_path,
+        )
+        metrics.incr("daemon.flushes")
+        logger.info("Flushed %d change(s) to %s.", len(unsaved), self.graph_path)
+        return True
+
+    def query_source(self) -> tuple:
+        """Graph source for query_api.QueryService: (revision, resident graph, lock)."""
+        with self.lock:
+            return f"{self.graph.graph.get('version', 0)}.{self.revision}", self.graph, self.lock
+
+    def status(self) -> dict:
+        with self.lock:
+            return {
+                "graph_path": self.graph_path,
+                "version": self.graph.graph.get("version", 0),
+                "nodes": self.graph.number_of_nodes(),
+                "edges": self.graph.number_of_edges(),
+                "processed": self.processed,
+                "failed": self.failed,
+                "unsaved": len(self._unsaved),
+                "uptime_seconds": round(time.time() - self.started_at, 1),
+            }
+
+
+class _DaemonHandler(query_api.QueryHandler):
+    """Query API over the resident graph, plus GET /status with the watcher's state."""
+
+    def do_GET(self):
+        if urlparse(self.path).path.rstrip("/") == "/status":
+            # Live counters: never cached
+            self.send_body(200, json.dumps(self.server.watcher.status()).encode("utf-8"))
+        else:
+            super().do_GET()
+
+
+def start_http_server(watcher: Watcher, host: str, port: int) -> ThreadingHTTPServer:
+    """Starts the query endpoint in a background thread and returns the server."""
+    httpd = query_api.make_server(query_api.QueryService(watcher.query_source), host, port, handler=_DaemonHandler)
+    httpd.watcher = watcher
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    return httpd
+
+
+def run(
+    watcher: Watcher,
+    poll_interval: float = config.WATCH_POLL_INTERVAL,
+    flush_interval: float = config.WATCH_FLUSH_INTERVAL,
+    host: str = config.DAEMON_HOST,
+    port: int = config.DAEMON_PORT,
+    once: bool = False,
+):
+    """
+    Runs the watch loop until interrupted (Ctrl+C or SIGTERM), then flushes.
+
+    Args:
+        watcher: The resident graph and watched directory.
+        poll_interval: Seconds between directory scans.
+        flush_interval: Seconds between saves of accumulated changes.
+        host, port: Address of the HTTP endpoint; port None disables it.
+        once: Process what is currently in the directory, flush and return (for scripts).
+    """
+    stop = threading.Event()
+    try:
+        signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    except ValueError:
+        pass  # Not in the main thread; rely on KeyboardInterrupt / stop
+
+    httpd = None
+    if port is not None:
+        httpd = start_http_server(watcher, host, port)
+        logger.info("Serving queries and status on http://%s:%d/", *httpd.server_address[:2])
+
+    watcher.mark_existing()
+    logger.info("Watching %s every %gs (flush every %gs). Press Ctrl+C to stop.", watcher.watch_dir, poll_interval, flush_interval)
+    try:
+        if once:
+            # The first scan only records sizes; files unchanged a poll interval later are complete
+            watcher.poll()
+            stop.wait(poll_interval)
+            watcher.ingest(watcher.poll())
+            return
+        while not stop.is_set():
+            ready = watcher.poll()
+            if ready:
+                watcher.ingest(ready)
+            if time.monotonic() - watcher.last_flush >= flush_interval:
+                watcher.flush()
+            stop.wait(poll_interval)
+    except KeyboardInterrupt:
+        logger.info("Interrupted; flushing before exit.")
+    finally:
+        watcher.flush()
+        if httpd is not None:
+            httpd.shutdown()
+            httpd.server_close()
+
+
+# Example usage (for direct testing):
+# if __name__ == '__main__':
+#     from past_paper_analyzer.cli import parse_filename
+#     run(Watcher(parse_filename), poll_interval=1.0, flush_interval=5.0)
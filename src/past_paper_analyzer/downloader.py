@@ -1,16 +1,249 @@
+import hashlib
 import requests
+import logging
 import os
-import sys
-from . import config
+import random
+import shutil
+import sqlite3
+import time
+from collections import deque
+from urllib.parse import urlparse
+from . import catalogue, config, metrics
+
+logger = logging.getLogger(__name__)
 
 # Ensure the downloads directory exists (redundant if check_config runs first, but safe)
 os.makedirs("downloads", exist_ok=True)
 
+# Content-addressed store: each distinct PDF is kept once as <sha256>.pdf and
+# files in downloads/ are hard links to it, so byte-identical solutions
+# (e.g., the same PDF published under two question numbers) take no extra space.
+STORE_DIR = os.path.join("downloads", ".store")
+
+# Bytes inspected before deciding whether a response really is a PDF. The PDF
+# header must appear within the first 1024 bytes.
+_HEAD_BYTES = 1024
+_CHUNK_SIZE = 65536
+_PDF_CONTENT_TYPES = ("application/pdf", "application/x-pdf", "application/octet-stream", "binary/octet-stream")
+
+# Set after the first response showing the cookie is rejected (401/403 or an
+# HTML login page instead of a PDF); every later download_pdf call in this
+# process then fails immediately instead of repeating a doomed request.
+_auth_failed = False
+
+
+class _NotAPdf(Exception):
+    """The response body is not a PDF (`login_page` is True if it looks like the Raven login page)."""
+
+    def __init__(self, reason: str, login_page: bool = False):
+        super().__init__(reason)
+        self.login_page = login_page
+
+
+def auth_failed() -> bool:
+    """Returns True once a response has shown that CL_AUTH_COOKIE is rejected."""
+    return _auth_failed
+
+
+def reset_auth_failure():
+    """Clears the auth-failed flag (e.g., after the cookie was refreshed)."""
+    global _auth_failed
+    _auth_failed = False
+
+
+def _flag_auth_failure(reason: str, url: str):
+    global _auth_failed
+    if not _auth_failed:
+        logger.error(
+            "Authentication failed (%s). Skipping remaining downloads; refresh CL_AUTH_COOKIE in .env.",
+            reason,
+            extra={"url": url},
+        )
+        metrics.incr("download.auth_failures")
+    _auth_failed = True
+
+
+def _read_head(chunks) -> bytes:
+    """Reads from the chunk iterator until at least _HEAD_BYTES are buffered (or the body ends)."""
+    head = b""
+    for chunk in chunks:
+        head += chunk
+        if len(head) >= _HEAD_BYTES:
+            break
+    return head
+
+
+def _check_pdf(content_type: str, head: bytes):
+    """Raises _NotAPdf unless the response looks like a PDF, judged by its content type and first bytes."""
+    media_type = content_type.split(";")[0].strip().lower()
+    looks_like_html = b"<html" in head[:_HEAD_BYTES].lower() or b"<!doctype" in head[:_HEAD_BYTES].lower()
+    if media_type == "text/html" or looks_like_html:
+        raise _NotAPdf(f"got an HTML page ({media_type or 'no content type'}) instead of a PDF", login_page=True)
+    if b"%PDF-" not in head[:_HEAD_BYTES]:
+        raise _NotAPdf(f"missing %PDF header (content type {media_type or 'unknown'})")
+    if media_type and media_type not in _PDF_CONTENT_TYPES:
+        logger.debug("Unexpected content type %s for a PDF; accepting based on its header.", media_type)
+
+
+def _store_path(digest: str) -> str:
+    return os.path.join(STORE_DIR, digest[:2], f"{digest}.pdf")
+
+
+def _link_from_store(tmp_path: str, digest: str, output_path: str) -> bool:
+    """
+    Moves a finished download into the store (unless identical bytes are already
+    there) and hard-links it to `output_path`. Returns True if it was a duplicate.
+
+    If `output_path` held different content before, its stored copy is removed
+    once no file in downloads/ links to it any more.
+    """
+    store_path = _store_path(digest)
+    os.makedirs(os.path.dirname(store_path), exist_ok=True)
+    duplicate = os.path.exists(store_path)
+    if duplicate:
+        os.remove(tmp_path)
+    else:
+        os.replace(tmp_path, store_path)
+    previous = None
+    if os.path.exists(output_path) and not os.path.samefile(output_path, store_path):
+        previous = _store_path(catalogue.file_sha256(output_path))
+
+    # Link under a temporary name and rename, so output_path is never missing or partial
+    link_tmp = f"{output_path}.tmp.{os.getpid()}"
+    try:
+        os.link(store_path, link_tmp)
+    except OSError:
+        # Hard links unsupported (e.g., some filesystems): fall back to a copy
+        shutil.copyfile(store_path, link_tmp)
+    os.replace(link_tmp, output_path)
+    if previous and os.path.exists(previous) and os.stat(previous).st_nlink == 1:
+        os.remove(previous)
+        metrics.incr("download.store_pruned")
+    return duplicate
+
+
+class _Retryable(Exception):
+    """A transient failure (5xx, 429, timeout, dropped connection) worth retrying."""
+
+    def __init__(self, reason: str, retry_after: float = None):
+        super().__init__(reason)
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Per-host circuit breaker over the outcomes of the last BREAKER_WINDOW requests.
+
+    Closed: requests flow and outcomes are recorded. When at least
+    BREAKER_MIN_REQUESTS outcomes are recorded and the failure rate reaches
+    BREAKER_FAILURE_RATE, the breaker opens and requests fail fast for
+    BREAKER_COOLDOWN seconds. Then one trial request is let through
+    (half-open): success closes the breaker, failure opens it again.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half-open"
+
+    def __init__(self, host: str):
+        self.host = host
+        self.state = self.CLOSED
+        self.outcomes = deque(maxlen=max(config.BREAKER_WINDOW, 1))
+        self.opened_at = 0.0
+
+    def is_open(self) -> bool:
+        """True while requests fail fast (open and still cooling down)."""
+        return self.state == self.OPEN and time.monotonic() - self.opened_at < config.BREAKER_COOLDOWN
+
+    def allow(self) -> bool:
+        if self.state == self.OPEN:
+            if self.is_open():
+                return False
+            self.state = self.HALF_OPEN
+            logger.info("Circuit breaker for %s half-open; sending a trial request.", self.host)
+        return True
+
+    def record(self, success: bool):
+        if self.state == self.HALF_OPEN:
+            if success:
+                self.state = self.CLOSED
+                self.outcomes.clear()
+                logger.info("Circuit breaker for %s closed.", self.host)
+            else:
+                self._trip()
+            return
+        self.outcomes.append(success)
+        failures = self.outcomes.count(False)
+        if (
+            self.state == self.CLOSED
+            and len(self.outcomes) >= config.BREAKER_MIN_REQUESTS
+            and failures / len(self.outcomes) >= config.BREAKER_FAILURE_RATE
+        ):
+            self._trip()
+
+    def _trip(self):
+        self.state = self.OPEN
+        self.opened_at = time.monotonic()
+        self.outcomes.clear()
+        metrics.incr("download.breaker_trips")
+        logger.warning(
+            "Circuit breaker for %s opened after repeated failures; failing fast for %gs.",
+            self.host,
+            config.BREAKER_COOLDOWN,
+            extra={"host": self.host},
+        )
+
+
+_breakers: dict[str, CircuitBreaker] = {}
+
+
+def _breaker_for(host: str) -> CircuitBreaker:
+    breaker = _breakers.get(host)
+    if breaker is None:
+        breaker = _breakers[host] = CircuitBreaker(host)
+    return breaker
+
+
+def breaker_open() -> bool:
+    """
+    Returns True while the circuit breaker for the solutions site is open, i.e.
+    download_pdf fails without making a request because the site is down.
+    """
+    breaker = _breakers.get(urlparse(config.CL_SOLUTIONS_BASE_URL).netloc)
+    return breaker is not None and breaker.is_open()
+
+
+def reset_circuit_breakers():
+    """Forgets all breaker state (e.g., between benchmark runs)."""
+    _breakers.clear()
+
+
+def _backoff_delay(attempt: int, retry_after: float = None) -> float:
+    """Exponential backoff with full jitter; a server's Retry-After is honoured up to DOWNLOAD_BACKOFF_MAX."""
+    if retry_after is not None:
+        return min(retry_after, config.DOWNLOAD_BACKOFF_MAX)
+    return random.uniform(0, min(config.DOWNLOAD_BACKOFF_MAX, config.DOWNLOAD_BACKOFF_BASE * 2**attempt))
+
+
+def _retry_after_seconds(response: requests.Response) -> float | None:
+    value = response.headers.get("Retry-After")
+    try:
+        return max(float(value), 0.0) if value is not None else None
+    except ValueError:
+        return None  # HTTP-date form; fall back to our own backoff
+
 
 def download_pdf(year: int, paper_code: str, question_number: str) -> str | None:
     """
     Downloads a specific past paper solutions PDF from the CL website.
 
+    The body is validated as it streams: the first chunk must carry the %PDF
+    header (an HTML login page aborts the download and flags the cookie as
+    rejected, see auth_failed). The bytes are hashed on the way to disk and
+    stored once per content hash, with downloads/<filename> hard-linked to it.
+
+    Transient failures (5xx, 429, timeouts, dropped connections) are retried
+    up to DOWNLOAD_MAX_RETRIES times with exponential backoff and jitter, and
+    a per-host circuit breaker fails fast while the site is clearly down.
+
     Args:
         year: The exam year (e.g., 2022).
         paper_code: The paper code (e.g., "p06").
@@ -21,16 +254,17 @@ def download_pdf(year: int, paper_code: str, question_number: str) -> str | None
     """
     # Example URL: https://www.cl.cam.ac.uk/teaching/exams/solutions/2022/2022-p06-q01-solutions.pdf
     filename = f"{year}-{paper_code}-{question_number}-solutions.pdf"
-    url = f"https://www.cl.cam.ac.uk/teaching/exams/solutions/{year}/{filename}"
+    url = f"{config.CL_SOLUTIONS_BASE_URL}/{year}/{filename}"
     output_path = os.path.join("downloads", filename)
 
-    print(f"Attempting to download: {url}")
+    logger.debug("Attempting to download: %s", url)
 
     if not config.CL_AUTH_COOKIE:
-        print(
-            "Error: CL_AUTH_COOKIE is not set in the .env file. Cannot authenticate.",
-            file=sys.stderr,
-        )
+        logger.error("CL_AUTH_COOKIE is not set in the .env file. Cannot authenticate.")
+        return None
+    if _auth_failed:
+        metrics.incr("download.skipped_auth")
+        logger.debug("Skipping %s: authentication already failed in this run.", filename)
         return None
 
     # Use the cookie value directly in the Cookie header
@@ -39,47 +273,164 @@ def download_pdf(year: int, paper_code: str, question_number: str) -> str | None
         "User-Agent": "PastPaperConceptAnalyzer/0.1 (Python script; contact example@example.com)",  # Good practice
     }
 
+    breaker = _breaker_for(urlparse(url).netloc)
+    max_retries = max(config.DOWNLOAD_MAX_RETRIES, 0)
+    # Use a session object for connection reuse across retries
+    with requests.Session() as session:
+        session.headers.update(headers)
+        for attempt in range(max_retries + 1):
+            if not breaker.allow():
+                metrics.incr("download.breaker_rejected")
+                logger.debug("Circuit breaker open for %s; not requesting %s.", breaker.host, filename)
+                return None
+            try:
+                with metrics.timer("download.request"):
+                    result = _attempt_download(session, url, filename, output_path)
+                breaker.record(True)  # Includes permanent failures (404, invalid PDF): the host answered
+                if result is None:
+                    return None
+                path, digest = result
+                _record_in_catalogue(
+                    {"year": year, "paper_code": paper_code, "question_num": question_number}, path, digest
+                )
+                return path
+            except _Retryable as e:
+                breaker.record(False)
+                if attempt == max_retries:
+                    logger.error(
+                        "Downloading %s failed after %d attempt(s): %s", url, attempt + 1, e, extra={"url": url}
+                    )
+                    return None
+                delay = _backoff_delay(attempt, e.retry_after)
+                metrics.incr("download.retries")
+                logger.info(
+                    "Transient failure for %s (%s); retrying in %.2fs (attempt %d of %d).",
+                    filename,
+                    e,
+                    delay,
+                    attempt + 2,
+                    max_retries + 1,
+                )
+                time.sleep(delay)
+    return None
+
+
+def _record_in_catalogue(metadata: dict, path: str, digest: str):
+    """Adds a finished download to the catalogue; a catalogue error never fails the download."""
     try:
-        # Use a session object for potential connection reuse
-        with requests.Session() as session:
-            session.headers.update(headers)
-            response = session.get(url, stream=True, timeout=60)  # Increased timeout
+        conn = catalogue.connect()
+        try:
+            catalogue.record_download(conn, metadata, path, sha256=digest)
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        logger.warning("Could not record %s in the catalogue: %s", path, e)
+
+
+def _attempt_download(
+    session: requests.Session, url: str, filename: str, output_path: str
+) -> tuple[str, str] | None:
+    """
+    Makes one request for a PDF and stores it.
 
+    Returns:
+        A tuple (output path, SHA-256 hex digest) on success, or None on a
+        permanent failure (403/404, not a PDF, ...).
+
+    Raises:
+        _Retryable: For transient failures (5xx, 429, timeouts, dropped connections).
+    """
+    tmp_path = None
+    try:
+        metrics.incr("download.requests")
+        response = session.get(
+            url, stream=True, timeout=(config.DOWNLOAD_CONNECT_TIMEOUT, config.DOWNLOAD_READ_TIMEOUT)
+        )
+
+        with response:  # Releases the streamed connection on every path, including the early returns
             # Check status code immediately after the request
-            if response.status_code == 403:
-                print(
-                    "Download failed: 403 Forbidden. Check your CL_AUTH_COOKIE value in .env.",
-                    file=sys.stderr,
+            if response.status_code in (401, 403, 404):
+                metrics.incr(f"download.http_{response.status_code}")
+            if response.status_code in (401, 403):
+                logger.warning(
+                    "Download failed: HTTP %d for %s. Check your CL_AUTH_COOKIE value in .env.",
+                    response.status_code,
+                    filename,
+                    extra={"url": url, "status": response.status_code},
                 )
+                _flag_auth_failure(f"HTTP {response.status_code}", url)
                 return None
             elif response.status_code == 404:
-                print(
-                    f"Download failed: 404 Not Found. Check year ({year}), paper code ({paper_code}), and question number ({question_number}).",
-                    file=sys.stderr,
+                logger.warning(
+                    "Download failed: 404 Not Found for %s. Check year, paper code, and question number.",
+                    filename,
+                    extra={"url": url, "status": 404},
                 )
                 return None
+            elif response.status_code == 429 or response.status_code >= 500:
+                metrics.incr("download.http_5xx" if response.status_code >= 500 else "download.http_429")
+                raise _Retryable(f"HTTP {response.status_code}", _retry_after_seconds(response))
 
-            # Raise an exception for other bad status codes (e.g., 5xx)
+            # Raise an exception for other bad status codes
             response.raise_for_status()
 
-            # Stream the download
-            with open(output_path, "wb") as f:
-                for chunk in response.iter_content(chunk_size=8192):
+            # Validate the first bytes before writing anything
+            chunks = response.iter_content(chunk_size=_CHUNK_SIZE)
+            head = _read_head(chunks)
+            _check_pdf(response.headers.get("Content-Type", ""), head)
+
+            # Stream the rest to a temporary file in the store, hashing as we go
+            os.makedirs(STORE_DIR, exist_ok=True)
+            tmp_path = os.path.join(STORE_DIR, f"{filename}.part.{os.getpid()}")
+            sha256 = hashlib.sha256(head)
+            bytes_written = len(head)
+            with open(tmp_path, "wb") as f:
+                f.write(head)
+                for chunk in chunks:
+                    sha256.update(chunk)
                     f.write(chunk)
+                    bytes_written += len(chunk)
 
-            print(f"Successfully downloaded '{filename}' to '{output_path}'")
-            return output_path
+            digest = sha256.hexdigest()
+            if _link_from_store(tmp_path, digest, output_path):
+                metrics.incr("download.deduplicated")
+                logger.info("'%s' is identical to an earlier download; linked to the stored copy.", filename)
+            tmp_path = None
 
-    except requests.exceptions.Timeout:
-        print(f"Error: Download timed out for {url}", file=sys.stderr)
+            metrics.incr("download.bytes", bytes_written)
+            metrics.incr("download.success")
+            logger.info(
+                "Successfully downloaded '%s' to '%s'",
+                filename,
+                output_path,
+                extra={"url": url, "bytes": bytes_written, "sha256": digest},
+            )
+            return output_path, digest
+
+    except _NotAPdf as e:
+        metrics.incr("download.invalid")
+        logger.warning("Download of %s rejected: %s.", filename, e, extra={"url": url})
+        if e.login_page:
+            _flag_auth_failure("login page returned instead of a PDF", url)
         return None
+    except requests.exceptions.Timeout as e:
+        metrics.incr("download.timeouts")
+        raise _Retryable(f"timed out ({type(e).__name__})")
+    except (requests.exceptions.ConnectionError, requests.exceptions.ChunkedEncodingError) as e:
+        metrics.incr("download.errors")
+        raise _Retryable(f"connection error: {e}")
     except requests.exceptions.RequestException as e:
-        print(f"Error downloading {url}: {e}", file=sys.stderr)
+        metrics.incr("download.errors")
+        logger.error("Downloading %s failed: %s", url, e)
         return None
+    except _Retryable:
+        raise
     except Exception as e:
-        print(f"An unexpected error occurred during download: {e}", file=sys.stderr)
+        logger.error("An unexpected error occurred during download: %s", e)
         return None
-
+    finally:
+        if tmp_path and os.path.exists(tmp_path):
+            os.remove(tmp_path)
 
 # Example usage (for direct testing):
 # if __name__ == '__main__':
@@ -0,0 +1,384 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import networkx as nx
+from . import config, metrics
+
+# Vector search over concepts (optional dependency: numpy).
+#
+# Concept names and definitions are embedded by a pluggable embedder and stored
+# as an L2-normalized float32 matrix in `<EMBEDDING_PATH>.f32`, memory-mapped on
+# load, with row i belonging to the concept node ID ids[i] in `<EMBEDDING_PATH>.json`.
+# Cosine similarity is then a matrix product; top-k uses argpartition. An optional
+# IVF index (`<EMBEDDING_PATH>.ivf.npz`) restricts queries to the nearest clusters.
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+logger = logging.getLogger(__name__)
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+def _require_numpy() -> bool:
+    if np is None:
+        logger.error("'numpy' library not found. Embeddings need it. Install with 'pip install numpy'")
+        return False
+    return True
+
+
+class HashingEmbedder:
+    """
+    Dependency-free stub embedder: signed feature hashing of words and character trigrams.
+
+    Captures lexical overlap only ("red-black tree" ~ "red black trees"), but is
+    deterministic, fast and needs no model download.
+    """
+
+    name = "hashing"
+
+    def __init__(self, dim: int = config.EMBEDDING_DIM):
+        self.dim = dim
+
+    def _features(self, text: str) -> list[str]:
+        words = _TOKEN_PATTERN.findall(text.lower())
+        features = [f"w:{word}" for word in words]
+        for word in words:
+            padded = f" {word} "
+            features.extend(f"c:{padded[i:i + 3]}" for i in range(len(padded) - 2))
+        return features
+
+    def embed(self, texts: list[str]) -> "np.ndarray":
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature in self._features(text):
+                digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+                bucket = int.from_bytes(digest[:4], "little") % self.dim
+                vectors[row, bucket] += 1.0 if digest[4] & 1 else -1.0
+        return _normalize(vectors)
+
+
+class SentenceTransformerEmbedder:
+    """Local transformer model via the optional 'sentence-transformers' package."""
+
+    name = "sentence-transformers"
+
+    def __init__(self, model_name: str = config.EMBEDDING_MODEL):
+        from sentence_transformers import SentenceTransformer  # Optional dependency
+
+        self.model_name = model_name
+        self.model = SentenceTransformer(model_name)
+        self.dim = self.model.get_sentence_embedding_dimension()
+
+    def embed(self, texts: list[str]) -> "np.ndarray":
+        vectors = self.model.encode(texts, batch_size=256, convert_to_numpy=True, show_progress_bar=False)
+        return _normalize(vectors.astype(np.float32, copy=False))
+
+
+EMBEDDERS = {
+    HashingEmbedder.name: HashingEmbedder,
+    SentenceTransformerEmbedder.name: SentenceTransformerEmbedder,
+}
+
+
+def get_embedder(backend: str = config.EMBEDDING_BACKEND, model_name: str = None):
+    """
+    Returns an embedder instance for `backend`, or None if it is unknown or unavailable.
+
+    `model_name` overrides EMBEDDING_MODEL for backends that load a model.
+    """
+    if not _require_numpy():
+        return None
+    factory = EMBEDDERS.get(backend)
+    if factory is None:
+        logger.error("Unknown embedding backend '%s' (choose from %s).", backend, ", ".join(EMBEDDERS))
+        return None
+    try:
+        return factory(model_name) if model_name else factory()
+    except ImportError as e:
+        logger.error("Embedding backend '%s' is not installed: %s", backend, e)
+        return None
+
+
+def _normalize(vectors: "np.ndarray") -> "np.ndarray":
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    vectors /= norms
+    return vectors
+
+
+def concept_text(data: dict) -> str:
+    """Returns the text embedded for a Concept node: its name plus definition, if any."""
+    name = data.get("name", "")
+    definition = data.get("definition")
+    if definition and definition != "No definition provided":
+        return f"{name}: {definition}"
+    return name
+
+
+def _text_hash(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:16]
+
+
+class EmbeddingIndex:
+    """Concept vectors (one L2-normalized float32 row per concept) with cosine top-k search."""
+
+    def __init__(self, ids: list[str], matrix: "np.ndarray", meta: dict = None, ivf: dict = None):
+        self.ids = ids
+        self.matrix = matrix
+        self.meta = meta or {}
+        self.ivf = ivf
+        self._row_of = {node_id: row for row, node_id in enumerate(ids)}
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def vector(self, node_id: str) -> "np.ndarray | None":
+        row = self._row_of.get(node_id)
+        return None if row is None else self.matrix[row]
+
+    def search(
+        self, queries: "np.ndarray", k: int = 10, nprobe: int = 8, block_rows: int = 65536
+    ) -> list[list[tuple[str, float]]]:
+        """
+        Batched cosine top-k search.
+
+        Args:
+            queries: (q, dim) array of L2-normalized query vectors.
+            k: Results per query.
+            nprobe: Clusters scanned per query when an IVF index is loaded.
+            block_rows: Matrix rows scored at a time (bounds temporary memory for large indexes).
+
+        Returns:
+            For each query, up to k (node_id, similarity) pairs, most similar first.
+        """
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        if len(self.ids) == 0:
+            return [[] for _ in range(len(queries))]
+        with metrics.timer("embeddings.search"):
+            if self.ivf is not None:
+                return [self._search_ivf(query, k, nprobe) for query in queries]
+            return self._search_exact(queries, k, block_rows)
+
+    def _search_exact(self, queries: "np.ndarray", k: int, block_rows: int) -> list[list[tuple[str, float]]]:
+        best_scores = np.full((len(queries), 0), -np.inf, dtype=np.float32)
+        best_rows = np.zeros((len(queries), 0), dtype=np.int64)
+        for start in range(0, len(self.ids), block_rows):
+            scores = queries @ self.matrix[start:start + block_rows].T
+            rows = np.broadcast_to(np.arange(start, start + scores.shape[1]), scores.shape)
+            # Keep only the running top-k candidates between blocks
+            scores = np.concatenate([best_scores, scores], axis=1)
+            rows = np.concatenate([best_rows, rows], axis=1)
+            if scores.shape[1] > k:
+                top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+                scores = np.take_along_axis(scores, top, axis=1)
+                rows = np.take_along_axis(rows, top, axis=1)
+            best_scores, best_rows = scores, rows
+        order = np.argsort(-best_scores, axis=1)
+        best_scores = np.take_along_axis(best_scores, order, axis=1)
+        best_rows = np.take_along_axis(best_rows, order, axis=1)
+        return [
+            [(self.ids[row], float(score)) for row, score in zip(row_list, score_list)]
+            for row_list, score_list in zip(best_rows, best_scores)
+        ]
+
+    def _search_ivf(self, query: "np.ndarray", k: int, nprobe: int) -> list[tuple[str, float]]:
+        centroids, order, offsets = self.ivf["centroids"], self.ivf["order"], self.ivf["offsets"]
+        nprobe = min(nprobe, len(centroids))
+        lists = np.argpartition(-(centroids @ query), nprobe - 1)[:nprobe]
+        candidates = np.concatenate([order[offsets[c]:offsets[c + 1]] for c in lists])
+        if len(candidates) == 0:
+            return []
+        scores = self.matrix[candidates] @ query
+        if len(scores) > k:
+            top = np.argpartition(-scores, k - 1)[:k]
+        else:
+            top = np.arange(len(scores))
+        top = top[np.argsort(-scores[top])]
+        return [(self.ids[candidates[i]], float(scores[i])) for i in top]
+
+    def near_duplicates(self, threshold: float = 0.9, block_bytes: int = 32 << 20) -> list[tuple[str, str, float]]:
+        """
+        Returns concept pairs whose cosine similarity is at least `threshold`,
+        as candidates for merging (each pair once, most similar first).
+
+        Rows are scored in blocks against the rows from the block onwards, with
+        the block height chosen so each score block stays within `block_bytes`.
+        """
+        pairs = []
+        block_rows = max(1, block_bytes // (4 * max(len(self.ids), 1)))
+        for start in range(0, len(self.ids), block_rows):
+            block = self.matrix[start:start + block_rows]
+            scores = block @ self.matrix[start:].T  # Column j is row start + j
+            rows, cols = np.nonzero(scores >= threshold)
+            for row, col in zip(rows, cols):
+                if row < col:
+                    pairs.append((self.ids[start + row], self.ids[start + col], float(scores[row, col])))
+        pairs.sort(key=lambda pair: -pair[2])
+        return pairs
+
+
+def _paths(path: str) -> tuple[str, str, str]:
+    return f"{path}.f32", f"{path}.json", f"{path}.ivf.npz"
+
+
+def build_index(
+    graph: nx.DiGraph,
+    embedder,
+    path: str = config.EMBEDDING_PATH,
+    batch_size: int = 1024,
+) -> EmbeddingIndex | None:
+    """
+    Embeds every Concept node in `graph` and writes the index files.
+
+    Vectors of concepts whose text is unchanged since the last build with the
+    same embedder (backend, model and dimension) are reused, so only new or
+    edited concepts are embedded.
+
+    Returns:
+        The new index (memory-mapped), or None on failure.
+    """
+    if not _require_numpy():
+        return None
+    concepts = [(node_id, concept_text(data)) for node_id, data in graph.nodes(data=True) if data.get("type") == "Concept"]
+    concepts.sort()
+    previous = load_index(path, quiet=True)
+    reusable = {}
+    if (
+        previous is not None
+        and previous.meta.get("backend") == embedder.name
+        and previous.meta.get("model") == getattr(embedder, "model_name", None)
+        and previous.meta.get("dim") == embedder.dim
+    ):
+        hashes = previous.meta.get("text_hashes", [])
+        reusable = {node_id: (row, hashes[row]) for row, node_id in enumerate(previous.ids) if row < len(hashes)}
+
+    matrix_path, meta_path, ivf_path = _paths(path)
+    out_dir = os.path.dirname(matrix_path)
+    if out_dir:
+        os.makedirs(out_dir, exist_ok=True)
+    tmp_path = f"{matrix_path}.tmp.{os.getpid()}"
+    ids = [node_id for node_id, _ in concepts]
+    text_hashes = [_text_hash(text) for _, text in concepts]
+    matrix = np.memmap(tmp_path, dtype=np.float32, mode="w+", shape=(max(len(ids), 1), embedder.dim))
+
+    to_embed, reused_rows, old_rows = [], [], []
+    for row, (node_id, text) in enumerate(concepts):
+        old = reusable.get(node_id)
+        if old is not None and old[1] == text_hashes[row]:
+            reused_rows.append(row)
+            old_rows.append(old[0])
+        else:
+            to_embed.append(row)
+    if reused_rows:
+        matrix[reused_rows] = previous.matrix[old_rows]
+    with metrics.timer("embeddings.embed"):
+        for start in range(0, len(to_embed), batch_size):
+            rows = to_embed[start:start + batch_size]
+            matrix[rows] = embedder.embed([concepts[row][1] for row in rows])
+    metrics.incr("embeddings.embedded", len(to_embed))
+    matrix.flush()
+    del matrix
+    previous = None  # Release the old memory map before replacing its file
+    os.replace(tmp_path, matrix_path)
+
+    meta = {
+        "backend": embedder.name,
+        "model": getattr(embedder, "model_name", None),
+        "dim": embedder.dim,
+        "ids": ids,
+        "text_hashes": text_hashes,
+    }
+    with open(f"{meta_path}.tmp", "w") as f:
+        json.dump(meta, f)
+    os.replace(f"{meta_path}.tmp", meta_path)
+    # A stale IVF index would point at the wrong rows
+    if os.path.exists(ivf_path):
+        os.remove(ivf_path)
+    logger.info(
+        "Embedded %d of %d concept(s) (%d reused) into %s.",
+        len(to_embed),
+        len(ids),
+        len(ids) - len(to_embed),
+        matrix_path,
+    )
+    return load_index(path)
+
+
+def build_ivf(index: EmbeddingIndex, nlist: int = 0, iterations: int = 10, seed: int = 0, path: str = config.EMBEDDING_PATH):
+    """
+    Builds and saves a simple IVF (inverted file) index: spherical k-means
+    centroids plus the rows of each cluster stored contiguously.
+
+    Args:
+        index: Index to cluster.
+        nlist: Number of clusters (default: about sqrt(len(index))).
+        iterations: k-means iterations.
+        seed: Random seed for the initial centroids.
+        path: Index path prefix.
+    """
+    n = len(index)
+    if n == 0:
+        return
+    nlist = min(nlist or max(1, int(np.sqrt(n))), n)
+    rng = np.random.default_rng(seed)
+    # Train on a sample; assignment below covers every row
+    sample = index.matrix[np.sort(rng.choice(n, size=min(n, nlist * 64), replace=False))]
+    centroids = sample[rng.choice(len(sample), size=nlist, replace=False)].copy()
+    with metrics.timer("embeddings.ivf_train"):
+        for _ in range(iterations):
+            assignment = np.argmax(sample @ centroids.T, axis=1)
+            for c in range(nlist):
+                members = sample[assignment == c]
+                if len(members):
+                    centroids[c] = members.sum(axis=0)
+            centroids = _normalize(centroids)
+
+    assignment = np.concatenate(
+        [np.argmax(index.matrix[start:start + 65536] @ centroids.T, axis=1) for start in range(0, n, 65536)]
+    )
+    order = np.argsort(assignment, kind="stable")
+    offsets = np.searchsorted(assignment[order], np.arange(nlist + 1))
+    ivf_path = _paths(path)[2]
+    np.savez(ivf_path, centroids=centroids, order=order, offsets=offsets)
+    index.ivf = {"centroids": centroids, "order": order, "offsets": offsets}
+    logger.info("Built IVF index with %d list(s) at %s.", nlist, ivf_path)
+
+
+def load_index(path: str = config.EMBEDDING_PATH, quiet: bool = False) -> EmbeddingIndex | None:
+    """Memory-maps the index at `path` (and its IVF index, if built). Returns None if missing."""
+    if not _require_numpy():
+        return None
+    matrix_path, meta_path, ivf_path = _paths(path)
+    if not (os.path.exists(matrix_path) and os.path.exists(meta_path)):
+        if not quiet:
+            logger.error("No embedding index at %s. Run the 'embed' command first.", matrix_path)
+        return None
+    with open(meta_path) as f:
+        meta = json.load(f)
+    ids = meta["ids"]
+    matrix = np.memmap(matrix_path, dtype=np.float32, mode="r", shape=(max(len(ids), 1), meta["dim"]))[: len(ids)]
+    ivf = None
+    if os.path.exists(ivf_path):
+        with np.load(ivf_path) as data:
+            ivf = {name: data[name] for name in ("centroids", "order", "offsets")}
+    return EmbeddingIndex(ids, matrix, meta, ivf)
+
+
+def embedder_for(index: EmbeddingIndex):
+    """Returns an embedder matching the one (backend and model) the index was built with."""
+    backend = index.meta.get("backend", config.EMBEDDING_BACKEND)
+    if backend == HashingEmbedder.name:
+        return HashingEmbedder(index.meta.get("dim", config.EMBEDDING_DIM))
+    return get_embedder(backend, index.meta.get("model"))
+
+
+# Example usage (for direct testing):
+# if __name__ == '__main__':
+#     from past_paper_analyzer import graph_store
+#     index = build_index(graph_store.load_graph(), HashingEmbedder())
+#     query = HashingEmbedder().embed(["red-black trees"])
+#     print(index.search(query, k=5))
@@ -0,0 +1,325 @@
+import csv
+import glob
+import json
+import logging
+import os
+import time
+from array import array
+from itertools import islice
+from . import config, metrics
+from .compact_graph import NODE_TYPES, WEIGHTED_EDGE_TYPES, CompactGraph
+
+# Columnar export of the concept graph for analytics tools (pandas, DuckDB, Spark).
+#
+# Loading concept_graph.graphml with NetworkX and walking graph.nodes(data=True)
+# builds a dict per node and per edge before a DataFrame even exists. The export
+# instead works on the arrays graph_store.load_compact_graph streams the GraphML
+# into: node attributes there are already dictionary-encoded (integer codes into
+# one table of interned values) and edges are CSR arrays, so every output column
+# is produced from those arrays as a whole.
+#
+# One table per node and edge type:
+#   papers(id, code, year, tripos_part)      part_of(question, paper)
+#   questions(id, number, course)            mentions(question, concept)
+#   concepts(id, name, definition, frequency) co_occurs(concept, other, weight)
+# co_occurs holds each pair once (concept ID < other ID), as the graph does.
+#
+# Parquet and Arrow files (need pyarrow) store string columns dictionary-encoded.
+# Edge endpoint columns are dictionary-encoded against the id column of the node
+# table they point to, so pandas reads them as categoricals of node IDs. CSV
+# needs nothing beyond the standard library and is written in chunks of
+# EXPORT_CHUNK_ROWS rows per file; there each node table starts with a 'row'
+# column and endpoint columns hold that row number instead of the node ID.
+
+# Optional dependency: pyarrow (with numpy) for the Parquet and Arrow formats
+try:
+    import numpy as np
+    import pyarrow as pa
+    import pyarrow.feather as feather
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ("parquet", "arrow", "csv")
+MANIFEST_NAME = "manifest.json"
+
+# Table name -> (node type, attribute columns after 'id')
+NODE_TABLES = {
+    "papers": ("Paper", ("code", "year", "tripos_part")),
+    "questions": ("Question", ("number", "course")),
+    "concepts": ("Concept", ("name", "definition")),
+}
+# Table name -> (edge type, (source table, column), (target table, column))
+EDGE_TABLES = {
+    "part_of": ("PART_OF", ("questions", "question"), ("papers", "paper")),
+    "mentions": ("MENTIONS", ("questions", "question"), ("concepts", "concept")),
+    "co_occurs": ("CO_OCCURS", ("concepts", "concept"), ("concepts", "other")),
+}
+# Arrow IPC files only support these codecs
+_ARROW_CODECS = ("lz4", "zstd")
+
+
+def available_formats() -> tuple[str, ...]:
+    """Formats usable with the installed libraries."""
+    return FORMATS if pa is not None else ("csv",)
+
+
+def default_format() -> str:
+    """EXPORT_FORMAT if set, otherwise Parquet when pyarrow is installed and CSV when not."""
+    return config.EXPORT_FORMAT or ("parquet" if pa is not None else "csv")
+
+
+def export_graph(compact: CompactGraph, output_dir: str = config.EXPORT_DIR, fmt: str = None) -> dict | None:
+    """
+    Writes the graph as one columnar table per node and edge type.
+
+    Args:
+        compact: The graph, as loaded by graph_store.load_compact_graph.
+        output_dir: Directory for the table files and manifest.json (created if needed).
+            Files of an earlier export of the same tables are replaced.
+        fmt: One of FORMATS (default: default_format()).
+
+    Returns:
+        The manifest that was written to output_dir ('format', 'graph_version',
+        'exported_at' and per table its 'columns', 'rows' and 'files'), or None on failure.
+    """
+    fmt = fmt or default_format()
+    if fmt not in FORMATS:
+        logger.error("Unknown export format '%s'. Expected one of: %s", fmt, ", ".join(FORMATS))
+        return None
+    if fmt not in available_formats():
+        logger.error("'pyarrow' library not found. The %s format needs it. Install with 'pip install pyarrow'", fmt)
+        return None
+
+    manifest = {"format": fmt, "graph_version": compact.version, "exported_at": time.time(), "tables": {}}
+    try:
+        os.makedirs(output_dir, exist_ok=True)
+        with metrics.timer("export.write"):
+            if fmt == "csv":
+                tables = _write_csv(compact, output_dir)
+            else:
+                tables = _write_arrow(compact, output_dir, fmt)
+        for name, info in tables.items():
+            info["files"] = [os.path.basename(path) for path in info["files"]]
+            manifest["tables"][name] = info
+            metrics.incr("export.rows", info["rows"])
+        with open(os.path.join(output_dir, MANIFEST_NAME), "w") as f:
+            json.dump(manifest, f, indent=2)
+    except (OSError, ValueError) as e:
+        logger.error("Exporting the graph to %s failed: %s", output_dir, e)
+        return None
+    logger.info(
+        "Exported %s to %s (%s).",
+        ", ".join(f"{info['rows']} {name}" for name, info in manifest["tables"].items()),
+        output_dir,
+        fmt,
+    )
+    return manifest
+
+
+def _remove_previous(output_dir: str, table: str):
+    """Deletes files of an earlier export of `table` (e.g. surplus CSV chunks)."""
+    for pattern in (f"{table}.parquet", f"{table}.arrow", f"{table}-[0-9][0-9][0-9][0-9][0-9].csv"):
+        for path in glob.glob(os.path.join(glob.escape(output_dir), pattern)):
+            os.remove(path)
+
+
+# --- Parquet / Arrow ---
+
+
+def _np(values: array, dtype):
+    """Zero-copy numpy view of an array.array."""
+    return np.frombuffer(values, dtype=dtype)
+
+
+def _arrow_attr(compact: CompactGraph, name: str, rows):
+    """
+    One attribute column for the nodes at `rows`: a dictionary array over just the
+    values these nodes use (decoded to a plain column for non-string values such as years).
+    """
+    codes = compact.attr_codes(name)
+    if codes is None:
+        return pa.nulls(len(rows), pa.string())
+    codes = _np(codes, np.intc)[rows]
+    present = codes >= 0
+    used, local = np.unique(codes[present], return_inverse=True)
+    if not len(used):
+        return pa.nulls(len(rows), pa.string())
+    values = compact.value_table()
+    dictionary = [values[code] for code in used.tolist()]
+    try:
+        dictionary = pa.array(dictionary)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        # Mixed value types (e.g. some years read back as strings); export as text
+        dictionary = pa.array([str(value) for value in dictionary])
+    indices = np.zeros(len(codes), dtype=np.int32)
+    indices[present] = local
+    column = pa.DictionaryArray.from_arrays(pa.array(indices, mask=~present), dictionary)
+    return column if pa.types.is_string(dictionary.type) else column.dictionary_decode()
+
+
+def _arrow_tables(compact: CompactGraph) -> dict:
+    """Builds a pyarrow Table per node and edge table."""
+    num_nodes = compact.number_of_nodes()
+    types = _np(compact.type_codes(), np.int8)
+    all_ids = pa.array(compact.node_ids(), type=pa.string())
+    tables = {}
+    positions = {}  # Node table -> position in that table per node index (-1 if not in it)
+    for name, (node_type, columns) in NODE_TABLES.items():
+        rows = np.flatnonzero(types == NODE_TYPES.index(node_type))
+        position = np.full(num_nodes, -1, dtype=np.int32)
+        position[rows] = np.arange(len(rows), dtype=np.int32)
+        positions[name] = position
+        data = {"id": all_ids.take(pa.array(rows))}
+        for column in columns:
+            data[column] = _arrow_attr(compact, column, rows)
+        if node_type == "Concept":
+            adjacency = compact.adjacency("MENTIONS", reverse=True)
+            indptr = _np(adjacency[0], np.intc) if adjacency else np.zeros(num_nodes + 1, dtype=np.intc)
+            data["frequency"] = pa.array(np.diff(indptr)[rows].astype(np.int32))
+        tables[name] = pa.table(data)
+
+    for name, (edge_type, (source_table, source_column), (target_table, target_column)) in EDGE_TABLES.items():
+        adjacency = compact.adjacency(edge_type)
+        if adjacency is None:
+            indptr, targets = np.zeros(num_nodes + 1, dtype=np.intc), np.zeros(0, dtype=np.intc)
+            weights = targets if edge_type in WEIGHTED_EDGE_TYPES else None
+        else:
+            indptr, targets, weights = adjacency
+            indptr, targets = _np(indptr, np.intc), _np(targets, np.intc)
+            weights = _np(weights, np.intc) if weights is not None else None
+        sources = np.repeat(np.arange(num_nodes, dtype=np.int32), np.diff(indptr))
+        source_codes = positions[source_table][sources]
+        target_codes = positions[target_table][targets]
+        # Edges whose endpoints are not of the expected node types are left out
+        keep = (source_codes >= 0) & (target_codes >= 0)
+        data = {
+            source_column: pa.DictionaryArray.from_arrays(
+                pa.array(source_codes[keep]), tables[source_table].column("id").combine_chunks()
+            ),
+            target_column: pa.DictionaryArray.from_arrays(
+                pa.array(target_codes[keep]), tables[target_table].column("id").combine_chunks()
+            ),
+        }
+        if weights is not None:
+            data["weight"] = pa.array(weights[keep].astype(np.int32))
+        tables[name] = pa.table(data)
+    return tables
+
+
+def _write_arrow(compact: CompactGraph, output_dir: str, fmt: str) -> dict:
+    """Writes each table as one Parquet or Arrow IPC (Feather v2) file."""
+    written = {}
+    codec = config.EXPORT_COMPRESSION
+    for name, table in _arrow_tables(compact).items():
+        _remove_previous(output_dir, name)
+        path = os.path.join(output_dir, f"{name}.{fmt}")
+        if fmt == "parquet":
+            pq.write_table(table, path, row_group_size=config.EXPORT_CHUNK_ROWS, compression=codec)
+        else:
+            feather.write_feather(
+                table,
+                path,
+                compression=codec if codec in _ARROW_CODECS else "uncompressed",
+                chunksize=config.EXPORT_CHUNK_ROWS,
+            )
+        written[name] = {"columns": table.column_names, "rows": table.num_rows, "files": [path]}
+    return written
+
+
+# --- CSV ---
+
+
+def _csv_node_rows(compact: CompactGraph, node_type: str, columns: tuple, position: array):
+    """Yields one tuple per node of `node_type` and fills `position` (node index -> row)."""
+    ids = compact.node_ids()
+    values = compact.value_table()
+    code = NODE_TYPES.index(node_type)
+    attr_codes = [compact.attr_codes(column) for column in columns]
+    frequencies = None
+    if node_type == "Concept":
+        adjacency = compact.adjacency("MENTIONS", reverse=True)
+        frequencies = adjacency[0] if adjacency else array("i", bytes(4 * (len(ids) + 1)))
+    row = 0
+    for i, node_code in enumerate(compact.type_codes()):
+        if node_code != code:
+            continue
+        position[i] = row
+        cells = [row, ids[i]]
+        for codes in attr_codes:
+            cells.append(values[codes[i]] if codes is not None and codes[i] >= 0 else "")
+        if frequencies is not None:
+            cells.append(frequencies[i + 1] - frequencies[i])
+        yield cells
+        row += 1
+
+
+def _csv_edge_rows(compact: CompactGraph, edge_type: str, source_position: array, target_position: array):
+    """Yields (source row, target row[, weight]) per edge, straight from the CSR arrays."""
+    adjacency = compact.adjacency(edge_type)
+    if adjacency is None:
+        return
+    indptr, targets, weights = adjacency
+    for source in range(len(indptr) - 1):
+        start, end = indptr[source], indptr[source + 1]
+        source_row = source_position[source]
+        if start == end or source_row < 0:
+            continue
+        for j in range(start, end):
+            target_row = target_position[targets[j]]
+            if target_row < 0:
+                continue
+            yield (source_row, target_row) if weights is None else (source_row, target_row, weights[j])
+
+
+def _write_csv_chunks(output_dir: str, name: str, header: list[str], rows) -> dict:
+    """Writes `rows` to <name>-00000.csv, <name>-00001.csv, ... of EXPORT_CHUNK_ROWS rows each."""
+    _remove_previous(output_dir, name)
+    files = []
+    total = 0
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, config.EXPORT_CHUNK_ROWS))
+        if files and not chunk:
+            break
+        path = os.path.join(output_dir, f"{name}-{len(files):05d}.csv")
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(header)
+            writer.writerows(chunk)
+        files.append(path)
+        total += len(chunk)
+        if len(chunk) < config.EXPORT_CHUNK_ROWS:
+            break
+    return {"columns": header, "rows": total, "files": files}
+
+
+def _write_csv(compact: CompactGraph, output_dir: str) -> dict:
+    """Writes every table as chunked CSV files (node tables first, as edges refer to their rows)."""
+    written = {}
+    positions = {}
+    for name, (node_type, columns) in NODE_TABLES.items():
+        position = positions[name] = array("i", [-1]) * compact.number_of_nodes()
+        header = ["row", "id", *columns] + (["frequency"] if node_type == "Concept" else [])
+        written[name] = _write_csv_chunks(
+            output_dir, name, header, _csv_node_rows(compact, node_type, columns, position)
+        )
+    for name, (edge_type, (source_table, source_column), (target_table, target_column)) in EDGE_TABLES.items():
+        header = [source_column, target_column] + (["weight"] if edge_type in WEIGHTED_EDGE_TYPES else [])
+        written[name] = _write_csv_chunks(
+            output_dir,
+            name,
+            header,
+            _csv_edge_rows(compact, edge_type, positions[source_table], positions[target_table]),
+        )
+    return written
+
+
+# Example usage (for direct testing):
+# if __name__ == '__main__':
+#     from past_paper_analyzer import graph_store
+#     manifest = export_graph(graph_store.load_compact_graph(), "data/export", "parquet")
+#     print({name: table["rows"] for name, table in manifest["tables"].items()})
+#     # import pandas as pd; pd.read_parquet("data/export/mentions.parquet")
@@ -0,0 +1,188 @@
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from . import config
+
+# Raw LLM extraction results, kept independently of the graph so the graph can be
+# regenerated (e.g., after changing normalize_concept_name) without new LLM calls.
+#
+# One row per (year, paper_code, question_num, model, prompt_version), with the
+# graph (or shard) file it was extracted for. The `applied` table records, per
+# graph file, the content hash of the result last merged into that graph, so
+# `rebuild` only touches questions whose result changed.
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS extractions (
+    year INTEGER NOT NULL,
+    paper_code TEXT NOT NULL,
+    question_num TEXT NOT NULL,
+    model TEXT NOT NULL,
+    prompt_version TEXT NOT NULL,
+    concepts TEXT NOT NULL,
+    tripos_part TEXT,
+    course TEXT,
+    source_pdf TEXT,
+    graph_path TEXT,
+    content_hash TEXT NOT NULL,
+    extracted_at REAL NOT NULL,
+    PRIMARY KEY (year, paper_code, question_num, model, prompt_version)
+);
+CREATE TABLE IF NOT EXISTS applied (
+    graph_path TEXT NOT NULL,
+    year INTEGER NOT NULL,
+    paper_code TEXT NOT NULL,
+    question_num TEXT NOT NULL,
+    content_hash TEXT NOT NULL,
+    applied_at REAL NOT NULL,
+    PRIMARY KEY (graph_path, year, paper_code, question_num)
+);
+"""
+
+
+def connect(path: str = config.EXTRACTION_DB_PATH) -> sqlite3.Connection:
+    """Opens (and if necessary creates) the extraction store database."""
+    db_dir = os.path.dirname(path)
+    if db_dir:
+        os.makedirs(db_dir, exist_ok=True)
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row
+    conn.executescript(_SCHEMA)
+    if "graph_path" not in {row["name"] for row in conn.execute("PRAGMA table_info(extractions)")}:
+        # Stores created before results recorded the graph they were extracted for
+        with conn:
+            conn.execute("ALTER TABLE extractions ADD COLUMN graph_path TEXT")
+    return conn
+
+
+def content_hash(concepts: list[dict], tripos_part: str = None, course: str = None) -> str:
+    """Returns a stable hash of everything that determines how a result is merged into the graph."""
+    payload = json.dumps(
+        {"concepts": concepts, "tripos_part": tripos_part, "course": course},
+        sort_keys=True,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def record(
+    conn: sqlite3.Connection,
+    metadata: dict,
+    concepts: list[dict],
+    model: str,
+    prompt_version: str,
+    course: str = None,
+    source_pdf: str = None,
+    graph_path: str = None,
+) -> str:
+    """
+    Stores (or replaces) the extraction result for one question.
+
+    Args:
+        conn: Open extraction store connection.
+        metadata: Dict with 'year', 'paper_code', 'question_num' and optionally 'tripos_part'.
+        concepts: Concept dicts as returned by llm_extractor.extract_concepts_from_pdf.
+        model: Model that produced the result (llm_extractor.model_name()).
+        prompt_version: Prompt version used (llm_extractor.PROMPT_VERSION).
+        course: Optional course module name for the Question node.
+        source_pdf: Optional path of the PDF the result was extracted from.
+        graph_path: Optional path of the graph (or shard) the result is extracted for.
+
+    Returns:
+        The content hash of the stored result.
+    """
+    tripos_part = metadata.get("tripos_part")
+    digest = content_hash(concepts, tripos_part, course)
+    with conn:
+        conn.execute(
+            "INSERT INTO extractions (year, paper_code, question_num, model, prompt_version, concepts, "
+            "tripos_part, course, source_pdf, graph_path, content_hash, extracted_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (year, paper_code, question_num, model, prompt_version) DO UPDATE SET "
+            "concepts = excluded.concepts, tripos_part = excluded.tripos_part, course = excluded.course, "
+            "source_pdf = COALESCE(excluded.source_pdf, source_pdf), "
+            "graph_path = COALESCE(excluded.graph_path, graph_path), content_hash = excluded.content_hash, "
+            "extracted_at = excluded.extracted_at",
+            (
+                metadata["year"],
+                metadata["paper_code"],
+                metadata["question_num"],
+                model,
+                prompt_version,
+                json.dumps(concepts),
+                tripos_part,
+                course,
+                source_pdf,
+                os.path.abspath(graph_path) if graph_path else None,
+                digest,
+                time.time(),
+            ),
+        )
+    return digest
+
+
+def results(conn: sqlite3.Connection, model: str, prompt_version: str, graph_path: str = None) -> list[dict]:
+    """
+    Returns the stored results for one model and prompt version, with concepts decoded.
+
+    With `graph_path`, only the results that belong to that graph: those
+    extracted for it, and those already applied to it (e.g., by 'merge').
+    """
+    query = "SELECT * FROM extractions WHERE model = ? AND prompt_version = ?"
+    params = [model, prompt_version]
+    if graph_path is not None:
+        graph_key = os.path.abspath(graph_path)
+        query += (
+            " AND (graph_path = ? OR EXISTS (SELECT 1 FROM applied WHERE applied.graph_path = ? "
+            "AND applied.year = extractions.year AND applied.paper_code = extractions.paper_code "
+            "AND applied.question_num = extractions.question_num))"
+        )
+        params += [graph_key, graph_key]
+    rows = conn.execute(query + " ORDER BY year, paper_code, question_num", params)
+    stored = []
+    for row in rows:
+        result = dict(row)
+        result["concepts"] = json.loads(result["concepts"])
+        stored.append(result)
+    return stored
+
+
+def applied_hashes(conn: sqlite3.Connection, graph_path: str) -> dict[tuple, str]:
+    """Returns {(year, paper_code, question_num): content_hash} last applied to `graph_path`."""
+    rows = conn.execute(
+        "SELECT year, paper_code, question_num, content_hash FROM applied WHERE graph_path = ?",
+        (os.path.abspath(graph_path),),
+    )
+    return {(row["year"], row["paper_code"], row["question_num"]): row["content_hash"] for row in rows}
+
+
+def mark_applied(conn: sqlite3.Connection, graph_path: str, applied: list[tuple[dict, str]]):
+    """Records that each (metadata, content_hash) pair is now reflected in the graph at `graph_path`."""
+    now = time.time()
+    graph_key = os.path.abspath(graph_path)
+    with conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO applied (graph_path, year, paper_code, question_num, content_hash, applied_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            [
+                (graph_key, meta["year"], meta["paper_code"], meta["question_num"], digest, now)
+                for meta, digest in applied
+            ],
+        )
+
+
+def forget_applied(conn: sqlite3.Connection, graph_path: str):
+    """Clears the applied records of `graph_path` (used before a full rebuild)."""
+    with conn:
+        conn.execute("DELETE FROM applied WHERE graph_path = ?", (os.path.abspath(graph_path),))
+
+
+# Example usage (for direct testing):
+# if __name__ == '__main__':
+#     conn = connect(":memory:")
+#     meta = {"year": 2022, "paper_code": "p06", "question_num": "q01", "tripos_part": "IA"}
+#     digest = record(conn, meta, [{"concept_name": "Recursion", "definition": "..."}], "gpt-4o", "1")
+#     print(results(conn, "gpt-4o", "1"))
+#     mark_applied(conn, "data/concept_graph.graphml", [(meta, digest)])
+#     print(applied_hashes(conn, "data/concept_graph.graphml"))
@@ -0,0 +1,408 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import time
+import zlib
+import networkx as nx
+from . import config, metrics
+
+# Version history of a graph file: every save is recorded as a delta, so earlier
+# versions can be compared and restored without keeping full copies.
+#
+# The history lives next to the graph in <graph>.history.sqlite. For each saved
+# version it holds the nodes and edges added, changed (attributes differ) and
+# removed since the previously recorded version, as one compressed JSON blob.
+# To compute that delta without re-reading the previous GraphML, the `head`
+# table keeps a short digest of every node's and edge's attributes as last
+# recorded. A full snapshot is stored for the first recorded version and again
+# whenever the changes since the last snapshot add up to
+# GRAPH_HISTORY_SNAPSHOT_RATIO times the graph's size. Snapshots then take at most
+# about as much space as the deltas themselves, so the history grows with the
+# amount of change, not with graph size times the number of saves. That also
+# bounds how many deltas have to be replayed to rebuild a version.
+#
+# If the graph's version number ever goes backwards (the file was replaced or its
+# version sidecar lost), the database is moved aside as
+# <graph>.history-v<last version>-<time>.sqlite and a new history is started.
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS versions (
+    version INTEGER PRIMARY KEY,
+    saved_at REAL NOT NULL,
+    nodes INTEGER NOT NULL,
+    edges INTEGER NOT NULL,
+    nodes_added INTEGER NOT NULL,
+    nodes_changed INTEGER NOT NULL,
+    nodes_removed INTEGER NOT NULL,
+    edges_added INTEGER NOT NULL,
+    edges_changed INTEGER NOT NULL,
+    edges_removed INTEGER NOT NULL,
+    delta BLOB  -- NULL for the first recorded version, which only has a snapshot
+);
+CREATE TABLE IF NOT EXISTS snapshots (
+    version INTEGER PRIMARY KEY,
+    data BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS head (
+    kind INTEGER NOT NULL,  -- _NODE or _EDGE
+    source TEXT NOT NULL,
+    target TEXT NOT NULL,  -- '' for nodes
+    digest BLOB NOT NULL,
+    PRIMARY KEY (kind, source, target)
+) WITHOUT ROWID;
+"""
+
+_NODE, _EDGE = 0, 1
+_CHANGE_KINDS = ("added", "changed", "removed")
+
+# Head digests of the versions this process recorded last, per history database,
+# so repeated saves (e.g. the watch daemon's flushes) skip reading the head table
+_head_cache: dict[str, tuple[int, dict, dict]] = {}
+
+
+def history_path(graph_path: str = config.GRAPH_DATA_PATH) -> str:
+    """Returns the history database of the graph at `graph_path`."""
+    return f"{graph_path}.history.sqlite"
+
+
+def connect(graph_path: str = config.GRAPH_DATA_PATH) -> sqlite3.Connection:
+    """Opens (and if necessary creates) the history database of a graph file."""
+    conn = sqlite3.connect(history_path(graph_path))
+    conn.row_factory = sqlite3.Row
+    conn.executescript(_SCHEMA)
+    return conn
+
+
+def _encode(attrs: dict) -> str:
+    return json.dumps(attrs, sort_keys=True, separators=(",", ":"), default=str)
+
+
+def _digest(encoded: str) -> bytes:
+    return hashlib.blake2b(encoded.encode(), digest_size=8).digest()
+
+
+def _pack(data) -> bytes:
+    return zlib.compress(json.dumps(data, separators=(",", ":"), default=str).encode())
+
+
+def _unpack(blob: bytes):
+    return json.loads(zlib.decompress(blob))
+
+
+def _read_head(conn: sqlite3.Connection, db_path: str, latest: int | None) -> tuple[dict, dict]:
+    cached = _head_cache.get(db_path)
+    if cached is not None and cached[0] == latest:
+        return cached[1], cached[2]
+    nodes, edges = {}, {}
+    for kind, source, target, digest in conn.execute("SELECT kind, source, target, digest FROM head"):
+        if kind == _NODE:
+            nodes[source] = digest
+        else:
+            edges[(source, target)] = digest
+    return nodes, edges
+
+
+def _changes(items, head: dict, digests: dict) -> dict:
+    """Sorts (key, attrs) pairs into added/changed against `head`; fills `digests`."""
+    changes = {"added": [], "changed": [], "removed": []}
+    # Most edges share a handful of attribute dicts ({'type': 'MENTIONS'}, ...), so
+    # digests are memoized per distinct set of attribute values
+    memo = {}
+    for key, attrs in items:
+        try:
+            memo_key = tuple(attrs.items())
+            digest = memo.get(memo_key)
+            if digest is None:
+                digest = memo[memo_key] = _digest(_encode(attrs))
+        except TypeError:  # Unhashable attribute value
+            digest = _digest(_encode(attrs))
+        digests[key] = digest
+        known = head.get(key)
+        if known is None:
+            changes["added"].append((key, attrs))
+        elif known != digest:
+            changes["changed"].append((key, attrs))
+    changes["removed"] = [key for key in head if key not in digests]
+    return changes
+
+
+def record(graph: nx.DiGraph, graph_path: str, version: int) -> dict | None:
+    """
+    Records a saved version of the graph. Called by graph_store with the graph lock held.
+
+    Returns:
+        The row stored in the versions table (change counts per kind), or None if
+        the history could not be written (the save itself is unaffected).
+    """
+    db_path = history_path(graph_path)
+    try:
+        with metrics.timer("graph.history"):
+            conn = connect(graph_path)
+            try:
+                latest = conn.execute("SELECT MAX(version) FROM versions").fetchone()[0]
+                if latest is not None and version <= latest:
+                    # The graph file was replaced by one with an older version number (e.g., its
+                    # version sidecar was lost); keep the old history aside and start a new one
+                    conn.close()
+                    archived = _archive(graph_path, latest)
+                    logger.warning(
+                        "Graph version %d is not newer than the last recorded version %d; "
+                        "moved the old history to %s and started a new one.",
+                        version,
+                        latest,
+                        archived,
+                    )
+                    conn = connect(graph_path)
+                return _record(conn, db_path, graph, version)
+            finally:
+                conn.close()
+    except (sqlite3.Error, OSError) as e:
+        logger.warning("Recording version %d of %s in its history failed: %s", version, graph_path, e)
+        return None
+
+
+def _archive(graph_path: str, latest: int) -> str:
+    """Moves the history database aside (named after its last version). Returns the new path."""
+    db_path = history_path(graph_path)
+    archived = f"{graph_path}.history-v{latest}-{time.strftime('%Y%m%d-%H%M%S')}.sqlite"
+    os.replace(db_path, archived)
+    _head_cache.pop(db_path, None)
+    return archived
+
+
+def _record(conn: sqlite3.Connection, db_path: str, graph: nx.DiGraph, version: int) -> dict:
+    latest = conn.execute("SELECT MAX(version) FROM versions").fetchone()[0]
+    head_nodes, head_edges = _read_head(conn, db_path, latest) if latest is not None else ({}, {})
+
+    node_digests, edge_digests = {}, {}
+    node_changes = _changes(graph.nodes(data=True), head_nodes, node_digests)
+    edge_changes = _changes((((u, v), attrs) for u, v, attrs in graph.edges(data=True)), head_edges, edge_digests)
+    row = {
+        "version": version,
+        "saved_at": time.time(),
+        "nodes": graph.number_of_nodes(),
+        "edges": graph.number_of_edges(),
+    }
+    for kind in _CHANGE_KINDS:
+        row[f"nodes_{kind}"] = len(node_changes[kind])
+        row[f"edges_{kind}"] = len(edge_changes[kind])
+    changed = sum(row[f"{element}_{kind}"] for element in ("nodes", "edges") for kind in _CHANGE_KINDS)
+
+    delta = None
+    if latest is not None:
+        delta = _pack(
+            {
+                "nodes": {
+                    "set": [[node, attrs] for node, attrs in node_changes["added"] + node_changes["changed"]],
+                    "del": node_changes["removed"],
+                },
+                "edges": {
+                    "set": [[u, v, attrs] for (u, v), attrs in edge_changes["added"] + edge_changes["changed"]],
+                    "del": [[u, v] for u, v in edge_changes["removed"]],
+                },
+            }
+        )
+    take_snapshot = latest is None
+    if not take_snapshot:
+        last_snapshot = conn.execute("SELECT MAX(version) FROM snapshots").fetchone()[0] or 0
+        since = conn.execute(
+            "SELECT COALESCE(SUM(nodes_added + nodes_changed + nodes_removed + edges_added + edges_changed + edges_removed), 0) "
+            "FROM versions WHERE version > ?",
+            (last_snapshot,),
+        ).fetchone()[0]
+        take_snapshot = since + changed >= config.GRAPH_HISTORY_SNAPSHOT_RATIO * max(1, row["nodes"] + row["edges"])
+
+    with conn:
+        conn.execute(
+            f"INSERT INTO versions ({', '.join(row)}, delta) VALUES ({', '.join('?' * (len(row) + 1))})",
+            (*row.values(), delta),
+        )
+        if take_snapshot:
+            conn.execute(
+                "INSERT INTO snapshots (version, data) VALUES (?, ?)",
+                (
+                    version,
+                    _pack(
+                        {
+                            "nodes": [[node, attrs] for node, attrs in graph.nodes(data=True)],
+                            "edges": [[u, v, attrs] for u, v, attrs in graph.edges(data=True)],
+                        }
+                    ),
+                ),
+            )
+        upserts = [(_NODE, node, "", node_digests[node]) for node, _ in node_changes["added"] + node_changes["changed"]]
+        upserts += [(_EDGE, u, v, edge_digests[(u, v)]) for (u, v), _ in edge_changes["added"] + edge_changes["changed"]]
+        conn.executemany("INSERT OR REPLACE INTO head (kind, source, target, digest) VALUES (?, ?, ?, ?)", upserts)
+        conn.executemany(
+            "DELETE FROM head WHERE kind = ? AND source = ? AND target = ?",
+            [(_NODE, node, "") for node in node_changes["removed"]] + [(_EDGE, u, v) for u, v in edge_changes["removed"]],
+        )
+    _head_cache[db_path] = (version, node_digests, edge_digests)
+    metrics.incr("graph.history.changes", changed)
+    logger.debug(
+        "Recorded graph version %d: %d change(s)%s.", version, changed, " and a snapshot" if take_snapshot else ""
+    )
+    row["snapshot"] = take_snapshot
+    return row
+
+
+def _apply(nodes: dict, edges: dict, delta: dict):
+    for node, attrs in delta["nodes"]["set"]:
+        nodes[node] = attrs
+    for node in delta["nodes"]["del"]:
+        nodes.pop(node, None)
+    for u, v, attrs in delta["edges"]["set"]:
+        edges[(u, v)] = attrs
+    for u, v in delta["edges"]["del"]:
+        edges.pop((u, v), None)
+
+
+def _deltas(conn: sqlite3.Connection, after: int, up_to: int):
+    """Yields the deltas of the recorded versions in (after, up_to], oldest first."""
+    rows = conn.execute(
+        "SELECT delta FROM versions WHERE version > ? AND version <= ? ORDER BY version", (after, up_to)
+    )
+    for (blob,) in rows:
+        yield _unpack(blob)
+
+
+def is_recorded(conn: sqlite3.Connection, version: int) -> bool:
+    return conn.execute("SELECT 1 FROM versions WHERE version = ?", (version,)).fetchone() is not None
+
+
+def state_at(conn: sqlite3.Connection, version: int) -> tuple[dict, dict] | None:
+    """
+    Rebuilds a recorded version from the nearest snapshot at or before it.
+
+    Returns:
+        A tuple ({node: attrs}, {(source, target): attrs}), or None if `version` was not recorded.
+    """
+    if not is_recorded(conn, version):
+        return None
+    snapshot = conn.execute(
+        "SELECT version, data FROM snapshots WHERE version <= ? ORDER BY version DESC LIMIT 1", (version,)
+    ).fetchone()
+    if snapshot is None:
+        return None
+    data = _unpack(snapshot["data"])
+    nodes = {node: attrs for node, attrs in data["nodes"]}
+    edges = {(u, v): attrs for u, v, attrs in data["edges"]}
+    for delta in _deltas(conn, snapshot["version"], version):
+        _apply(nodes, edges, delta)
+    return nodes, edges
+
+
+def load_version(conn: sqlite3.Connection, version: int) -> nx.DiGraph | None:
+    """Returns a recorded version of the graph as a DiGraph, or None if it was not recorded."""
+    with metrics.timer("graph.history.checkout"):
+        state = state_at(conn, version)
+    if state is None:
+        logger.error("Version %d is not in the graph history.", version)
+        return None
+    nodes, edges = state
+    graph = nx.DiGraph(version=version)
+    graph.add_nodes_from(nodes.items())
+    graph.add_edges_from((u, v, attrs) for (u, v), attrs in edges.items())
+    return graph
+
+
+def write_graphml(graph: nx.DiGraph, path: str) -> bool:
+    """
+    Writes a checked-out version to a standalone GraphML file (no version sidecar
+    or history of its own, unlike graph_store.save_graph). Returns True on success.
+    """
+    try:
+        output_dir = os.path.dirname(path)
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+        nx.write_graphml(graph, path, infer_numeric_types=True)
+        return True
+    except OSError as e:
+        logger.error("Writing version %s to %s failed: %s", graph.graph.get("version"), path, e)
+        return False
+
+
+def _compare(before: dict, after: dict) -> dict:
+    """Classifies keys by their value at the start (`before`, None if absent) and end of a range."""
+    changes = {"added": {}, "changed": {}, "removed": {}}
+    for key, old in before.items():
+        new = after.get(key)
+        if old is None and new is not None:
+            changes["added"][key] = new
+        elif new is None and old is not None:
+            changes["removed"][key] = old
+        elif old != new:
+            changes["changed"][key] = (old, new)
+    return changes
+
+
+def diff(conn: sqlite3.Connection, from_version: int, to_version: int) -> dict | None:
+    """
+    Compares two recorded versions.
+
+    Only the older version is rebuilt in full; the deltas up to the newer one are
+    then replayed while remembering the original value of everything they touch.
+
+    Returns:
+        {'from': ..., 'to': ..., 'nodes': changes, 'edges': changes}, where changes
+        holds 'added' and 'removed' ({key: attrs}) and 'changed' ({key: (old attrs,
+        new attrs)}); edge keys are (source, target). None if a version was not recorded.
+    """
+    low, high = sorted((from_version, to_version))
+    if not is_recorded(conn, high):
+        logger.error("Version %d is not in the graph history.", high)
+        return None
+    state = state_at(conn, low)
+    if state is None:
+        logger.error("Version %d is not in the graph history.", low)
+        return None
+    nodes, edges = state
+    nodes_before, edges_before = {}, {}
+    for delta in _deltas(conn, low, high):
+        for node, _ in delta["nodes"]["set"]:
+            nodes_before.setdefault(node, nodes.get(node))
+        for node in delta["nodes"]["del"]:
+            nodes_before.setdefault(node, nodes.get(node))
+        for u, v, *_ in delta["edges"]["set"] + delta["edges"]["del"]:
+            edges_before.setdefault((u, v), edges.get((u, v)))
+        _apply(nodes, edges, delta)
+    result = {"from": from_version, "to": to_version, "nodes": _compare(nodes_before, nodes), "edges": _compare(edges_before, edges)}
+    if from_version > to_version:
+        # Computed forwards from the older version; flip it to read from `from_version`
+        for changes in (result["nodes"], result["edges"]):
+            changes["added"], changes["removed"] = changes["removed"], changes["added"]
+            changes["changed"] = {key: (new, old) for key, (old, new) in changes["changed"].items()}
+    return result
+
+
+def list_versions(conn: sqlite3.Connection, limit: int = None) -> list[dict]:
+    """Returns the recorded versions, newest first, with change counts, 'snapshot' and 'delta_bytes'."""
+    query = (
+        "SELECT v.*, LENGTH(v.delta) AS delta_bytes, s.version IS NOT NULL AS snapshot "
+        "FROM versions v LEFT JOIN snapshots s ON s.version = v.version ORDER BY v.version DESC"
+    )
+    params = ()
+    if limit:
+        query += " LIMIT ?"
+        params = (limit,)
+    return [{key: row[key] for key in row.keys() if key != "delta"} for row in conn.execute(query, params)]
+
+
+def summary(conn: sqlite3.Connection) -> dict:
+    """Returns the number of versions and snapshots and the bytes their deltas and snapshots take."""
+    versions, delta_bytes = conn.execute("SELECT COUNT(*), COALESCE(SUM(LENGTH(delta)), 0) FROM versions").fetchone()
+    snapshots, snapshot_bytes = conn.execute("SELECT COUNT(*), COALESCE(SUM(LENGTH(data)), 0) FROM snapshots").fetchone()
+    return {"versions": versions, "snapshots": snapshots, "delta_bytes": delta_bytes, "snapshot_bytes": snapshot_bytes}
+
+
+# Example usage (for direct testing):
+# if __name__ == '__main__':
+#     conn = connect("data/concept_graph.graphml")
+#     for row in list_versions(conn, limit=5):
+#         print(row["version"], row["nodes_added"], row["edges_added"], row["snapshot"])
+#     changes = diff(conn, 1, 2)
+#     print(sorted(changes["nodes"]["added"])[:10])
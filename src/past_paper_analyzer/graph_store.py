@@ -1,8 +1,31 @@
 import networkx as nx
+import heapq
+import itertools
+import logging
 import os
-import sys
 import re
-from . import config
+import time
+from contextlib import contextmanager
+from typing import Callable
+from . import config, graph_history, metrics
+from .compact_graph import CompactGraph
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows; graph_lock falls back to a lock file
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Placeholder stored on Concept nodes that have no definition yet
+_NO_DEFINITION = "No definition provided"
+# Definition conflict policies for merge_graphs (see _pick_definition)
+MERGE_POLICIES = ("longest", "first", "last")
+# Concept-concept projection of MENTIONS: one edge per pair, from the smaller to the
+# larger concept ID, whose `weight` is the number of questions mentioning both concepts
+CO_OCCURS = "CO_OCCURS"
+# Graph attribute set once the CO_OCCURS projection is maintained for every MENTIONS edge
+CO_OCCURRENCE_BUILT = "co_occurrence_built"
 
 
 # Basic normalization: lowercase and remove extra whitespace
@@ -22,48 +45,245 @@ def generate_node_id(prefix: str, identifier: str) -> str:
     return f"{prefix}_{safe_identifier}"
 
 
-def load_graph(path: str = config.GRAPH_DATA_PATH) -> nx.DiGraph:
-    """Loads the concept graph from a GraphML file."""
+class GraphLockTimeout(TimeoutError):
+    """Raised when the graph file lock cannot be acquired within the timeout."""
+
+
+@contextmanager
+def graph_lock(path: str = config.GRAPH_DATA_PATH, timeout: float = config.GRAPH_LOCK_TIMEOUT):
+    """
+    Holds an exclusive advisory lock on `<path>.lock` for the duration of the block.
+
+    Uses fcntl.flock where available (released automatically if the process dies),
+    falling back to an O_EXCL lock file elsewhere.
+
+    Raises:
+        GraphLockTimeout: If the lock is not acquired within `timeout` seconds.
+    """
+    lock_path = f"{path}.lock"
+    lock_dir = os.path.dirname(lock_path)
+    if lock_dir:
+        os.makedirs(lock_dir, exist_ok=True)
+    deadline = time.monotonic() + timeout
+    delay = 0.005
+
+    if fcntl is not None:
+        fd = os.open(lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            while True:
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    break
+                except BlockingIOError:
+                    if time.monotonic() >= deadline:
+                        raise GraphLockTimeout(f"Timed out after {timeout}s waiting for lock on {path}")
+                    time.sleep(delay)
+                    delay = min(delay * 2, 0.1)
+            try:
+                yield
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+        finally:
+            os.close(fd)
+        return
+
+    while True:
+        try:
+            fd = os.open(lock_path, os.O_RDWR | os.O_CREAT | os.O_EXCL, 0o644)
+            break
+        except FileExistsError:
+            if time.monotonic() >= deadline:
+                raise GraphLockTimeout(f"Timed out after {timeout}s waiting for lock on {path}")
+            time.sleep(delay)
+            delay = min(delay * 2, 0.1)
+    try:
+        yield
+    finally:
+        os.close(fd)
+        os.remove(lock_path)
+
+
+def _read_version(path: str) -> int:
+    """Returns the saved version of the graph at `path` (0 if it was never saved)."""
+    try:
+        with open(f"{path}.version") as f:
+            return int(f.read().strip() or 0)
+    except (FileNotFoundError, ValueError):
+        return 0
+
+
+def _write_graph_file(graph: nx.DiGraph, path: str, version: int):
+    """
+    Atomically replaces the GraphML file at `path`, records its version and (with
+    GRAPH_HISTORY) adds it to the graph's history. Caller holds the lock.
+    """
+    graph_dir = os.path.dirname(path)
+    if graph_dir:
+        os.makedirs(graph_dir, exist_ok=True)
+    graph.graph["version"] = version
+    # Write to a temporary file and rename so readers never see a half-written graph
+    tmp_path = f"{path}.tmp.{os.getpid()}"
+    with metrics.timer("graph.save"):
+        nx.write_graphml(graph, tmp_path, infer_numeric_types=True)  # infer_numeric_types helps preserve types
+        os.replace(tmp_path, path)
+    metrics.incr("graph.saves")
+    with open(f"{path}.version.tmp", "w") as f:
+        f.write(str(version))
+    os.replace(f"{path}.version.tmp", f"{path}.version")
+    if config.GRAPH_HISTORY:
+        graph_history.record(graph, path, version)
+
+
+def load_graph(path: str = config.GRAPH_DATA_PATH, strict: bool = False) -> nx.DiGraph:
+    """
+    Loads the concept graph from a GraphML file.
+
+    An existing file that cannot be read gives a new empty graph, unless
+    `strict` is set, in which case the error is raised instead.
+    """
     if os.path.exists(path):
-        print(f"Loading graph from {path}")
+        logger.info("Loading graph from %s", path)
         try:
             # Using DiGraph for directed relationships like PART_OF, MENTIONS
             # Specify node_type=str if needed, though usually inferred
-            graph = nx.read_graphml(path)
-            print(
-                f"Graph loaded successfully with {graph.number_of_nodes()} nodes and {graph.number_of_edges()} edges."
+            # A writer may replace the file while it is read, so never pair the content with a
+            # version read after it: that would let commit_changes skip its reload and drop the update
+            sidecar_version = _read_version(path)
+            with metrics.timer("graph.load"):
+                graph = nx.read_graphml(path)
+            # _write_graph_file embeds the version in the file; older files only have the sidecar
+            graph.graph["version"] = int(graph.graph.get("version", sidecar_version))
+            logger.info(
+                "Graph loaded successfully with %d nodes and %d edges.",
+                graph.number_of_nodes(),
+                graph.number_of_edges(),
+                extra={"nodes": graph.number_of_nodes(), "edges": graph.number_of_edges()},
             )
             return graph
         except Exception as e:
-            print(
-                f"Error loading graph from {path}: {e}. Creating a new graph.",
-                file=sys.stderr,
-            )
+            if strict:
+                raise
+            logger.error("Loading graph from %s failed: %s. Creating a new graph.", path, e)
             return nx.DiGraph()  # Return a new directed graph on error
     else:
-        print(f"Graph file not found at {path}. Creating a new graph.")
-        return nx.DiGraph()
+        logger.info("Graph file not found at %s. Creating a new graph.", path)
+        return nx.DiGraph(**{CO_OCCURRENCE_BUILT: True})  # Links keep the projection up to date from the start
+
+
+def load_compact_graph(path: str = config.GRAPH_DATA_PATH) -> CompactGraph:
+    """
+    Loads the concept graph into the memory-compact CompactGraph representation.
+
+    The GraphML file is streamed directly into integer-indexed arrays, so peak
+    memory stays well below load_graph for large graphs. Use this for read-only
+    analysis; call .to_networkx() on the result where a DiGraph is required.
+    """
+    if not os.path.exists(path):
+        logger.info("Graph file not found at %s. Creating a new compact graph.", path)
+        compact = CompactGraph()
+        compact.graph_attrs[CO_OCCURRENCE_BUILT] = True  # As for a new graph from load_graph
+        return compact
+    logger.info("Loading compact graph from %s", path)
+    try:
+        sidecar_version = _read_version(path)  # Read before the file, as in load_graph
+        with metrics.timer("graph.load_compact"):
+            compact = CompactGraph.read_graphml(path)
+        compact.version = compact.version or sidecar_version
+        logger.info(
+            "Compact graph loaded with %d nodes and %d edges (~%d KiB).",
+            compact.number_of_nodes(),
+            compact.number_of_edges(),
+            compact.memory_bytes() // 1024,
+        )
+        return compact
+    except Exception as e:
+        logger.error("Loading compact graph from %s failed: %s. Creating a new compact graph.", path, e)
+        return CompactGraph()
 
 
-def save_graph(graph: nx.DiGraph, path: str = config.GRAPH_DATA_PATH):
-    """Saves the concept graph to a GraphML file."""
-    print(
-        f"Saving graph with {graph.number_of_nodes()} nodes and {graph.number_of_edges()} edges to {path}"
+def save_graph(graph: nx.DiGraph, path: str = config.GRAPH_DATA_PATH) -> bool:
+    """
+    Saves the concept graph to a GraphML file, overwriting it. Returns True on success.
+
+    The write is atomic and serialized with other writers through graph_lock,
+    but it replaces whatever is on disk; use commit_changes for
+    load-modify-save updates that must not drop concurrent writers' changes.
+    """
+    logger.info(
+        "Saving graph with %d nodes and %d edges to %s",
+        graph.number_of_nodes(),
+        graph.number_of_edges(),
+        path,
     )
     try:
-        # Ensure the directory exists
-        os.makedirs(os.path.dirname(path), exist_ok=True)
-        nx.write_graphml(
-            graph, path, infer_numeric_types=True
-        )  # infer_numeric_types helps preserve types
-        print("Graph saved successfully.")
+        with graph_lock(path):
+            _write_graph_file(graph, path, _read_version(path) + 1)
+        logger.info("Graph saved successfully.")
+        return True
     except Exception as e:
-        print(f"Error saving graph to {path}: {e}", file=sys.stderr)
+        logger.error("Saving graph to %s failed: %s", path, e)
+        return False
+
+
+def commit_changes(
+    apply_changes: Callable[[nx.DiGraph], object],
+    path: str = config.GRAPH_DATA_PATH,
+    graph: nx.DiGraph = None,
+    timeout: float = config.GRAPH_LOCK_TIMEOUT,
+) -> nx.DiGraph | None:
+    """
+    Applies a change set to the graph on disk without losing concurrent writers' updates.
+
+    `apply_changes` is the delta: a function that mutates a graph in place
+    (e.g., a call to ingest_extraction). Under the file lock, the delta is
+    applied to `graph` if it is still at the on-disk version, otherwise to a
+    fresh load of the latest graph, and the result is saved with the version
+    bumped. Expensive work (downloads, LLM calls) should happen before calling
+    this, so the lock is only held for the load/apply/save.
+
+    Args:
+        apply_changes: Function that mutates the given graph in place.
+        path: Path of the GraphML file.
+        graph: Optional in-memory graph the caller already holds (e.g., from load_graph).
+        timeout: Seconds to wait for the lock.
+
+    Returns:
+        The updated graph, or None if the lock timed out, the graph on disk
+        could not be read, or saving failed.
+    """
+    try:
+        with graph_lock(path, timeout):
+            disk_version = _read_version(path)
+            if graph is None or graph.graph.get("version", 0) != disk_version or (
+                "version" not in graph.graph and os.path.exists(path)
+            ):
+                # Another writer saved since this graph was loaded: replay onto the latest state.
+                # A file that exists but cannot be read aborts the commit rather than being
+                # replaced by the delta applied to an empty graph.
+                graph = load_graph(path, strict=True)
+            apply_changes(graph)
+            logger.info(
+                "Saving graph with %d nodes and %d edges to %s",
+                graph.number_of_nodes(),
+                graph.number_of_edges(),
+                path,
+            )
+            _write_graph_file(graph, path, disk_version + 1)
+            logger.info("Graph saved successfully (version %d).", disk_version + 1, extra={"version": disk_version + 1})
+            return graph
+    except GraphLockTimeout as e:
+        logger.error("%s", e)
+        return None
+    except Exception as e:
+        logger.error("Committing changes to %s failed: %s", path, e)
+        return None
 
 
 def add_paper(graph: nx.DiGraph, paper_code: str, year: int, tripos_part: str) -> str:
     """Adds or updates a Paper node. Returns the node ID."""
     node_id = generate_node_id("paper", paper_code)
+    if node_id not in graph:
+        metrics.incr("graph.nodes_added")
     # Add node with attributes, updating if it already exists
     graph.add_node(
         node_id, type="Paper", code=paper_code, year=year, tripos_part=tripos_part
@@ -80,12 +300,14 @@ def add_question(
 ) -> str:
     """Adds a Question node and links it to a Paper node. Returns the node ID."""
     if paper_node_id not in graph:
-        print(f"Error: Paper node '{paper_node_id}' does not exist.", file=sys.stderr)
+        logger.error("Paper node '%s' does not exist.", paper_node_id)
         return None
     paper_code = graph.nodes[paper_node_id]["code"]
     # Ensure question_number is treated as a string for ID generation
     q_num_str = str(question_number)
     node_id = generate_node_id("q", f"{paper_code}_{q_num_str}")
+    if node_id not in graph:
+        metrics.incr("graph.nodes_added")
 
     graph.add_node(
         node_id,
@@ -97,6 +319,7 @@ def add_question(
     # Check if edge already exists to avoid duplicates if run multiple times
     if not graph.has_edge(node_id, paper_node_id):
         graph.add_edge(node_id, paper_node_id, type="PART_OF")
+        metrics.incr("graph.edges_added")
         # print(f"Added Question node: {node_id} (Part of {paper_node_id})")
     # else:
     # print(f"Question node {node_id} already exists and is linked to {paper_node_id}.")
@@ -112,12 +335,12 @@ def add_concept(graph: nx.DiGraph, concept_name: str, definition: str = None) ->
     original_name = concept_name
     canonical_name = normalize_concept_name(concept_name)
     if not canonical_name:  # Handle empty or invalid names
-        print(
-            f"Warning: Skipping invalid concept name '{original_name}'", file=sys.stderr
-        )
+        logger.warning("Skipping invalid concept name '%s'", original_name)
         return None
 
     node_id = generate_node_id("concept", canonical_name)
+    if node_id not in graph:
+        metrics.incr("graph.nodes_added")
 
     # If node exists, update definition if a new one is provided and better?
     # For now, just add/overwrite attributes.
@@ -128,9 +351,7 @@ def add_concept(graph: nx.DiGraph, concept_name: str, definition: str = None) ->
         definition=(
             definition
             if definition
-            else graph.nodes.get(node_id, {}).get(
-                "definition", "No definition provided"
-            )
+            else graph.nodes.get(node_id, {}).get("definition", _NO_DEFINITION)
         ),  # Keep old def if new one is None
         # Store original names if needed for disambiguation later?
         # original_names=set(graph.nodes.get(node_id, {}).get('original_names', [])) | {original_name}
@@ -144,32 +365,325 @@ def link_question_to_concept(
 ):
     """Adds a MENTIONS relationship from a Question to a Concept."""
     if question_node_id is None or concept_node_id is None:
-        print(
-            f"Warning: Skipping link due to invalid node ID (Q: {question_node_id}, C: {concept_node_id})",
-            file=sys.stderr,
+        logger.warning(
+            "Skipping link due to invalid node ID (Q: %s, C: %s)", question_node_id, concept_node_id
         )
         return
     if question_node_id not in graph:
-        print(
-            f"Warning: Question node '{question_node_id}' not found. Cannot link concept.",
-            file=sys.stderr,
-        )
+        logger.warning("Question node '%s' not found. Cannot link concept.", question_node_id)
         return
     if concept_node_id not in graph:
-        print(
-            f"Warning: Concept node '{concept_node_id}' not found. Cannot link from question.",
-            file=sys.stderr,
-        )
+        logger.warning("Concept node '%s' not found. Cannot link from question.", concept_node_id)
         return
 
     # Check if edge already exists
     if not graph.has_edge(question_node_id, concept_node_id):
+        # Every concept this question already mentions now co-occurs with the new one
+        for other_id in _mentioned_concepts(graph, question_node_id):
+            _adjust_co_occurrence(graph, concept_node_id, other_id, 1)
         graph.add_edge(question_node_id, concept_node_id, type="MENTIONS")
+        metrics.incr("graph.edges_added")
         # print(f"Linked Question {question_node_id} -> MENTIONS -> Concept {concept_node_id}")
     # else:
     # print(f"Link already exists: Question {question_node_id} -> MENTIONS -> Concept {concept_node_id}")
 
 
+def question_node_id(metadata: dict) -> str:
+    """Returns the Question node ID that ingest_extraction uses for the given metadata."""
+    return generate_node_id("q", f"{metadata['year']}-{metadata['paper_code']}_{metadata['question_num']}")
+
+
+def unlink_question_concepts(graph: nx.DiGraph, question_node_id: str) -> list[str]:
+    """Removes every MENTIONS edge from a Question node. Returns the IDs of the unlinked concepts."""
+    if question_node_id not in graph:
+        return []
+    concept_ids = _mentioned_concepts(graph, question_node_id)
+    for i, concept_id in enumerate(concept_ids):
+        for other_id in concept_ids[i + 1:]:
+            _adjust_co_occurrence(graph, concept_id, other_id, -1)
+    graph.remove_edges_from((question_node_id, concept_id) for concept_id in concept_ids)
+    return concept_ids
+
+
+def _mentioned_concepts(graph: nx.DiGraph, question_node_id: str) -> list[str]:
+    return [
+        target
+        for _, target, data in graph.out_edges(question_node_id, data=True)
+        if data.get("type") == "MENTIONS"
+    ]
+
+
+def _adjust_co_occurrence(graph: nx.DiGraph, concept_a: str, concept_b: str, delta: int):
+    """Changes the CO_OCCURS weight between two concepts; drops the edge at zero."""
+    if concept_a == concept_b:
+        return
+    concept_a, concept_b = sorted((concept_a, concept_b))
+    edge = graph.get_edge_data(concept_a, concept_b)
+    weight = (edge.get("weight", 0) if edge else 0) + delta
+    if weight > 0:
+        graph.add_edge(concept_a, concept_b, type=CO_OCCURS, weight=weight)
+    elif edge is not None:
+        graph.remove_edge(concept_a, concept_b)
+
+
+def rebuild_co_occurrence(graph: nx.DiGraph) -> int:
+    """
+    Recomputes every CO_OCCURS edge from the MENTIONS edges, in place.
+
+    Only needed for graphs saved before co-occurrence was maintained, or after
+    edges were combined from several graphs (see merge_graphs); link and unlink
+    keep the projection up to date incrementally. Returns the number of concept pairs.
+    """
+    graph.remove_edges_from(
+        [(u, v) for u, v, data in graph.edges(data=True) if data.get("type") == CO_OCCURS]
+    )
+    weights = {}
+    for node_id, data in graph.nodes(data=True):
+        if data.get("type") != "Question":
+            continue
+        concept_ids = sorted(_mentioned_concepts(graph, node_id))
+        for i, concept_id in enumerate(concept_ids):
+            for other_id in concept_ids[i + 1:]:
+                weights[(concept_id, other_id)] = weights.get((concept_id, other_id), 0) + 1
+    for (concept_a, concept_b), weight in weights.items():
+        graph.add_edge(concept_a, concept_b, type=CO_OCCURS, weight=weight)
+    graph.graph[CO_OCCURRENCE_BUILT] = True
+    return len(weights)
+
+
+def has_co_occurrence(graph: nx.DiGraph) -> bool:
+    """
+    Returns False if the graph has MENTIONS edges but its CO_OCCURS projection was never
+    built (an older graph, or one storing each pair in both directions).
+    """
+    if graph.graph.get(CO_OCCURRENCE_BUILT):
+        return True
+    return not any(data.get("type") == "MENTIONS" for _, _, data in graph.edges(data=True))
+
+
+def top_co_occurring(graph: nx.DiGraph, concept_node_id: str, k: int = 10) -> list[tuple[str, int]]:
+    """Returns up to k (concept ID, shared question count) pairs for the concepts most often mentioned together with this one."""
+    if concept_node_id not in graph:
+        return []
+    # Each pair is stored once, so the concept's partners are on both its out- and in-edges
+    edges = itertools.chain(graph.out_edges(concept_node_id, data=True), graph.in_edges(concept_node_id, data=True))
+    neighbours = (
+        (target if source == concept_node_id else source, data.get("weight", 0))
+        for source, target, data in edges
+        if data.get("type") == CO_OCCURS
+    )
+    # Highest count first, ties by concept ID (as CompactGraph.top_co_occurring)
+    return heapq.nsmallest(k, neighbours, key=lambda item: (-item[1], item[0]))
+
+
+def prune_orphan_concepts(graph: nx.DiGraph, concept_ids: list[str]) -> int:
+    """Removes the given Concept nodes if no question mentions them any more. Returns the count removed."""
+    orphans = [
+        concept_id
+        for concept_id in set(concept_ids)
+        if concept_id in graph
+        and not any(data.get("type") == "MENTIONS" for _, _, data in graph.in_edges(concept_id, data=True))
+    ]
+    graph.remove_nodes_from(orphans)
+    return len(orphans)
+
+
+def ingest_extraction(
+    graph: nx.DiGraph,
+    metadata: dict,
+    concepts_data: list[dict],
+    course_module: str = None,
+) -> tuple[str, int, int]:
+    """
+    Adds the Paper, Question and Concept nodes for one extracted question PDF.
+
+    Args:
+        graph: The graph to update in place.
+        metadata: Dict with 'year', 'paper_code', 'question_num' and optionally 'tripos_part'.
+        concepts_data: Concept dicts as returned by llm_extractor.extract_concepts_from_pdf.
+        course_module: Optional course module name for the Question node.
+
+    Returns:
+        A tuple (question_node_id, unique_concept_count, link_count).
+    """
+    question_id = ingest_question(graph, metadata, course_module=course_module)
+
+    links_added_count = 0
+    for concept_info in concepts_data:
+        if ingest_concept(graph, question_id, concept_info):
+            links_added_count += 1
+
+    unique_concept_names = {
+        c.get("concept_name") for c in concepts_data if c.get("concept_name")
+    }
+    return question_id, len(unique_concept_names), links_added_count
+
+
+def ingest_question(graph: nx.DiGraph, metadata: dict, course_module: str = None) -> str:
+    """Adds the Paper and Question nodes for one question PDF. Returns the Question node ID."""
+    full_paper_code = f"{metadata['year']}-{metadata['paper_code']}"
+    paper_id = add_paper(
+        graph,
+        paper_code=full_paper_code,
+        year=metadata["year"],
+        tripos_part=metadata.get("tripos_part") or "Unknown",
+    )
+
+    # Each PDF (e.g., YYYY-pXX-qYY-solutions.pdf) contains the solution for a single
+    # question, so all concepts are linked to this one Question node.
+    return add_question(
+        graph,
+        paper_node_id=paper_id,
+        question_number=metadata["question_num"],
+        course_module=course_module,
+    )
+
+
+def ingest_concept(graph: nx.DiGraph, question_node_id: str, concept_info: dict) -> str | None:
+    """
+    Adds one extracted concept and links it to its Question node (see ingest_question).
+
+    Used on its own to apply concepts one at a time while a streamed answer arrives.
+    Returns the Concept node ID, or None if the concept has no usable name.
+    """
+    concept_name = concept_info.get("concept_name")
+    if not concept_name:
+        logger.warning("Skipping concept with missing name: %s", concept_info)
+        return None
+
+    concept_id = add_concept(
+        graph, concept_name=concept_name, definition=concept_info.get("definition")
+    )
+    if concept_id:  # True if concept was added or already existed
+        link_question_to_concept(graph, question_node_id, concept_id)
+    return concept_id
+
+
+def shard_path(shard_name: str) -> str:
+    """Returns the GraphML path of a named shard under SHARD_DIR."""
+    safe_name = re.sub(r"[^\w.-]+", "_", shard_name)
+    return os.path.join(config.SHARD_DIR, f"{safe_name}.graphml")
+
+
+def list_shard_paths(shard_dir: str = config.SHARD_DIR) -> list[str]:
+    """Returns all shard GraphML files in `shard_dir`, sorted for a deterministic merge order."""
+    if not os.path.isdir(shard_dir):
+        return []
+    return sorted(
+        os.path.join(shard_dir, name)
+        for name in os.listdir(shard_dir)
+        if name.endswith(".graphml")
+    )
+
+
+def _pick_definition(current: str | None, candidate: str | None, policy: str) -> str | None:
+    """Resolves two definitions of the same concept according to `policy`."""
+    if not candidate or candidate == _NO_DEFINITION:
+        return current
+    if not current or current == _NO_DEFINITION:
+        return candidate
+    if policy == "first":
+        return current
+    if policy == "last":
+        return candidate
+    # "longest": prefer the more detailed definition, ties broken lexicographically
+    # so the result does not depend on shard order
+    return max(current, candidate, key=lambda d: (len(d), d))
+
+
+def _merge_node_attrs(existing: dict, incoming: dict, policy: str):
+    """Merges `incoming` node attributes into `existing` in place."""
+    for key, value in incoming.items():
+        if key == "definition":
+            existing[key] = _pick_definition(existing.get(key), value, policy)
+        elif existing.get(key) in (None, "", "Unknown"):
+            # Fill in missing metadata (e.g., tripos_part, course) from later shards
+            existing[key] = value
+
+
+def merge_graphs(graphs: list[nx.DiGraph], definition_policy: str = "longest") -> nx.DiGraph:
+    """
+    Unions several concept graphs (e.g., shards built on different machines) into one.
+
+    Concept nodes are reconciled through their canonical ID, recomputed with
+    generate_node_id from the normalized concept name, so shards built with
+    older normalization rules still collapse onto the same node. Other node
+    types keep their IDs. Each node and edge is visited once, so the merge is
+    linear in the total size of the inputs; the CO_OCCURS projection is then
+    recomputed from the merged MENTIONS edges.
+
+    Args:
+        graphs: Graphs to merge, in priority order (pass shards sorted by path
+                for a deterministic result).
+        definition_policy: How to resolve conflicting concept definitions:
+            "longest" keeps the most detailed one (order-independent),
+            "first" keeps the earliest graph's, "last" keeps the latest graph's.
+            A real definition always replaces the "No definition provided" placeholder.
+
+    Returns:
+        A new merged DiGraph. The inputs are not modified.
+    """
+    if definition_policy not in MERGE_POLICIES:
+        raise ValueError(f"Unknown definition policy '{definition_policy}'. Expected one of {MERGE_POLICIES}.")
+
+    merged = nx.DiGraph()
+    for graph in graphs:
+        id_map = {}
+        for node_id, data in graph.nodes(data=True):
+            target_id = node_id
+            attrs = dict(data)
+            if attrs.get("type") == "Concept" and attrs.get("name"):
+                attrs["name"] = normalize_concept_name(attrs["name"])
+                target_id = generate_node_id("concept", attrs["name"])
+            id_map[node_id] = target_id
+
+            if target_id in merged:
+                _merge_node_attrs(merged.nodes[target_id], attrs, definition_policy)
+            else:
+                merged.add_node(target_id, **attrs)
+
+        for u, v, data in graph.edges(data=True):
+            if data.get("type") == CO_OCCURS:
+                continue  # Recomputed below; summing shard weights would double-count shared questions
+            source, target = id_map[u], id_map[v]
+            if not merged.has_edge(source, target):
+                merged.add_edge(source, target, **data)
+
+    rebuild_co_occurrence(merged)
+    return merged
+
+
+
+def merge_shards(
+    graph: nx.DiGraph, shards: list[nx.DiGraph], definition_policy: str = "longest"
+) -> tuple[nx.DiGraph, int]:
+    """
+    Merges shard graphs into an existing graph, letting each shard's questions replace their links.
+
+    A plain merge_graphs union keeps every link either side has, so a
+    question->concept link a shard has since dropped (e.g., after the question
+    was re-extracted or rebuilt) would stay in the output for good. Here every
+    Question node a shard holds first loses its MENTIONS edges in `graph` (which
+    is modified), the union then adds the shard's, and concepts no question
+    mentions any more are removed.
+
+    Returns:
+        A tuple (merged graph, number of orphaned concepts removed).
+    """
+    unlinked = set()
+    for shard in shards:
+        for node_id, data in shard.nodes(data=True):
+            if data.get("type") == "Question":
+                unlinked.update(unlink_question_concepts(graph, node_id))
+    # merge_graphs moves concepts onto their canonical IDs; look for the orphans there
+    canonical = set()
+    for concept_id in unlinked:
+        name = graph.nodes[concept_id].get("name")
+        canonical.add(generate_node_id("concept", normalize_concept_name(name)) if name else concept_id)
+    merged = merge_graphs([graph, *shards], definition_policy=definition_policy)
+    return merged, prune_orphan_concepts(merged, list(canonical))
+
+
 # Example usage (for direct testing):
 # if __name__ == '__main__':
 #     g = load_graph() # Load existing or create new
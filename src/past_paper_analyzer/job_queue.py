@@ -0,0 +1,211 @@
+import json
+import os
+import sqlite3
+import time
+from . import config
+
+# Each job is a single-question solutions PDF identified by (year, paper_code, question_num).
+# Jobs move through these states in order; a failure leaves the job in its current state,
+# records the error and bumps `attempts` so the next run retries it (up to JOB_MAX_ATTEMPTS).
+STATE_PENDING = "pending"
+STATE_DOWNLOADED = "downloaded"
+STATE_EXTRACTED = "extracted"
+STATE_MERGED = "merged"
+STATES = (STATE_PENDING, STATE_DOWNLOADED, STATE_EXTRACTED, STATE_MERGED)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    year INTEGER NOT NULL,
+    paper_code TEXT NOT NULL,
+    question_num TEXT NOT NULL,
+    course_hint TEXT,
+    state TEXT NOT NULL,
+    pdf_path TEXT,
+    concepts TEXT,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (year, paper_code, question_num)
+);
+CREATE INDEX IF NOT EXISTS jobs_by_state ON jobs (state, attempts);
+CREATE TABLE IF NOT EXISTS transitions (
+    year INTEGER NOT NULL,
+    paper_code TEXT NOT NULL,
+    question_num TEXT NOT NULL,
+    state TEXT NOT NULL,
+    at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS transitions_by_time ON transitions (state, at);
+"""
+
+
+def connect(path: str = config.JOB_DB_PATH) -> sqlite3.Connection:
+    """Opens (and if necessary creates) the job queue database."""
+    db_dir = os.path.dirname(path)
+    if db_dir:
+        os.makedirs(db_dir, exist_ok=True)
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row
+    conn.executescript(_SCHEMA)
+    return conn
+
+
+def job_key(job) -> tuple:
+    """Returns the (year, paper_code, question_num) key of a job row or dict."""
+    return (job["year"], job["paper_code"], job["question_num"])
+
+
+def enqueue(conn: sqlite3.Connection, specs: list[dict]) -> int:
+    """
+    Adds jobs for the given batch specifications, skipping ones already queued.
+
+    Args:
+        conn: Open job queue connection.
+        specs: Dicts with 'year', 'paper_code', 'question_num' and optional 'course_hint'
+               (as produced by batch_parser.load_batch_file).
+
+    Returns:
+        The number of newly queued jobs.
+    """
+    now = time.time()
+    added = 0
+    with conn:
+        for spec in specs:
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO jobs (year, paper_code, question_num, course_hint, state, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    spec["year"],
+                    spec["paper_code"],
+                    spec["question_num"],
+                    spec.get("course_hint"),
+                    STATE_PENDING,
+                    now,
+                    now,
+                ),
+            )
+            added += cursor.rowcount
+    return added
+
+
+def jobs_in_state(conn: sqlite3.Connection, state: str, include_exhausted: bool = False) -> list[dict]:
+    """Returns the jobs currently in `state`, excluding those that used up their attempts."""
+    query = "SELECT * FROM jobs WHERE state = ?"
+    params = [state]
+    if not include_exhausted:
+        query += " AND attempts < ?"
+        params.append(config.JOB_MAX_ATTEMPTS)
+    query += " ORDER BY year, paper_code, question_num"
+    jobs = []
+    for row in conn.execute(query, params):
+        job = dict(row)
+        job["concepts"] = json.loads(job["concepts"]) if job["concepts"] else None
+        jobs.append(job)
+    return jobs
+
+
+def advance(
+    conn: sqlite3.Connection,
+    job: dict,
+    state: str,
+    pdf_path: str = None,
+    concepts: list[dict] = None,
+):
+    """Moves a job to `state`, storing the downloaded path or extracted concepts if given."""
+    now = time.time()
+    with conn:
+        conn.execute(
+            "UPDATE jobs SET state = ?, pdf_path = COALESCE(?, pdf_path), "
+            "concepts = COALESCE(?, concepts), error = NULL, attempts = 0, updated_at = ? "
+            "WHERE year = ? AND paper_code = ? AND question_num = ?",
+            (
+                state,
+                pdf_path,
+                json.dumps(concepts) if concepts is not None else None,
+                now,
+                *job_key(job),
+            ),
+        )
+        conn.execute(
+            "INSERT INTO transitions (year, paper_code, question_num, state, at) VALUES (?, ?, ?, ?, ?)",
+            (*job_key(job), state, now),
+        )
+
+
+def record_failure(conn: sqlite3.Connection, job: dict, error: str):
+    """Records a failed attempt; the job stays in its current state for the next run."""
+    with conn:
+        conn.execute(
+            "UPDATE jobs SET error = ?, attempts = attempts + 1, updated_at = ? "
+            "WHERE year = ? AND paper_code = ? AND question_num = ?",
+            (error, time.time(), *job_key(job)),
+        )
+
+
+def reset_attempts(conn: sqlite3.Connection) -> int:
+    """Clears the failure count of every unfinished job so it is retried. Returns the count."""
+    with conn:
+        cursor = conn.execute(
+            "UPDATE jobs SET attempts = 0 WHERE attempts > 0 AND state != ?",
+            (STATE_MERGED,),
+        )
+    return cursor.rowcount
+
+
+def status_summary(conn: sqlite3.Connection, window_seconds: float = 600.0) -> dict:
+    """
+    Summarizes queue progress.
+
+    Returns:
+        A dict with 'counts' (jobs per state), 'exhausted' (jobs that reached
+        JOB_MAX_ATTEMPTS), 'total', and 'throughput' mapping each state to the
+        number of jobs per minute that reached it within the last `window_seconds`.
+    """
+    counts = {state: 0 for state in STATES}
+    for row in conn.execute("SELECT state, COUNT(*) AS n FROM jobs GROUP BY state"):
+        counts[row["state"]] = row["n"]
+    exhausted = conn.execute(
+        "SELECT COUNT(*) FROM jobs WHERE attempts >= ? AND state != ?",
+        (config.JOB_MAX_ATTEMPTS, STATE_MERGED),
+    ).fetchone()[0]
+
+    since = time.time() - window_seconds
+    throughput = {}
+    for state in STATES[1:]:
+        n, first, last = conn.execute(
+            "SELECT COUNT(*), MIN(at), MAX(at) FROM transitions WHERE state = ? AND at >= ?",
+            (state, since),
+        ).fetchone()
+        if n == 0:
+            throughput[state] = 0.0
+        else:
+            # Rate over the active part of the window, measured over at least a minute
+            elapsed = max(last - first, 60.0)
+            throughput[state] = n * 60.0 / elapsed
+
+    return {
+        "counts": counts,
+        "exhausted": exhausted,
+        "total": sum(counts.values()),
+        "throughput": throughput,
+    }
+
+
+def failed_jobs(conn: sqlite3.Connection) -> list[dict]:
+    """Returns unfinished jobs that have a recorded error, most recent first."""
+    rows = conn.execute(
+        "SELECT year, paper_code, question_num, state, error, attempts FROM jobs "
+        "WHERE error IS NOT NULL AND state != ? ORDER BY updated_at DESC",
+        (STATE_MERGED,),
+    )
+    return [dict(row) for row in rows]
+
+
+# Example usage (for direct testing):
+# if __name__ == '__main__':
+#     conn = connect(":memory:")
+#     enqueue(conn, [{"year": 2022, "paper_code": "p06", "question_num": "q01", "course_hint": None}])
+#     job = jobs_in_state(conn, STATE_PENDING)[0]
+#     advance(conn, job, STATE_DOWNLOADED, pdf_path="downloads/2022-p06-q01-solutions.pdf")
+#     print(status_summary(conn))
@@ -1,5 +1,16 @@
-import sys
-from . import config
+import base64
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from typing import Iterator
+import requests
+from . import config, metrics, page_optimizer, stream_parser
 
 # Placeholder for actual LLM interaction logic
 # We'll need to install and import the specific LLM library (e.g., openai)
@@ -10,6 +21,282 @@ from . import config
 #     print("Warning: 'openai' library not found. LLM extraction will fail. Install with 'pip install openai'", file=sys.stderr)
 #     openai = None
 
+# Page rendering for the Vision model input (optional dependency; needs poppler)
+try:
+    from pdf2image import convert_from_path
+except ImportError:
+    convert_from_path = None
+
+logger = logging.getLogger(__name__)
+
+# Recorded with every stored extraction result (see extraction_store). Bump
+# PROMPT_VERSION whenever the prompt below changes in a way that affects output.
+MODEL_NAME = "gpt-4o"
+PROMPT_VERSION = "1"
+
+
+def model_name() -> str:
+    """Returns the name of the model that produces results under the configured backend."""
+    return "fake" if config.LLM_BACKEND == "fake" else MODEL_NAME
+
+
+def prepare_pdf_pages(pdf_path: str, cache_dir: str = config.PAGE_CACHE_DIR) -> list[str]:
+    """
+    Rasterizes each page of a PDF and writes it to disk as a JPEG.
+
+    This is the CPU-heavy part of extraction. Pages are cached per PDF (keyed
+    by file name, size, mtime and the rendering and optimizer settings), so
+    re-running extraction does not re-render, and worker processes only pass
+    file paths back to the parent.
+    A PDF's pages are written to a temporary directory that is renamed into
+    place once complete, so an interrupted render never leaves a partial cache entry.
+    With PAGE_OPTIMIZE set, pages go through page_optimizer.optimize_pages
+    first, and the estimated vision tokens saved are logged per PDF.
+
+    Args:
+        pdf_path: Path to the solutions PDF file.
+        cache_dir: Directory under which rendered pages are stored.
+
+    Returns:
+        Paths to the encoded page images in page order, or an empty list if
+        rendering is unavailable or fails.
+    """
+    if convert_from_path is None:
+        return []
+
+    stat = os.stat(pdf_path)
+    stem = os.path.splitext(os.path.basename(pdf_path))[0]
+    optimize = config.PAGE_OPTIMIZE and page_optimizer.available()
+    # Pages depend on every rendering and optimizer setting, so each combination is cached separately
+    settings = [config.PAGE_RENDER_DPI]
+    if optimize:
+        settings += [
+            config.PAGE_TOKEN_BUDGET,
+            config.PAGE_MIN_SIDE,
+            config.PAGE_BLANK_INK,
+            config.PAGE_DUPLICATE_DISTANCE,
+            config.PAGE_CROP_PADDING,
+        ]
+    settings_key = hashlib.sha1(repr(settings).encode("utf-8")).hexdigest()[:8]
+    suffix = f"-opt{settings_key}" if optimize else f"-{settings_key}"
+    page_dir = os.path.join(cache_dir, f"{stem}-{stat.st_size}-{int(stat.st_mtime)}{suffix}")
+    if os.path.isdir(page_dir):
+        cached = sorted(
+            os.path.join(page_dir, name) for name in os.listdir(page_dir) if name.endswith(".jpg")
+        )
+        if cached:
+            metrics.incr("extract.page_cache_hits")
+            return cached
+    metrics.incr("extract.page_cache_misses")
+
+    with metrics.timer("extract.render"):
+        try:
+            images = convert_from_path(pdf_path, dpi=config.PAGE_RENDER_DPI, thread_count=1)
+        except Exception as e:
+            logger.error("Rendering pages of '%s' failed: %s", pdf_path, e)
+            return []
+
+    if optimize:
+        with metrics.timer("extract.optimize_pages"):
+            images, report = page_optimizer.optimize_pages(images)
+        logger.info(
+            "Pages of '%s': kept %d of %d (%d blank, %d duplicate); ~%d vision tokens instead of ~%d (%d saved).",
+            os.path.basename(pdf_path),
+            report["pages_out"],
+            report["pages_in"],
+            report["blank"],
+            report["duplicates"],
+            report["tokens_after"],
+            report["tokens_before"],
+            report["tokens_before"] - report["tokens_after"],
+            extra=report,
+        )
+
+    with metrics.timer("extract.encode"):
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_dir = tempfile.mkdtemp(prefix=f".{os.path.basename(page_dir)}.", dir=cache_dir)
+        try:
+            names = []
+            for i, image in enumerate(images, start=1):
+                name = f"page-{i:03d}.jpg"
+                image.convert("L" if optimize else "RGB").save(os.path.join(tmp_dir, name), format="JPEG", quality=85)
+                names.append(name)
+            try:
+                os.replace(tmp_dir, page_dir)
+            except OSError:
+                # Another worker cached the same PDF first (the target is a non-empty directory); use its pages
+                if not os.path.isdir(page_dir):
+                    raise
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+    metrics.incr("extract.pages_rendered", len(names))
+    return [os.path.join(page_dir, name) for name in names]
+
+
+# Vocabulary for the fake extractor: enough distinct names that synthetic corpora
+# produce realistic concept sharing between questions.
+_FAKE_TOPICS = [
+    "hash table", "red-black tree", "dijkstra's algorithm", "dynamic programming",
+    "virtual memory", "page replacement", "deadlock", "mutual exclusion",
+    "lambda calculus", "type inference", "unification", "garbage collection",
+    "tcp congestion control", "routing", "public key cryptography", "diffie-hellman",
+    "relational algebra", "normalization", "b-tree", "transaction isolation",
+    "finite automata", "regular expressions", "context-free grammar", "turing machine",
+    "bayes' theorem", "markov chain", "gradient descent", "backpropagation",
+    "ray tracing", "rasterization", "cache coherence", "pipelining",
+]
+_FAKE_ASPECTS = ["", "complexity", "correctness", "implementation", "applications", "variants"]
+
+
+def fake_extract_concepts(pdf_path: str, count: int = 6) -> list[dict]:
+    """
+    Deterministic, offline stand-in for the Vision LLM (LLM_BACKEND=fake).
+
+    The same file name always yields the same concepts, so benchmark runs are
+    comparable between commits without network access or API cost.
+    """
+    seed = hashlib.sha256(os.path.basename(pdf_path).encode()).digest()
+    concepts = []
+    for i in range(count):
+        topic = _FAKE_TOPICS[seed[i] % len(_FAKE_TOPICS)]
+        aspect = _FAKE_ASPECTS[seed[i + count] % len(_FAKE_ASPECTS)]
+        name = f"{topic} {aspect}".strip()
+        concepts.append(
+            {
+                "concept_name": name,
+                "definition": f"Synthetic definition of {name}.",
+                "question_context": f"Part {chr(ord('a') + i)}",
+            }
+        )
+    return concepts
+
+
+_SYSTEM_PROMPT = (
+    "You are an expert computer science assistant analyzing Cambridge Tripos exam solutions PDFs."
+)
+_USER_PROMPT = (
+    "Analyze the provided exam solution PDF pages. For each distinct question or sub-question, identify "
+    "the key computer science concepts discussed or applied. Provide the output as a JSON list, where each "
+    "item has 'concept_name' (canonical form), 'definition' (brief, 1-2 sentences), and 'question_context' "
+    "(e.g., 'Question 1a', 'Section B Q3')."
+)
+
+
+def build_messages(pdf_path: str, page_paths: list[str]) -> list[dict]:
+    """Builds the chat messages for one PDF: the instructions plus each page image, base64-encoded."""
+    content = [{"type": "text", "text": f"{_USER_PROMPT}\nSource file: {os.path.basename(pdf_path)}"}]
+    for page_path in page_paths:
+        with open(page_path, "rb") as f:
+            encoded = base64.b64encode(f.read()).decode("ascii")
+        content.append({"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{encoded}"}})
+    return [{"role": "system", "content": _SYSTEM_PROMPT}, {"role": "user", "content": content}]
+
+
+def stream_chat_completion(messages: list[dict]) -> Iterator[str]:
+    """
+    Yields the content deltas of a streamed chat completion.
+
+    Speaks the OpenAI-compatible server-sent events protocol at
+    OPENAI_BASE_URL/chat/completions ('data: {...}' lines, ending with
+    'data: [DONE]'), so it works against any compatible server, including the
+    benchmark's local stand-in. The token usage reported in the final event is
+    added to the llm.prompt_tokens and llm.completion_tokens counters.
+
+    Raises:
+        requests.exceptions.RequestException: If the request fails or the connection drops.
+    """
+    response = requests.post(
+        f"{config.OPENAI_BASE_URL}/chat/completions",
+        headers={"Authorization": f"Bearer {config.OPENAI_API_KEY}"},
+        json={
+            "model": MODEL_NAME,
+            "messages": messages,
+            "max_tokens": config.LLM_MAX_TOKENS,
+            "stream": True,
+            # Ask for a final event carrying the token usage, which streamed answers otherwise omit
+            "stream_options": {"include_usage": True},
+        },
+        stream=True,
+        timeout=(config.DOWNLOAD_CONNECT_TIMEOUT, config.LLM_READ_TIMEOUT),
+    )
+    with response:
+        response.raise_for_status()
+        response.encoding = "utf-8"
+        metrics.incr("llm.calls")
+        # chunk_size=None hands over data as soon as it arrives instead of filling a buffer first
+        for line in response.iter_lines(chunk_size=None, decode_unicode=True):
+            if not line.startswith("data:"):
+                continue  # Blank separators, comments and other SSE fields
+            data = line[len("data:"):].strip()
+            if data == "[DONE]":
+                return
+            try:
+                event = json.loads(data)
+                usage = event.get("usage")
+                if usage:
+                    metrics.incr("llm.prompt_tokens", usage.get("prompt_tokens") or 0)
+                    metrics.incr("llm.completion_tokens", usage.get("completion_tokens") or 0)
+                if not event["choices"]:
+                    continue  # The usage event has no choices
+                choice = event["choices"][0]
+            except (json.JSONDecodeError, KeyError, IndexError, TypeError, AttributeError):
+                logger.debug("Ignoring unexpected stream event: %.120s", data)
+                continue
+            content = (choice.get("delta") or {}).get("content")
+            if content:
+                metrics.incr("llm.stream_chunks")
+                yield content
+            if choice.get("finish_reason") == "length":
+                logger.warning("LLM output hit the max_tokens limit (%d); the answer is cut off.", config.LLM_MAX_TOKENS)
+
+
+def stream_concepts_from_pdf(pdf_path: str) -> Iterator[dict]:
+    """
+    Extracts concepts from a PDF, yielding each one as soon as the model has produced it.
+
+    Every concept is validated on its own (see stream_parser), so a malformed
+    entry is skipped rather than failing the whole answer, and if the response is
+    cut off (token limit, dropped connection) the concepts completed before the
+    cut are still yielded.
+
+    Args:
+        pdf_path: Path to the solutions PDF file.
+
+    Yields:
+        Concept dicts with 'concept_name', 'definition' and 'question_context'.
+    """
+    if config.LLM_BACKEND == "fake":
+        yield from fake_extract_concepts(pdf_path)
+        return
+    if not config.OPENAI_API_KEY:
+        logger.error("OPENAI_API_KEY not set in .env file. Cannot call LLM.")
+        return
+
+    messages = build_messages(pdf_path, prepare_pdf_pages(pdf_path))
+    parser = stream_parser.ConceptStreamParser()
+    start = time.perf_counter()
+    first = True
+    try:
+        for delta in stream_chat_completion(messages):
+            for concept in parser.feed(delta):
+                if first:
+                    metrics.observe("extract.first_concept", time.perf_counter() - start)
+                    first = False
+                yield concept
+    except requests.exceptions.RequestException as e:
+        logger.error("Streaming completion for '%s' failed after %d concept(s): %s", pdf_path, parser.accepted, e)
+    finally:
+        metrics.observe("extract.llm", time.perf_counter() - start)
+    parser.close()
+    metrics.incr("llm.concepts_rejected", parser.rejected)
+    if parser.truncated:
+        metrics.incr("llm.truncated")
+        logger.warning(
+            "LLM answer for '%s' ended before the concept list was complete; keeping %d concept(s).",
+            os.path.basename(pdf_path),
+            parser.accepted,
+        )
+
 
 def extract_concepts_from_pdf(pdf_path: str) -> list[dict]:
     """
@@ -23,18 +310,19 @@ def extract_concepts_from_pdf(pdf_path: str) -> list[dict]:
         and its context (e.g., {'concept_name': '...', 'definition': '...', 'question_context': '...'}).
         Returns an empty list if extraction fails or is not implemented.
     """
-    print("--- LLM Extractor Placeholder ---")
-    print(f"Processing PDF: '{pdf_path}'")
+    if config.LLM_BACKEND == "fake":
+        return fake_extract_concepts(pdf_path)
+
+    logger.debug("LLM extractor placeholder processing PDF: '%s'", pdf_path)
 
     if not config.OPENAI_API_KEY:
-        print(
-            "Error: OPENAI_API_KEY not set in .env file. Cannot call LLM.",
-            file=sys.stderr,
-        )
+        logger.error("OPENAI_API_KEY not set in .env file. Cannot call LLM.")
         return []
+    if config.LLM_STREAM:
+        return list(stream_concepts_from_pdf(pdf_path))
 
     # if openai is None:
-    #      print("Error: OpenAI library not available.", file=sys.stderr)
+    #      logger.error("OpenAI library not available.")
     #      return []
 
     # --- Actual LLM Interaction Logic Would Go Here ---
@@ -42,17 +330,16 @@ def extract_concepts_from_pdf(pdf_path: str) -> list[dict]:
     #    openai.api_key = config.OPENAI_API_KEY
     #
     # 2. Load/prepare the PDF data for the Vision model.
-    #    - This might involve sending the PDF bytes directly if the API supports it,
-    #    - or converting pages to images and sending image data/URLs.
-    #    - Example using images (requires libraries like pdf2image, Pillow):
-    #      from pdf2image import convert_from_path
+    #    Pages are rendered once to JPEGs on disk by prepare_pdf_pages below and
+    #    only base64-encoded right before building the request:
     #      import base64
-    #      images = convert_from_path(pdf_path)
     #      base64_images = []
-    #      for img in images:
-    #          # Convert PIL image to base64
-    #          # ... (implementation needed) ...
-    #          base64_images.append(base64_data)
+    #      for page_path in page_paths:
+    #          with open(page_path, "rb") as f:
+    #              base64_images.append(base64.b64encode(f.read()).decode("ascii"))
+    page_paths = prepare_pdf_pages(pdf_path)
+    if page_paths:
+        logger.debug("Rendered %d page image(s) for '%s'.", len(page_paths), pdf_path)
     #
     # 3. Construct the prompt for the Vision LLM (e.g., GPT-4o). This is critical.
     #    prompt_messages = [
@@ -73,15 +360,19 @@ def extract_concepts_from_pdf(pdf_path: str) -> list[dict]:
     #
     # 4. Send the request to the LLM API.
     #    try:
-    #        response = openai.chat.completions.create(
-    #            model="gpt-4o", # Or your chosen vision model
+    #        with metrics.timer("extract.llm"):
+    #            response = openai.chat.completions.create(
+    #            model=MODEL_NAME,
     #            messages=prompt_messages,
     #            max_tokens=1000, # Adjust as needed
     #            # Potentially use response_format={"type": "json_object"} if supported and reliable
     #        )
+    #        metrics.incr("llm.calls")
+    #        metrics.incr("llm.prompt_tokens", response.usage.prompt_tokens)
+    #        metrics.incr("llm.completion_tokens", response.usage.completion_tokens)
     #        llm_output_content = response.choices[0].message.content
     #    except Exception as e:
-    #        print(f"Error calling LLM API: {e}", file=sys.stderr)
+    #        logger.error("Calling LLM API failed: %s", e)
     #        return []
     #
     # 5. Parse the response (expecting JSON).
@@ -89,17 +380,17 @@ def extract_concepts_from_pdf(pdf_path: str) -> list[dict]:
     #    try:
     #        extracted_concepts = json.loads(llm_output_content)
     #        if not isinstance(extracted_concepts, list):
-    #             print("Error: LLM did not return a valid JSON list.", file=sys.stderr)
+    #             logger.error("LLM did not return a valid JSON list.")
     #             return []
     #        # Further validation of list items structure?
     #        return extracted_concepts
     #    except json.JSONDecodeError:
-    #        print(f"Error: Could not parse JSON response from LLM: {llm_output_content}", file=sys.stderr)
+    #        logger.error("Could not parse JSON response from LLM: %s", llm_output_content)
     #        return []
     # --- End of Actual Logic Placeholder ---
 
     # Dummy data for now:
-    print("Placeholder: Returning dummy concept data.")
+    logger.debug("Placeholder: Returning dummy concept data.")
     dummy_concepts = [
         {
             "concept_name": "Dummy Concept A",
@@ -117,10 +408,68 @@ def extract_concepts_from_pdf(pdf_path: str) -> list[dict]:
             "question_context": "Question 2",
         },  # Test canonicalization
     ]
-    print("--- End LLM Extractor Placeholder ---")
     return dummy_concepts
 
 
+def _extract_one(pdf_path: str) -> list[dict]:
+    """Extracts one PDF, timing it and turning unexpected errors into an empty result."""
+    try:
+        with metrics.timer("extract.pdf"):
+            return extract_concepts_from_pdf(pdf_path)
+    except Exception as e:
+        logger.error("Extracting concepts from '%s' failed: %s", pdf_path, e)
+        metrics.incr("extract.errors")
+        return []
+
+
+def _extract_worker(pdf_path: str) -> tuple[str, list[dict], dict]:
+    """
+    Process-pool entry point: returns only the (small) concept list, never page
+    images, plus the metrics recorded while extracting so the parent can merge them.
+    """
+    metrics.reset()
+    concepts = _extract_one(pdf_path)
+    return pdf_path, concepts, metrics.snapshot()
+
+
+def extract_concepts_batch(
+    pdf_paths: list[str], workers: int = config.EXTRACT_WORKERS
+) -> Iterator[tuple[str, list[dict]]]:
+    """
+    Extracts concepts from many PDFs, rendering and encoding pages in parallel worker processes.
+
+    Args:
+        pdf_paths: Paths to solutions PDF files.
+        workers: Number of worker processes. 1 runs everything in the current process.
+
+    Yields:
+        (pdf_path, concepts) tuples in completion order, so callers can record
+        progress as each PDF finishes. A failed PDF yields an empty concept list,
+        as does every PDF left unfinished when a worker process dies (e.g., is
+        killed for running out of memory while rendering).
+    """
+    if workers <= 1 or len(pdf_paths) <= 1:
+        for pdf_path in pdf_paths:
+            yield pdf_path, _extract_one(pdf_path)
+        return
+
+    with ProcessPoolExecutor(max_workers=min(workers, len(pdf_paths))) as executor:
+        futures = {executor.submit(_extract_worker, pdf_path): pdf_path for pdf_path in pdf_paths}
+        broken = False
+        for future in as_completed(futures):
+            try:
+                pdf_path, concepts, worker_metrics = future.result()
+            except BrokenProcessPool as e:
+                if not broken:
+                    logger.error("A worker process died; abandoning unfinished PDFs: %s", e)
+                    broken = True
+                metrics.incr("extract.errors")
+                yield futures[future], []
+                continue
+            metrics.merge(worker_metrics)
+            yield pdf_path, concepts
+
+
 # Example usage (for direct testing):
 # if __name__ == '__main__':
 #     # Assuming a dummy PDF exists or was downloaded
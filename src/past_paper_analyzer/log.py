@@ -0,0 +1,131 @@
+import json
+import logging
+import sys
+import time
+
+# Logging setup for the package. Modules log through the standard library with
+# `logger = logging.getLogger(__name__)` and %-style arguments, so messages are
+# only formatted when their level is enabled; `configure` picks the level and
+# output format (plain text or JSON lines) once, from the CLI.
+
+PACKAGE_LOGGER = "past_paper_analyzer"
+LEVELS = ("DEBUG", "INFO", "WARNING", "ERROR")
+FORMATS = ("text", "json")
+
+# Attributes every LogRecord has; anything else was passed via `extra=` and is
+# emitted as a structured field in JSON mode.
+_RECORD_ATTRS = set(logging.LogRecord("", 0, "", 0, "", None, None).__dict__) | {"message", "asctime"}
+
+_progress_enabled = False
+
+
+class TextFormatter(logging.Formatter):
+    """Plain messages for INFO and below; "Warning: ..."/"Error: ..." prefixes above, as the CLI always printed."""
+
+    _PREFIXES = {logging.WARNING: "Warning: ", logging.ERROR: "Error: ", logging.CRITICAL: "Error: "}
+
+    def format(self, record: logging.LogRecord) -> str:
+        message = record.getMessage()
+        if record.exc_info:
+            message += "\n" + self.formatException(record.exc_info)
+        return self._PREFIXES.get(record.levelno, "") + message
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line with timestamp, level, logger, message and any `extra=` fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 6),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def configure(level: str = "INFO", fmt: str = "text", progress: bool = False, stream=None):
+    """
+    Configures package logging. Safe to call more than once.
+
+    Args:
+        level: Minimum level to emit (one of LEVELS).
+        fmt: "text" for human-readable lines, "json" for JSON lines.
+        progress: Show a single updating progress line for batch loops instead of
+                  per-item messages (per-item INFO/DEBUG messages are suppressed).
+        stream: Output stream (default: stderr).
+    """
+    global _progress_enabled
+    logger = logging.getLogger(PACKAGE_LOGGER)
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+
+    handler = logging.StreamHandler(stream or sys.stderr)
+    handler.setFormatter(JsonFormatter() if fmt == "json" else TextFormatter())
+    logger.addHandler(handler)
+    numeric_level = getattr(logging, level.upper(), logging.INFO)
+    if progress:
+        numeric_level = max(numeric_level, logging.WARNING)
+    logger.setLevel(numeric_level)
+    logger.propagate = False
+    # Progress lines are terminal-only; they would corrupt JSON output
+    _progress_enabled = progress and fmt != "json"
+
+
+class Progress:
+    """
+    Summarizing progress line for batch loops (enabled with configure(progress=True)).
+
+    `advance` is a counter increment plus a clock check when progress display is
+    off or throttled, so it can be called per item in hot loops.
+    """
+
+    def __init__(self, total: int, label: str, interval: float = 0.2):
+        self.total = total
+        self.label = label
+        self.interval = interval
+        self.done = 0
+        self.failed = 0
+        self.started = time.monotonic()
+        self._last_draw = 0.0
+        self._enabled = _progress_enabled and total > 0
+
+    def advance(self, ok: bool = True):
+        self.done += 1
+        if not ok:
+            self.failed += 1
+        if self._enabled:
+            now = time.monotonic()
+            if now - self._last_draw >= self.interval or self.done == self.total:
+                self._last_draw = now
+                self._draw(now)
+
+    def _draw(self, now: float):
+        elapsed = max(now - self.started, 1e-9)
+        width = 30
+        filled = int(width * self.done / self.total)
+        bar = "#" * filled + "-" * (width - filled)
+        sys.stderr.write(
+            f"\r{self.label} [{bar}] {self.done}/{self.total} "
+            f"({self.failed} failed, {self.done / elapsed:.1f}/s)"
+        )
+        sys.stderr.flush()
+
+    def close(self):
+        """Ends the progress line."""
+        if self._enabled:
+            if self.done != self.total:
+                self._draw(time.monotonic())
+            sys.stderr.write("\n")
+            sys.stderr.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
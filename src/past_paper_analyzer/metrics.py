@@ -0,0 +1,127 @@
+import json
+import os
+import re
+import time
+from contextlib import contextmanager
+
+# Process-wide registry of counters and timers for the current run.
+# Names are dotted "<stage>.<what>" strings, e.g. "download.bytes" or "graph.save".
+_counters: dict[str, float] = {}
+_timers: dict[str, dict[str, float]] = {}
+_run_started = time.time()
+
+
+def incr(name: str, value: float = 1):
+    """Adds `value` to the counter `name`."""
+    _counters[name] = _counters.get(name, 0) + value
+
+
+def observe(name: str, seconds: float):
+    """Records one duration sample for the timer `name`."""
+    stats = _timers.get(name)
+    if stats is None:
+        _timers[name] = {"count": 1, "total": seconds, "max": seconds}
+    else:
+        stats["count"] += 1
+        stats["total"] += seconds
+        if seconds > stats["max"]:
+            stats["max"] = seconds
+
+
+@contextmanager
+def timer(name: str):
+    """Times the enclosed block and records it under `name` (also when it raises)."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - start)
+
+
+def snapshot() -> dict:
+    """Returns a copy of all counters and timers."""
+    return {
+        "counters": dict(_counters),
+        "timers": {name: dict(stats) for name, stats in _timers.items()},
+    }
+
+
+def merge(other: dict):
+    """Folds a snapshot taken in another process (e.g., a pool worker) into this registry."""
+    for name, value in other.get("counters", {}).items():
+        incr(name, value)
+    for name, stats in other.get("timers", {}).items():
+        mine = _timers.setdefault(name, {"count": 0, "total": 0.0, "max": 0.0})
+        mine["count"] += stats["count"]
+        mine["total"] += stats["total"]
+        mine["max"] = max(mine["max"], stats["max"])
+
+
+def reset():
+    """Clears all metrics and restarts the run clock."""
+    global _run_started
+    _counters.clear()
+    _timers.clear()
+    _run_started = time.time()
+
+
+def build_report(command: str = None) -> dict:
+    """Returns the per-run report: run metadata plus counters and timers (with mean durations)."""
+    report = {
+        "command": command,
+        "started_at": _run_started,
+        "duration_seconds": time.time() - _run_started,
+    }
+    report.update(snapshot())
+    for stats in report["timers"].values():
+        stats["mean"] = stats["total"] / stats["count"] if stats["count"] else 0.0
+    return report
+
+
+def write_json_report(path: str, command: str = None):
+    """Writes the per-run report as JSON to `path`."""
+    out_dir = os.path.dirname(path)
+    if out_dir:
+        os.makedirs(out_dir, exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(build_report(command), f, indent=2, sort_keys=True)
+
+
+def _prometheus_name(name: str) -> str:
+    return "past_paper_" + re.sub(r"[^a-zA-Z0-9_]", "_", name)
+
+
+def to_prometheus() -> str:
+    """Renders the metrics in the Prometheus text exposition format."""
+    lines = []
+    for name in sorted(_counters):
+        metric = _prometheus_name(name) + "_total"
+        lines.append(f"# TYPE {metric} counter")
+        lines.append(f"{metric} {_counters[name]:g}")
+    for name in sorted(_timers):
+        stats = _timers[name]
+        metric = _prometheus_name(name) + "_seconds"
+        lines.append(f"# TYPE {metric} summary")
+        lines.append(f"{metric}_count {stats['count']:g}")
+        lines.append(f"{metric}_sum {stats['total']:.6f}")
+        lines.append(f"# TYPE {metric}_max gauge")
+        lines.append(f"{metric}_max {stats['max']:.6f}")
+    return "\n".join(lines) + "\n"
+
+
+def write_prometheus(path: str):
+    """Writes the metrics in Prometheus text format to `path` (e.g., for node_exporter's textfile collector)."""
+    out_dir = os.path.dirname(path)
+    if out_dir:
+        os.makedirs(out_dir, exist_ok=True)
+    with open(path, "w") as f:
+        f.write(to_prometheus())
+
+
+# Example usage (for direct testing):
+# if __name__ == '__main__':
+#     with timer("example.sleep"):
+#         time.sleep(0.01)
+#     incr("example.items", 3)
+#     print(json.dumps(build_report("example"), indent=2))
+#     print(to_prometheus())
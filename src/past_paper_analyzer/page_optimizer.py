@@ -0,0 +1,194 @@
+import logging
+import math
+from . import config, metrics
+
+# Preprocessing of rendered PDF pages before they are sent to the vision model.
+#
+# Vision input is billed per 512x512 tile of the (API-downscaled) image, so cost
+# and latency follow pixel count, not content. optimize_pages drops pages that
+# carry no content (blank or near-empty) or repeat an earlier page (same
+# perceptual hash, e.g. a cover sheet per question), crops the white margins,
+# converts to grayscale, and then picks each page's resolution so the whole PDF
+# fits PAGE_TOKEN_BUDGET without going below PAGE_MIN_SIDE pixels.
+
+# Optional dependency: Pillow (also required by pdf2image for rendering)
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+# Vision token accounting for high-detail images (GPT-4o): the image is scaled to
+# fit 2048x2048, then so that its shorter side is at most 768 px, and costs a
+# fixed base plus a price per 512 px tile.
+_MAX_SIDE = 2048
+_MAX_SHORT_SIDE = 768
+_TILE = 512
+_BASE_TOKENS = 85
+_TILE_TOKENS = 170
+
+# A pixel darker than this (0-255) counts as ink
+_INK_LEVEL = 200
+# Blank detection and hashing work on a thumbnail this wide
+_THUMB_WIDTH = 256
+
+
+def available() -> bool:
+    """Returns True if Pillow is installed."""
+    return Image is not None
+
+
+def _api_size(width: int, height: int) -> tuple[int, int]:
+    """Size the API actually processes an image of `width` x `height` at."""
+    scale = min(1.0, _MAX_SIDE / max(width, height))
+    short_side = min(width, height) * scale
+    if short_side > _MAX_SHORT_SIDE:
+        scale *= _MAX_SHORT_SIDE / short_side
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def vision_tokens(width: int, height: int) -> int:
+    """Estimated input tokens for one high-detail image of the given size."""
+    width, height = _api_size(width, height)
+    return _BASE_TOKENS + _TILE_TOKENS * math.ceil(width / _TILE) * math.ceil(height / _TILE)
+
+
+def _thumbnail(gray):
+    height = max(1, round(gray.height * _THUMB_WIDTH / gray.width))
+    return gray.resize((_THUMB_WIDTH, height), Image.BOX)
+
+
+def ink_fraction(gray) -> float:
+    """Fraction of (thumbnail) pixels dark enough to be ink."""
+    histogram = _thumbnail(gray).histogram()
+    total = sum(histogram)
+    return sum(histogram[:_INK_LEVEL]) / total if total else 0.0
+
+
+def dhash(gray, size: int = 16) -> int:
+    """
+    Difference hash: one bit per horizontally adjacent pixel pair of a (size+1)x(size) thumbnail.
+
+    The usual 8x8 hash makes different pages of dense text look alike; at 16x16
+    distinct text pages differ in ~80 of 256 bits, a rescan of the same page in ~20.
+    """
+    pixels = gray.resize((size + 1, size), Image.BOX).tobytes()  # One byte per pixel for mode "L"
+    bits = 0
+    for row in range(size):
+        offset = row * (size + 1)
+        for col in range(size):
+            bits = (bits << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return bits
+
+
+def crop_margins(gray, padding: int = config.PAGE_CROP_PADDING):
+    """Crops the page to the bounding box of its ink plus `padding` pixels."""
+    mask = gray.point(lambda v: 255 if v < _INK_LEVEL else 0)
+    box = mask.getbbox()
+    if box is None:
+        return gray
+    left, top, right, bottom = box
+    return gray.crop(
+        (max(0, left - padding), max(0, top - padding), min(gray.width, right + padding), min(gray.height, bottom + padding))
+    )
+
+
+def _fit_budget(sizes: list[tuple[int, int]], budget: int, min_side: int) -> list[tuple[int, int]]:
+    """
+    Chooses a target size per page so the total token estimate fits `budget`.
+
+    Starting from what the API would process anyway, the currently most
+    expensive page is shrunk to the largest size that needs one tile row or
+    column fewer, until the total fits or no page can shrink without its
+    shorter side dropping below `min_side`.
+    """
+    targets = [_api_size(w, h) for w, h in sizes]
+    costs = [vision_tokens(w, h) for w, h in targets]
+    shrinkable = set(range(len(targets)))
+    while sum(costs) > budget and shrinkable:
+        page = max(shrinkable, key=lambda i: costs[i])
+        w, h = targets[page]
+        tiles_w, tiles_h = math.ceil(w / _TILE), math.ceil(h / _TILE)
+        # Scale factors that remove one tile column or one tile row; keep the gentler one
+        steps = [_TILE * (tiles - 1) / side for tiles, side in ((tiles_w, w), (tiles_h, h)) if tiles > 1]
+        scale = max(steps, default=0.0)
+        if scale <= 0 or min(w, h) * scale < min_side:
+            shrinkable.discard(page)
+            continue
+        targets[page] = (max(1, math.floor(w * scale)), max(1, math.floor(h * scale)))
+        costs[page] = vision_tokens(*targets[page])
+    return targets
+
+
+def optimize_pages(
+    images: list,
+    token_budget: int = config.PAGE_TOKEN_BUDGET,
+    min_side: int = config.PAGE_MIN_SIDE,
+    blank_threshold: float = config.PAGE_BLANK_INK,
+    duplicate_distance: int = config.PAGE_DUPLICATE_DISTANCE,
+) -> tuple[list, dict]:
+    """
+    Prepares rendered pages for the vision model within a token budget.
+
+    Args:
+        images: PIL images of the pages, in order.
+        token_budget: Target for the estimated vision tokens of all pages together.
+        min_side: Pages are never shrunk below this many pixels on their shorter side.
+        blank_threshold: Pages with a smaller ink fraction are dropped as blank.
+        duplicate_distance: Pages within this dHash Hamming distance of a kept page are dropped.
+
+    Returns:
+        A tuple (optimized grayscale images, report). The report holds 'pages_in',
+        'pages_out', 'blank', 'duplicates', 'tokens_before' and 'tokens_after'.
+    """
+    report = {
+        "pages_in": len(images),
+        "pages_out": 0,
+        "blank": 0,
+        "duplicates": 0,
+        "tokens_before": sum(vision_tokens(*image.size) for image in images),
+        "tokens_after": 0,
+    }
+    kept = []
+    hashes = []
+    for image in images:
+        gray = image.convert("L")
+        if ink_fraction(gray) < blank_threshold:
+            report["blank"] += 1
+            continue
+        cropped = crop_margins(gray)
+        page_hash = dhash(cropped)
+        if any(bin(page_hash ^ other).count("1") <= duplicate_distance for other in hashes):
+            report["duplicates"] += 1
+            continue
+        hashes.append(page_hash)
+        kept.append(cropped)
+    if not kept and images:
+        # Nothing looked like content; send the first page rather than nothing
+        kept.append(crop_margins(images[0].convert("L")))
+
+    targets = _fit_budget([page.size for page in kept], token_budget, min_side)
+    optimized = [
+        page if page.size == size else page.resize(size, Image.LANCZOS) for page, size in zip(kept, targets)
+    ]
+    report["pages_out"] = len(optimized)
+    report["tokens_after"] = sum(vision_tokens(*page.size) for page in optimized)
+    if report["tokens_after"] > token_budget:
+        logger.debug(
+            "Pages need ~%d tokens, over the budget of %d, at the minimum legible size.",
+            report["tokens_after"],
+            token_budget,
+        )
+    metrics.incr("pages.dropped_blank", report["blank"])
+    metrics.incr("pages.dropped_duplicate", report["duplicates"])
+    metrics.incr("pages.tokens_before", report["tokens_before"])
+    metrics.incr("pages.tokens_after", report["tokens_after"])
+    return optimized, report
+
+
+# Example usage (for direct testing):
+# if __name__ == '__main__':
+#     from pdf2image import convert_from_path
+#     pages, report = optimize_pages(convert_from_path("downloads/2022-p06-q01-solutions.pdf", dpi=150))
+#     print(report)
@@ -0,0 +1,386 @@
+import contextlib
+import heapq
+import json
+import logging
+import os
+import threading
+import time
+import zlib
+from collections import Counter, OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable
+from urllib.parse import parse_qs, unquote, urlparse
+import networkx as nx
+from . import config, graph_store, metrics
+
+# Read-only HTTP query service over the concept graph ('python main.py api').
+#
+# Every endpoint is answered from a GraphIndex: plain dicts and lists built once
+# per graph revision, so a request costs a dict lookup and (on a cache miss) one
+# json.dumps. Encoded responses are cached per (revision, path, query) and carry
+# an ETag derived from the revision, so clients that send If-None-Match get a 304
+# without a body. The cache is dropped whenever the revision changes: for the
+# standalone service that is the graph's version sidecar (bumped by every
+# commit_changes), for the watch daemon it is the resident graph's revision.
+
+logger = logging.getLogger(__name__)
+
+ENDPOINTS = {
+    "/concepts": "Concepts by frequency (?limit=, ?offset=, ?min_count=)",
+    "/concepts/<name>": "One concept with the questions that mention it",
+    "/questions?concept=<name>": "Questions mentioning a concept",
+    "/papers": "Papers with their questions (?year=)",
+    "/courses": "Courses with question counts",
+    "/courses/<course>/top": "Most frequent concepts in a course (?k=)",
+}
+
+
+class QueryError(Exception):
+    """Raised by GraphIndex queries for bad requests; carries the HTTP status."""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class GraphIndex:
+    """
+    Precomputed views of one graph revision used to answer queries.
+
+    Args:
+        graph: The concept graph; it is only read while the index is built.
+        revision: Identifier of the graph revision, reported in every response.
+    """
+
+    def __init__(self, graph: nx.DiGraph, revision: str):
+        self.revision = revision
+        self.concepts: dict[str, dict] = {}
+        self.questions: dict[str, dict] = {}
+        self.concept_questions: dict[str, list[str]] = {}
+        self.papers_by_year: dict[int, list[dict]] = {}
+        self.course_concepts: dict[str, Counter] = {}
+        course_questions = Counter()
+
+        for node_id, data in graph.nodes(data=True):
+            if data.get("type") == "Concept":
+                self.concepts[node_id] = {
+                    "id": node_id,
+                    "name": data.get("name", node_id),
+                    "definition": data.get("definition"),
+                    "frequency": 0,
+                }
+                self.concept_questions[node_id] = []
+
+        papers = {}
+        for node_id, data in graph.nodes(data=True):
+            if data.get("type") != "Paper":
+                continue
+            year = _as_int(data.get("year"))
+            paper = {"id": node_id, "code": data.get("code"), "year": year, "tripos_part": data.get("tripos_part"), "questions": []}
+            papers[node_id] = paper
+            self.papers_by_year.setdefault(year, []).append(paper)
+
+        for node_id, data in graph.nodes(data=True):
+            if data.get("type") != "Question":
+                continue
+            paper = None
+            mentioned = []
+            for _, target, edge in graph.out_edges(node_id, data=True):
+                edge_type = edge.get("type")
+                if edge_type == "PART_OF":
+                    paper = papers.get(target)
+                elif edge_type == "MENTIONS" and target in self.concepts:
+                    mentioned.append(target)
+            course = data.get("course") or "Unknown"
+            self.questions[node_id] = {
+                "id": node_id,
+                "number": str(data.get("number")),
+                "course": course,
+                "paper": paper["code"] if paper else None,
+                "year": paper["year"] if paper else None,
+                "concepts": [self.concepts[c]["name"] for c in mentioned],
+            }
+            if paper:
+                paper["questions"].append(str(data.get("number")))
+            course_questions[course] += 1
+            counts = self.course_concepts.setdefault(course, Counter())
+            for concept_id in mentioned:
+                self.concepts[concept_id]["frequency"] += 1
+                self.concept_questions[concept_id].append(node_id)
+                counts[concept_id] += 1
+
+        self.by_frequency = sorted(self.concepts.values(), key=lambda c: (-c["frequency"], c["name"]))
+        self.courses = [{"course": course, "questions": count} for course, count in sorted(course_questions.items())]
+        for paper_list in self.papers_by_year.values():
+            paper_list.sort(key=lambda p: p["code"] or "")
+            for paper in paper_list:
+                paper["questions"].sort(key=_question_sort_key)
+
+    def _concept_id(self, name: str) -> str:
+        concept_id = graph_store.generate_node_id("concept", graph_store.normalize_concept_name(name))
+        if concept_id not in self.concepts:
+            raise QueryError(404, f"Concept '{name}' not found")
+        return concept_id
+
+    def concept_list(self, limit: int = 100, offset: int = 0, min_count: int = 0) -> dict:
+        matching = self.by_frequency
+        if min_count > 0:
+            # by_frequency is sorted descending, so the matches are a prefix
+            end = next((i for i, c in enumerate(matching) if c["frequency"] < min_count), len(matching))
+            matching = matching[:end]
+        return {"total": len(matching), "concepts": matching[offset : offset + limit]}
+
+    def concept(self, name: str) -> dict:
+        concept_id = self._concept_id(name)
+        return dict(self.concepts[concept_id], questions=self.questions_for(name)["questions"])
+
+    def questions_for(self, name: str) -> dict:
+        concept_id = self._concept_id(name)
+        questions = [self.questions[q] for q in self.concept_questions[concept_id]]
+        questions.sort(key=lambda q: (q["paper"] or "", _question_sort_key(q["number"])))
+        return {"concept": self.concepts[concept_id]["name"], "questions": questions}
+
+    def papers(self, year: int = None) -> dict:
+        if year is None:
+            papers = [paper for y in sorted(self.papers_by_year, key=lambda y: (y is None, y)) for paper in self.papers_by_year[y]]
+        else:
+            papers = self.papers_by_year.get(year, [])
+        return {"year": year, "papers": papers}
+
+    def top_concepts(self, course: str, k: int = 10) -> dict:
+        counts = self.course_concepts.get(course)
+        if counts is None:
+            raise QueryError(404, f"Course '{course}' not found")
+        top = heapq.nsmallest(k, counts.items(), key=lambda item: (-item[1], self.concepts[item[0]]["name"]))
+        return {
+            "course": course,
+            "concepts": [{"name": self.concepts[c]["name"], "frequency": n} for c, n in top],
+        }
+
+
+def _as_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _question_sort_key(number: str):
+    return (0, int(number), "") if str(number).isdigit() else (1, 0, str(number))
+
+
+def _int_param(params: dict, name: str, default: int, minimum: int = 0) -> int:
+    values = params.get(name)
+    if not values:
+        return default
+    try:
+        value = int(values[0])
+    except ValueError:
+        raise QueryError(400, f"Parameter '{name}' must be an integer")
+    if value < minimum:
+        raise QueryError(400, f"Parameter '{name}' must be at least {minimum}")
+    return value
+
+
+def file_source(path: str = config.GRAPH_DATA_PATH, check_interval: float = 0.5) -> Callable:
+    """
+    Returns a graph source that loads `path` and reloads it when its version changes.
+
+    The version sidecar is checked at most every `check_interval` seconds, so a
+    burst of requests does not turn into a burst of stat calls. Only the first
+    load happens on a request thread; later reloads run in a background thread
+    while requests keep being answered from the previous graph.
+    """
+    state = {"graph": None, "version": None, "checked": 0.0, "mtime": None, "loading": False}
+    lock = threading.Lock()
+
+    def sidecar_mtime():
+        try:
+            return os.stat(f"{path}.version").st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def install(graph, mtime):
+        # The mtime is taken before loading, so a save during the load is picked up by the next check
+        state["graph"], state["version"], state["mtime"] = graph, str(graph.graph.get("version", 0)), mtime
+
+    def reload(mtime):
+        graph = None
+        try:
+            graph = graph_store.load_graph(path)
+        finally:
+            with lock:
+                state["loading"] = False
+                if graph is not None:
+                    install(graph, mtime)
+
+    def source():
+        with lock:
+            now = time.monotonic()
+            if state["graph"] is None:
+                state["checked"] = now
+                mtime = sidecar_mtime()
+                install(graph_store.load_graph(path), mtime)
+            elif now - state["checked"] >= check_interval and not state["loading"]:
+                state["checked"] = now
+                mtime = sidecar_mtime()
+                if mtime != state["mtime"]:
+                    state["loading"] = True
+                    threading.Thread(target=reload, args=(mtime,), daemon=True).start()
+            return state["version"], state["graph"], contextlib.nullcontext()
+
+    return source
+
+
+class QueryService:
+    """
+    Answers query paths from an index of the current graph revision, with a response cache.
+
+    Args:
+        source: Callable returning (revision, graph, lock); the graph is read under `lock`
+            while the index is (re)built. See file_source and daemon.Watcher.query_source.
+        cache_size: Maximum number of encoded responses kept in memory.
+    """
+
+    def __init__(self, source: Callable, cache_size: int = config.QUERY_CACHE_SIZE):
+        self.source = source
+        self.cache_size = cache_size
+        self._index: GraphIndex | None = None
+        self._cache: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def index(self) -> GraphIndex:
+        revision, graph, graph_lock = self.source()
+        index = self._index
+        if index is not None and index.revision == revision:
+            return index
+        with self._lock:
+            if self._index is None or self._index.revision != revision:
+                with metrics.timer("query.index_build"), graph_lock:
+                    self._index = GraphIndex(graph, revision)
+                self._cache.clear()
+                logger.info("Query index built for graph revision %s (%d concepts).", revision, len(self._index.concepts))
+            return self._index
+
+    def _route(self, index: GraphIndex, parts: list[str], params: dict) -> dict:
+        if not parts:
+            return {"endpoints": ENDPOINTS}
+        if parts[0] == "concepts" and len(parts) == 1:
+            return index.concept_list(
+                limit=_int_param(params, "limit", 100, minimum=1),
+                offset=_int_param(params, "offset", 0),
+                min_count=_int_param(params, "min_count", 0),
+            )
+        if parts[0] == "concepts" and len(parts) == 2:
+            return index.concept(parts[1])
+        if parts == ["questions"]:
+            if not params.get("concept"):
+                raise QueryError(400, "Parameter 'concept' is required")
+            return index.questions_for(params["concept"][0])
+        if parts == ["papers"]:
+            return index.papers(_int_param(params, "year", None))
+        if parts == ["courses"]:
+            return {"courses": index.courses}
+        if parts[0] == "courses" and len(parts) == 3 and parts[2] == "top":
+            return index.top_concepts(parts[1], k=_int_param(params, "k", 10, minimum=1))
+        raise QueryError(404, f"Unknown path /{'/'.join(parts)}")
+
+    def handle(self, raw_path: str) -> tuple[int, bytes, str]:
+        """
+        Answers one GET request path (with query string).
+
+        Returns:
+            A tuple (status, JSON body, ETag).
+        """
+        index = self.index()
+        url = urlparse(raw_path)
+        key = (index.revision, url.path.rstrip("/"), url.query)
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)  # Least recently used responses are evicted first
+        if cached is not None:
+            metrics.incr("query.cache_hits")
+            return cached
+        metrics.incr("query.cache_misses")
+
+        parts = [unquote(p) for p in url.path.split("/") if p]
+        params = parse_qs(url.query)
+        try:
+            status, payload = 200, self._route(index, parts, params)
+        except QueryError as e:
+            status, payload = e.status, {"error": str(e)}
+        payload = {"revision": index.revision, **payload}
+        body = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+        response = (status, body, f'"{index.revision}-{zlib.crc32(body):08x}"')
+
+        with self._lock:
+            self._cache[key] = response
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return response
+
+
+class QueryHandler(BaseHTTPRequestHandler):
+    """Serves the server's QueryService; keeps connections alive between requests."""
+
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out as separate writes; with Nagle's algorithm on, each
+    # keep-alive response would wait for the client's delayed ACK (~40 ms)
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        status, body, etag = self.server.query_service.handle(self.path)
+        if status == 200 and etag in (self.headers.get("If-None-Match") or ""):
+            metrics.incr("query.not_modified")
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_body(status, body, etag)
+
+    def send_body(self, status: int, body: bytes, etag: str = None):
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        if etag and status == 200:
+            self.send_header("ETag", etag)
+            self.send_header("Cache-Control", "no-cache")  # Cache, but revalidate with If-None-Match
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug("%s - %s", self.address_string(), format % args)
+
+
+def make_server(
+    service: QueryService,
+    host: str = config.DAEMON_HOST,
+    port: int = config.QUERY_API_PORT,
+    handler: type = QueryHandler,
+) -> ThreadingHTTPServer:
+    """Creates (but does not start) an HTTP server answering queries from `service`."""
+    httpd = ThreadingHTTPServer((host, port), handler)
+    httpd.daemon_threads = True
+    httpd.query_service = service
+    return httpd
+
+
+def serve(path: str = config.GRAPH_DATA_PATH, host: str = config.DAEMON_HOST, port: int = config.QUERY_API_PORT):
+    """Serves queries over the graph at `path` until interrupted, reloading it when it is saved."""
+    service = QueryService(file_source(path))
+    service.index()  # Load the graph up front rather than on the first request
+    httpd = make_server(service, host, port)
+    logger.info("Serving queries over %s on http://%s:%d/", path, *httpd.server_address[:2])
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        logger.info("Stopping query service.")
+    finally:
+        httpd.server_close()
+
+
+# Example usage (for direct testing):
+# if __name__ == '__main__':
+#     serve("data/concept_graph.graphml", port=8766)
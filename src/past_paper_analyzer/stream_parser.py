@@ -0,0 +1,166 @@
+import json
+import logging
+
+# Incremental parsing of the LLM's concept list while it is still being generated.
+#
+# The model is asked for a JSON array of concept objects. Rather than waiting for
+# the whole completion and calling json.loads on it (which loses everything if a
+# single trailing character is wrong), ConceptStreamParser scans the text as it
+# streams in, cuts out each top-level element of the first array of objects as
+# soon as its closing brace arrives, and parses and validates that element on its
+# own. A malformed element is skipped; a response cut off mid-way keeps every
+# element completed before the cut. Text around the array (prose, ```json fences,
+# an {"concepts": [...]} wrapper) is ignored: a bracket only starts the array if
+# the first thing after it is "{" or "]", and brackets inside the wrapper's
+# strings do not count.
+
+logger = logging.getLogger(__name__)
+
+MAX_NAME_LENGTH = 200
+MAX_TEXT_LENGTH = 2000
+
+_BEFORE_ARRAY, _ARRAY_START, _IN_ARRAY, _DONE = range(4)
+
+
+def validate_concept(item) -> dict | None:
+    """
+    Checks one parsed element of the model's answer.
+
+    Returns:
+        A dict with 'concept_name', 'definition' and 'question_context' (stripped
+        strings; the last two may be None), or None if the element is unusable.
+    """
+    if not isinstance(item, dict):
+        return None
+    name = item.get("concept_name")
+    if not isinstance(name, str) or not name.strip() or len(name) > MAX_NAME_LENGTH:
+        return None
+    concept = {"concept_name": name.strip()}
+    for key in ("definition", "question_context"):
+        value = item.get(key)
+        concept[key] = value.strip()[:MAX_TEXT_LENGTH] if isinstance(value, str) and value.strip() else None
+    return concept
+
+
+class ConceptStreamParser:
+    """
+    Turns a stream of text chunks into validated concept dicts.
+
+    Call feed() with each chunk as it arrives; it returns the concepts completed
+    by that chunk. Call close() at the end of the stream; afterwards `truncated`
+    tells whether the array was never closed (output cut off).
+    """
+
+    def __init__(self):
+        self.accepted = 0
+        self.rejected = 0
+        self.truncated = False
+        self._state = _BEFORE_ARRAY
+        self._element: list[str] = []
+        self._depth = 0  # Nesting depth inside the current element; 0 between elements
+        self._wrapper_depth = 0  # Objects opened before the array (e.g., {"concepts": [...]})
+        self._in_string = False
+        self._escape = False
+
+    def feed(self, text: str) -> list[dict]:
+        completed = []
+        for ch in text:
+            if self._state == _DONE:
+                break
+            if self._depth:
+                self._element.append(ch)
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                continue
+            if self._state == _ARRAY_START:
+                if ch.isspace():
+                    continue
+                if ch not in "{]":
+                    # Not an array of objects (e.g., "[as JSON]" in prose); keep looking
+                    self._state = _BEFORE_ARRAY
+                else:
+                    self._state = _IN_ARRAY
+            if self._state == _BEFORE_ARRAY:
+                self._scan_before_array(ch)
+                continue
+            if self._depth == 0:
+                # Between elements: a container starts one, a string element is skipped
+                if ch in "{[":
+                    self._depth = 1
+                    self._element = [ch]
+                elif ch == '"':
+                    self._in_string = True
+                elif ch == "]":
+                    self._state = _DONE
+                continue
+
+            if ch == '"':
+                self._in_string = True
+            elif ch in "{[":
+                self._depth += 1
+            elif ch in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    concept = self._parse_element("".join(self._element))
+                    self._element = []
+                    if concept is not None:
+                        completed.append(concept)
+        return completed
+
+    def _scan_before_array(self, ch: str):
+        if ch == "[":
+            self._state = _ARRAY_START
+        elif ch == "{":
+            self._wrapper_depth += 1
+        elif ch == "}":
+            self._wrapper_depth = max(self._wrapper_depth - 1, 0)
+        elif ch == '"' and self._wrapper_depth:
+            # Inside a JSON wrapper a string may hold brackets; quotes in prose are not tracked
+            self._in_string = True
+
+    def _parse_element(self, text: str) -> dict | None:
+        try:
+            concept = validate_concept(json.loads(text))
+        except json.JSONDecodeError:
+            concept = None
+        if concept is None:
+            self.rejected += 1
+            logger.warning("Skipping malformed concept in LLM output: %.120s", text)
+            return None
+        self.accepted += 1
+        return concept
+
+    def close(self):
+        """Marks the end of the stream; an unfinished element is dropped."""
+        self.truncated = self._state != _DONE
+        if self._depth:
+            logger.debug("Dropping incomplete element at end of stream: %.120s", "".join(self._element))
+        self._element = []
+        self._depth = 0
+
+
+def parse_concepts(text: str) -> tuple[list[dict], bool]:
+    """
+    Parses a complete (or truncated) response in one go.
+
+    Returns:
+        A tuple (validated concepts, truncated).
+    """
+    parser = ConceptStreamParser()
+    concepts = parser.feed(text)
+    parser.close()
+    return concepts, parser.truncated
+
+
+# Example usage (for direct testing):
+# if __name__ == '__main__':
+#     parser = ConceptStreamParser()
+#     for chunk in ['```json\n[{"concept_name": "Recursion", "defin', 'ition": "A function calling itself."},', ' {"concept_name": "Memo']:
+#         print(parser.feed(chunk))
+#     parser.close()
+#     print(parser.truncated)  # True: the second object was cut off
@@ -0,0 +1,21 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# The package lives in src/ (shell.nix puts it on PYTHONPATH); make the tests runnable without that
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+# config checks its settings on import and creates data/ and downloads/ in the
+# working directory; import it from a scratch directory so the checkout stays clean
+os.environ.setdefault("CL_AUTH_COOKIE", "test")
+os.environ.setdefault("OPENAI_API_KEY", "test")
+os.chdir(tempfile.mkdtemp(prefix="ppa-tests-"))
+
+
+@pytest.fixture(autouse=True)
+def _work_dir(tmp_path, monkeypatch):
+    """Runs every test in its own empty working directory."""
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
@@ -0,0 +1,48 @@
+import os
+
+from past_paper_analyzer import catalogue, cli
+
+META = {"year": 2022, "paper_code": "p06", "question_num": "q01"}
+
+
+def _write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+def _state(conn):
+    return conn.execute("SELECT state FROM files").fetchone()["state"]
+
+
+def test_redownloading_identical_bytes_keeps_the_state():
+    conn = catalogue.connect(":memory:")
+    path = "downloads/2022-p06-q01-solutions.pdf"
+    _write(path, b"%PDF-1.4 v1")
+    catalogue.record_download(conn, META, path)
+    catalogue.mark(conn, [(META, path)], catalogue.STATE_PROCESSED, graph_path="g.graphml")
+
+    catalogue.record_download(conn, META, path)
+    assert _state(conn) == catalogue.STATE_PROCESSED
+
+    _write(path, b"%PDF-1.4 v2, a corrected solution")
+    catalogue.record_download(conn, META, path)
+    assert _state(conn) == catalogue.STATE_DOWNLOADED
+
+
+def test_scan_tracks_new_changed_and_missing_files():
+    conn = catalogue.connect(":memory:")
+    first, second = "downloads/2022-p06-q01-solutions.pdf", "downloads/2022-p06-q02-solutions.pdf"
+    _write(first, b"%PDF-1.4 one")
+    _write(second, b"%PDF-1.4 two")
+    _write("downloads/notes.pdf", b"%PDF-1.4")
+    counts = catalogue.scan(conn, "downloads", cli.parse_filename)
+    assert (counts["added"], counts["unparsed"]) == (2, 1)
+    assert len(catalogue.files_in_state(conn)) == 2
+
+    catalogue.mark(conn, [(META, first)], catalogue.STATE_PROCESSED)
+    os.remove(second)
+    counts = catalogue.scan(conn, "downloads", cli.parse_filename)
+    assert (counts["unchanged"], counts["missing"]) == (1, 1)
+    assert catalogue.summary(conn)[catalogue.STATE_MISSING] == 1
+    assert [row["path"] for row in catalogue.files_in_state(conn, catalogue.STATE_PROCESSED)] == [first]
@@ -0,0 +1,228 @@
+import sys
+
+import pytest
+
+from past_paper_analyzer import cli
+
+
+def _run(monkeypatch, *argv):
+    monkeypatch.setattr(sys, "argv", ["main.py", *argv])
+    cli.main()
+
+
+@pytest.mark.parametrize(
+    ("argv", "message"),
+    [
+        (["--year", "2022"], "--year/--paper/--question"),
+        (["--stream"], "--stream processes a single PDF"),
+        (["--new", "2022-p06-q01-solutions.pdf"], "do not give a PDF path"),
+    ],
+)
+def test_process_rejects_options_that_do_not_fit_the_mode(monkeypatch, capsys, argv, message):
+    with pytest.raises(SystemExit) as exit_info:
+        _run(monkeypatch, "process", *argv)
+    assert exit_info.value.code == 1
+    assert message in capsys.readouterr().err
+
+
+def test_merge_keeps_commits_made_while_shards_load(monkeypatch):
+    from past_paper_analyzer import graph_store
+
+    shard = graph_store.load_graph("shard.graphml")
+    graph_store.ingest_extraction(shard, {"year": 2021, "paper_code": 1, "question_num": 1}, [{"concept_name": "Sorting"}])
+    graph_store.save_graph(shard, "shard.graphml")
+    graph_store.commit_changes(lambda g: g.add_node("existing", type="Note"), "out.graphml")
+
+    load_graph = graph_store.load_graph
+
+    def load_with_concurrent_commit(path, *args, **kwargs):
+        graph = load_graph(path, *args, **kwargs)
+        if path == "shard.graphml":
+            # Another writer saves to the output between the merge's reads and its write
+            graph_store.commit_changes(lambda g: g.add_node("concurrent", type="Note"), "out.graphml")
+        return graph
+
+    monkeypatch.setattr(graph_store, "load_graph", load_with_concurrent_commit)
+    _run(monkeypatch, "merge", "shard.graphml", "-o", "out.graphml")
+
+    merged = load_graph("out.graphml")
+    assert {"existing", "concurrent"} <= set(merged.nodes)
+    assert any(data.get("type") == "Concept" for _, data in merged.nodes(data=True))
+    assert merged.graph["version"] == 3
+
+
+def test_merge_replaces_the_links_of_re_extracted_shard_questions(monkeypatch, capsys):
+    from past_paper_analyzer import config, extraction_store, graph_store, llm_extractor
+
+    store = extraction_store.connect()
+    question = {"year": 2021, "paper_code": "p01", "question_num": "q01"}
+    for concepts in (["Sorting", "Heaps"], ["Sorting"]):
+        extraction_store.record(
+            store,
+            question,
+            [{"concept_name": name} for name in concepts],
+            llm_extractor.model_name(),
+            llm_extractor.PROMPT_VERSION,
+            graph_path=graph_store.shard_path("a"),
+        )
+        _run(monkeypatch, "rebuild", "--shard", "a")
+        _run(monkeypatch, "merge")
+
+    merged = graph_store.load_graph(config.GRAPH_DATA_PATH)
+    question_id = graph_store.question_node_id(question)
+    assert [target for _, target in merged.out_edges(question_id) if target.startswith("concept_")] == [
+        graph_store.generate_node_id("concept", "sorting")
+    ]
+    assert graph_store.generate_node_id("concept", "heaps") not in merged
+    capsys.readouterr()
+    _run(monkeypatch, "rebuild")  # The merged result is recorded as applied to the main graph
+    assert "0 to apply" in capsys.readouterr().out
+
+
+def test_full_rebuild_refuses_to_drop_questions_without_stored_results(monkeypatch, capsys):
+    from past_paper_analyzer import config, extraction_store, graph_store, llm_extractor
+
+    stored_question = {"year": 2021, "paper_code": 1, "question_num": 1}
+    manual_question = {"year": 2021, "paper_code": 1, "question_num": 2}
+    store = extraction_store.connect()
+    extraction_store.record(
+        store,
+        stored_question,
+        [{"concept_name": "Sorting"}],
+        llm_extractor.model_name(),
+        llm_extractor.PROMPT_VERSION,
+        graph_path=config.GRAPH_DATA_PATH,
+    )
+    graph_store.commit_changes(
+        lambda g: graph_store.ingest_extraction(g, manual_question, [{"concept_name": "Graphs"}]),
+        config.GRAPH_DATA_PATH,
+    )
+
+    with pytest.raises(SystemExit) as exit_info:
+        _run(monkeypatch, "rebuild", "--full")
+    assert exit_info.value.code == 1
+    assert "a full rebuild would delete them" in capsys.readouterr().err
+    graph = graph_store.load_graph(config.GRAPH_DATA_PATH)
+    assert graph_store.question_node_id(manual_question) in graph
+    assert graph.graph["version"] == 1
+
+    _run(monkeypatch, "rebuild")  # The incremental rebuild only touches questions with stored results
+    graph = graph_store.load_graph(config.GRAPH_DATA_PATH)
+    assert {graph_store.question_node_id(q) for q in (stored_question, manual_question)} <= set(graph.nodes)
+
+
+def test_rebuild_only_applies_results_extracted_for_the_shard(monkeypatch):
+    from past_paper_analyzer import extraction_store, graph_store, llm_extractor
+
+    store = extraction_store.connect()
+    shards = {"a": {"year": 2020, "paper_code": "p01", "question_num": "q01"}}
+    shards["b"] = {"year": 2021, "paper_code": "p01", "question_num": "q01"}
+    for shard, question in shards.items():
+        extraction_store.record(
+            store,
+            question,
+            [{"concept_name": f"Concept {shard}"}],
+            llm_extractor.model_name(),
+            llm_extractor.PROMPT_VERSION,
+            graph_path=graph_store.shard_path(shard),
+        )
+
+    for args in ([], ["--full"]):
+        _run(monkeypatch, "rebuild", "--shard", "a", *args)
+        graph = graph_store.load_graph(graph_store.shard_path("a"))
+        assert graph_store.question_node_id(shards["a"]) in graph
+        assert graph_store.question_node_id(shards["b"]) not in graph
+    _run(monkeypatch, "rebuild")  # Unmerged shard results stay out of the main graph too
+    assert graph_store.load_graph().number_of_nodes() == 0
+
+
+def test_download_stage_stops_without_failing_jobs_when_the_breaker_opens(monkeypatch):
+    import requests
+
+    from past_paper_analyzer import config, downloader, job_queue
+
+    calls = []
+
+    def get(self, url, **kwargs):
+        calls.append(url)
+        raise requests.exceptions.ConnectionError("site down")
+
+    monkeypatch.setattr(config, "DOWNLOAD_MAX_RETRIES", 0)
+    monkeypatch.setattr(requests.Session, "get", get)
+    downloader.reset_circuit_breakers()
+    conn = job_queue.connect(":memory:")
+    job_queue.enqueue(
+        conn, [{"year": 2022, "paper_code": "p06", "question_num": f"q{i:02d}", "course_hint": None} for i in range(40)]
+    )
+    try:
+        downloaded, failed = cli._download_pending(conn)
+    finally:
+        downloader.reset_circuit_breakers()
+
+    assert downloaded == 0
+    assert len(calls) == failed == config.BREAKER_MIN_REQUESTS
+    pending = job_queue.jobs_in_state(conn, job_queue.STATE_PENDING)
+    assert len(pending) == 40
+    # Only the failures seen before the outage was recognised count against their jobs
+    assert sum(job["attempts"] for job in pending) == config.BREAKER_MIN_REQUESTS - 1
+
+
+def test_history_restore_resyncs_applied_results_and_catalogue(monkeypatch, capsys):
+    from past_paper_analyzer import catalogue, config, extraction_store, llm_extractor
+
+    store = extraction_store.connect()
+    files = catalogue.connect()
+    questions = []
+    for num in ("q01", "q02"):
+        metadata = {"year": 2022, "paper_code": "p06", "question_num": num}
+        path = f"2022-p06-{num}-solutions.pdf"
+        with open(path, "wb") as f:
+            f.write(num.encode())
+        extraction_store.record(
+            store,
+            metadata,
+            [{"concept_name": f"Concept {num}"}],
+            llm_extractor.model_name(),
+            llm_extractor.PROMPT_VERSION,
+            graph_path=config.GRAPH_DATA_PATH,
+        )
+        _run(monkeypatch, "rebuild")  # Version 1 holds q01, version 2 both questions
+        catalogue.mark(files, [(metadata, path)], catalogue.STATE_PROCESSED, graph_path=config.GRAPH_DATA_PATH)
+        questions.append(metadata)
+
+    _run(monkeypatch, "history", "checkout", "1", "--restore")
+    assert "1 stored extraction result(s) still match" in capsys.readouterr().out
+    applied = extraction_store.applied_hashes(store, config.GRAPH_DATA_PATH)
+    assert list(applied) == [(2022, "p06", "q01")]
+    states = {row["question_num"]: row["state"] for row in files.execute("SELECT question_num, state FROM files")}
+    assert states == {"q01": catalogue.STATE_PROCESSED, "q02": catalogue.STATE_DOWNLOADED}
+
+    _run(monkeypatch, "rebuild")
+    assert "1 to apply" in capsys.readouterr().out
+
+
+def test_process_new_retries_failed_pdfs_only_when_asked(monkeypatch, capsys):
+    from past_paper_analyzer import catalogue, config
+
+    monkeypatch.setattr(config, "LLM_BACKEND", "fake")
+    files = catalogue.connect()
+    metadata = {"year": 2022, "paper_code": "p06", "question_num": "q01"}
+    path = "2022-p06-q01-solutions.pdf"
+    with open(path, "wb") as f:
+        f.write(b"%PDF-1.4")
+    catalogue.mark(files, [(metadata, path)], catalogue.STATE_FAILED)
+
+    _run(monkeypatch, "process", "--new", "--workers", "1")
+    assert "Skipped 1 PDF(s) that failed" in capsys.readouterr().out
+    assert catalogue.summary(files)[catalogue.STATE_FAILED] == 1
+
+    _run(monkeypatch, "process", "--new", "--retry-failed", "--workers", "1")
+    assert "1 new PDF(s) merged, 0 failed" in capsys.readouterr().out
+    assert catalogue.summary(files)[catalogue.STATE_PROCESSED] == 1
+
+
+def test_retry_failed_requires_new(monkeypatch, capsys):
+    with pytest.raises(SystemExit) as exit_info:
+        _run(monkeypatch, "process", "--retry-failed")
+    assert exit_info.value.code == 1
+    assert "--retry-failed only applies to --new" in capsys.readouterr().err
@@ -0,0 +1,63 @@
+from past_paper_analyzer import graph_store
+
+
+def _ingest(graph, question_num, names):
+    graph_store.ingest_extraction(
+        graph, {"year": 2021, "paper_code": 1, "question_num": question_num}, [{"concept_name": n} for n in names]
+    )
+
+
+def _concept(name):
+    return graph_store.generate_node_id("concept", graph_store.normalize_concept_name(name))
+
+
+def _co_occurs(graph):
+    return {(u, v): d["weight"] for u, v, d in graph.edges(data=True) if d.get("type") == graph_store.CO_OCCURS}
+
+
+def test_each_pair_is_stored_once_and_matches_a_rebuild():
+    graph = graph_store.load_graph("g.graphml")
+    _ingest(graph, 1, ["Sorting", "Heaps", "Graphs"])
+    _ingest(graph, 2, ["Heaps", "Sorting"])
+    incremental = _co_occurs(graph)
+    assert len(incremental) == 3
+    assert all(u < v for u, v in incremental)
+    assert incremental[tuple(sorted((_concept("Sorting"), _concept("Heaps"))))] == 2
+
+    graph_store.rebuild_co_occurrence(graph)
+    assert _co_occurs(graph) == incremental
+
+    graph_store.unlink_question_concepts(graph, graph_store.question_node_id({"year": 2021, "paper_code": 1, "question_num": 1}))
+    assert list(_co_occurs(graph).values()) == [1]
+
+
+def test_top_co_occurring_sees_both_ends_of_a_pair():
+    graph = graph_store.load_graph("g.graphml")
+    _ingest(graph, 1, ["Sorting", "Heaps", "Graphs"])
+    _ingest(graph, 2, ["Heaps", "Sorting"])
+    # Ties go by concept ID: Arrays is added last, so node order would rank it last
+    _ingest(graph, 3, ["Heaps", "Trees", "Arrays"])
+    expected = [(_concept("Sorting"), 2), (_concept("Arrays"), 1), (_concept("Graphs"), 1), (_concept("Trees"), 1)]
+    assert graph_store.top_co_occurring(graph, _concept("Heaps")) == expected
+    assert graph_store.top_co_occurring(graph, _concept("Heaps"), k=2) == expected[:2]
+
+    graph_store.commit_changes(lambda g: None, "g.graphml", graph=graph)
+    compact = graph_store.load_compact_graph("g.graphml")
+    for k in (10, 2):
+        top = compact.top_co_occurring(compact.index_of(_concept("Heaps")), k=k)
+        assert [(compact.node_id(i), weight) for i, weight in top] == expected[:k]
+
+
+def test_projection_is_built_once_for_single_concept_questions():
+    graph = graph_store.load_graph("g.graphml")
+    assert graph_store.has_co_occurrence(graph)
+    _ingest(graph, 1, ["Sorting"])
+    graph_store.commit_changes(lambda g: None, "g.graphml", graph=graph)
+    assert graph_store.has_co_occurrence(graph_store.load_graph("g.graphml"))
+
+    older = graph_store.load_graph("g.graphml")
+    del older.graph[graph_store.CO_OCCURRENCE_BUILT]  # As saved before the attribute existed
+    assert not graph_store.has_co_occurrence(older)
+    graph_store.rebuild_co_occurrence(older)
+    graph_store.commit_changes(lambda g: None, "g.graphml", graph=older)
+    assert graph_store.has_co_occurrence(graph_store.load_graph("g.graphml"))
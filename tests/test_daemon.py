@@ -0,0 +1,60 @@
+import threading
+import time
+
+from past_paper_analyzer import cli, daemon, extraction_store, graph_store
+
+
+def _ingest(watcher, question_num):
+    """Applies one extraction result to the resident graph the way Watcher.ingest does."""
+    metadata = {"year": 2022, "paper_code": "p06", "question_num": question_num, "tripos_part": "Unknown"}
+    concepts = [{"concept_name": f"Concept {question_num}"}]
+    path = f"{question_num}.pdf"
+    with open(path, "wb") as f:
+        f.write(b"%PDF-1.4")
+    digest = extraction_store.record(watcher.store, metadata, concepts, "model", "v1")
+    with watcher.lock:
+        graph_store.ingest_extraction(watcher.graph, metadata, concepts)
+        watcher._unsaved.append((metadata, concepts, None, digest, path))
+        watcher.revision += 1
+    return graph_store.question_node_id(metadata)
+
+
+def test_queries_are_answered_while_a_flush_is_saving(monkeypatch):
+    watcher = daemon.Watcher(cli.parse_filename, graph_path="g.graphml")
+    first = _ingest(watcher, "q01")
+
+    answered = []
+    write_graph_file = graph_store._write_graph_file
+
+    def write_with_concurrent_query(*args, **kwargs):
+        # The HTTP thread queries while the flush is saving
+        querier = threading.Thread(target=watcher.query_source)
+        querier.start()
+        querier.join(2)
+        answered.append(not querier.is_alive())
+        write_graph_file(*args, **kwargs)
+
+    monkeypatch.setattr(graph_store, "_write_graph_file", write_with_concurrent_query)
+    assert watcher.flush()
+    assert all(answered), "query_source blocked on the flush"
+
+    assert first in graph_store.load_graph("g.graphml")
+    assert first in watcher.graph
+    assert not watcher._unsaved
+    assert watcher.graph.graph["version"] == 1
+
+    second = _ingest(watcher, "q02")
+    assert watcher.flush()
+    assert {first, second} <= set(graph_store.load_graph("g.graphml").nodes)
+
+
+def test_run_once_waits_a_poll_interval_between_scans(monkeypatch):
+    monkeypatch.setattr(daemon.signal, "signal", lambda *args: None)
+    watcher = daemon.Watcher(cli.parse_filename, graph_path="g.graphml")
+    scans = []
+    poll = watcher.poll
+    monkeypatch.setattr(watcher, "poll", lambda: scans.append(time.monotonic()) or poll())
+
+    daemon.run(watcher, poll_interval=0.2, port=None, once=True)
+    assert len(scans) == 2
+    assert scans[1] - scans[0] >= 0.2
@@ -0,0 +1,105 @@
+import os
+
+import pytest
+import requests
+
+from past_paper_analyzer import benchmark, catalogue, config, downloader, metrics
+
+PDF = benchmark.make_synthetic_pdf(["Solution"])
+
+
+@pytest.fixture
+def site(tmp_path, monkeypatch):
+    """Serves PDFs written to corpus/<year>/ from the benchmark's stand-in; yields a function that starts it."""
+    corpus = tmp_path / "corpus"
+    (corpus / "2022").mkdir(parents=True)
+    os.makedirs("downloads")
+    monkeypatch.setattr(config, "CL_AUTH_COOKIE", "test")
+    monkeypatch.setattr(config, "DOWNLOAD_BACKOFF_BASE", 0.01)
+    downloader.reset_auth_failure()
+    downloader.reset_circuit_breakers()
+    metrics.reset()
+
+    def start(files, **options):
+        for name, content in files.items():
+            (corpus / "2022" / name).write_bytes(content)
+        server = benchmark.StandInServer(str(corpus), **options).__enter__()
+        started.append(server)
+        monkeypatch.setattr(config, "CL_SOLUTIONS_BASE_URL", server.base_url)
+        return server
+
+    started = []
+    yield start
+    for server in started:
+        server.__exit__(None, None, None)
+    downloader.reset_auth_failure()
+
+
+def _name(question):
+    return f"2022-p06-{question}-solutions.pdf"
+
+
+def test_check_pdf_accepts_only_a_pdf_header():
+    downloader._check_pdf("application/octet-stream", b"%PDF-1.4\n...")
+    with pytest.raises(downloader._NotAPdf) as not_pdf:
+        downloader._check_pdf("application/pdf", b"\x00" * 64)
+    assert not not_pdf.value.login_page
+    for content_type, head in (("text/html; charset=utf-8", b"%PDF-"), ("application/pdf", b"<!DOCTYPE html><html>")):
+        with pytest.raises(downloader._NotAPdf) as not_pdf:
+            downloader._check_pdf(content_type, head)
+        assert not_pdf.value.login_page
+
+
+def test_rejects_a_corrupt_body_without_flagging_the_cookie(site):
+    site({_name("q01"): PDF}, corrupt={_name("q01")})
+    assert downloader.download_pdf(2022, "p06", "q01") is None
+    assert not os.path.exists(os.path.join("downloads", _name("q01")))
+    assert metrics.snapshot()["counters"]["download.invalid"] == 1
+    assert not downloader.auth_failed()
+
+
+def test_forbidden_flags_auth_failure_closes_the_response_and_skips_later_downloads(site, monkeypatch):
+    site({_name("q01"): PDF, _name("q02"): PDF}, forbidden={_name("q01")})
+    responses = []
+    get = requests.Session.get
+
+    def recording_get(self, *args, **kwargs):
+        responses.append(get(self, *args, **kwargs))
+        return responses[-1]
+
+    monkeypatch.setattr(requests.Session, "get", recording_get)
+    assert downloader.download_pdf(2022, "p06", "q01") is None
+    assert downloader.auth_failed()
+    assert responses[0].status_code == 403 and responses[0].raw.closed
+
+    assert downloader.download_pdf(2022, "p06", "q02") is None
+    assert len(responses) == 1
+    assert metrics.snapshot()["counters"]["download.skipped_auth"] == 1
+
+
+def test_identical_files_are_hard_linked_to_one_stored_copy(site):
+    site({_name("q01"): PDF, _name("q02"): PDF})
+    first = downloader.download_pdf(2022, "p06", "q01")
+    second = downloader.download_pdf(2022, "p06", "q02")
+
+    with open(first, "rb") as f:
+        assert f.read() == PDF
+    assert os.path.samefile(first, second)
+    assert os.stat(first).st_nlink == 3  # The store copy plus both downloads
+    assert metrics.snapshot()["counters"]["download.deduplicated"] == 1
+
+
+def test_a_changed_download_frees_the_stored_copy_nothing_else_links_to(site):
+    changed = benchmark.make_synthetic_pdf(["Corrected solution"])
+    site({_name("q01"): PDF, _name("q02"): PDF})
+    first = downloader.download_pdf(2022, "p06", "q01")
+    downloader.download_pdf(2022, "p06", "q02")
+    old_blob = downloader._store_path(catalogue.file_sha256(first))
+
+    site({_name("q01"): changed})
+    downloader.download_pdf(2022, "p06", "q01")
+    assert os.path.exists(old_blob)  # q02 still links to it
+    site({_name("q02"): changed})
+    downloader.download_pdf(2022, "p06", "q02")
+    assert not os.path.exists(old_blob)
+    assert os.stat(first).st_nlink == 3
@@ -0,0 +1,77 @@
+import itertools
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from past_paper_analyzer import embeddings  # noqa: E402
+
+
+def _index(count=50, dim=8, seed=0):
+    rng = np.random.default_rng(seed)
+    matrix = rng.normal(size=(count, dim)).astype(np.float32)
+    matrix[1] = matrix[0] + 0.01  # Guarantee a few close pairs
+    matrix[7] = matrix[3] * 2
+    matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+    return embeddings.EmbeddingIndex([f"c{i:02d}" for i in range(count)], matrix)
+
+
+def test_near_duplicates_matches_brute_force_with_small_blocks():
+    index = _index()
+    expected = {
+        (index.ids[i], index.ids[j])
+        for i, j in itertools.combinations(range(len(index.ids)), 2)
+        if float(index.matrix[i] @ index.matrix[j]) >= 0.5
+    }
+    for block_bytes in (1, 4 * 50 * 3, 32 << 20):
+        pairs = index.near_duplicates(threshold=0.5, block_bytes=block_bytes)
+        assert {(a, b) for a, b, _ in pairs} == expected
+        assert [score for _, _, score in pairs] == sorted((score for _, _, score in pairs), reverse=True)
+    assert ("c00", "c01") in expected and ("c03", "c07") in expected
+
+
+def test_embedder_for_uses_the_indexed_model(monkeypatch):
+    class ModelEmbedder:
+        name = "model-backend"
+
+        def __init__(self, model_name="default-model"):
+            self.model_name = model_name
+
+    monkeypatch.setitem(embeddings.EMBEDDERS, ModelEmbedder.name, ModelEmbedder)
+    index = embeddings.EmbeddingIndex([], np.zeros((0, 4), dtype=np.float32), {"backend": "model-backend", "model": "m2"})
+    assert embeddings.embedder_for(index).model_name == "m2"
+
+
+def test_build_index_reuses_vectors_only_for_the_same_model():
+    import networkx as nx
+
+    class CountingEmbedder(embeddings.HashingEmbedder):
+        name = "counting"
+
+        def __init__(self, model_name):
+            super().__init__(dim=16)
+            self.model_name = model_name
+            self.embedded = []
+
+        def embed(self, texts):
+            self.embedded.extend(texts)
+            return super().embed(texts)
+
+    graph = nx.DiGraph()
+    for name in ("Heaps", "Tries", "Graphs"):
+        graph.add_node(f"concept_{name.lower()}", type="Concept", name=name, definition=f"About {name}.")
+
+    first = CountingEmbedder("m1")
+    embeddings.build_index(graph, first, "index")
+    assert len(first.embedded) == 3
+
+    graph.nodes["concept_tries"]["definition"] = "Prefix trees."
+    same_model = CountingEmbedder("m1")
+    index = embeddings.build_index(graph, same_model, "index")
+    assert same_model.embedded == [embeddings.concept_text(graph.nodes["concept_tries"])]
+    expected = first.embed([embeddings.concept_text(graph.nodes[node_id]) for node_id in index.ids])
+    assert np.allclose(index.matrix, expected)
+
+    other_model = CountingEmbedder("m2")
+    embeddings.build_index(graph, other_model, "index")
+    assert len(other_model.embedded) == 3
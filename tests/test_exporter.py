@@ -0,0 +1,83 @@
+import csv
+import os
+
+import pytest
+
+from past_paper_analyzer import exporter, graph_store
+from past_paper_analyzer.compact_graph import CompactGraph
+
+
+def _graph():
+    graph = graph_store.load_graph("g.graphml")
+    for num, names in (("q01", ["Sorting", "Heaps"]), ("q02", ["Heaps", "Tries"])):
+        graph_store.ingest_extraction(
+            graph,
+            {"year": 2022, "paper_code": "p06", "question_num": num, "tripos_part": "IA"},
+            [{"concept_name": name, "definition": f"About {name}."} for name in names],
+            course_module="Algorithms",
+        )
+    return graph
+
+
+def _edges(graph, edge_type, weighted=False):
+    return sorted(
+        (u, v, data["weight"]) if weighted else (u, v)
+        for u, v, data in graph.edges(data=True)
+        if data.get("type") == edge_type
+    )
+
+
+def _read_csv(output_dir, table, manifest):
+    rows = []
+    for name in manifest["tables"][table]["files"]:
+        with open(os.path.join(output_dir, name), newline="", encoding="utf-8") as f:
+            rows.extend(csv.DictReader(f))
+    return rows
+
+
+def _frequencies(graph):
+    return {
+        node_id: sum(1 for _, _, data in graph.in_edges(node_id, data=True) if data.get("type") == "MENTIONS")
+        for node_id, data in graph.nodes(data=True)
+        if data.get("type") == "Concept"
+    }
+
+
+def test_csv_export_rows_resolve_to_node_ids():
+    graph = _graph()
+    manifest = exporter.export_graph(CompactGraph.from_networkx(graph), "out", "csv")
+
+    tables = {table: _read_csv("out", table, manifest) for table in manifest["tables"]}
+    assert {table: info["rows"] for table, info in manifest["tables"].items()} == {
+        "papers": 1, "questions": 2, "concepts": 3, "part_of": 2, "mentions": 4, "co_occurs": 2,
+    }
+    ids = {table: {row["row"]: row["id"] for row in tables[table]} for table in exporter.NODE_TABLES}
+    assert {row["id"]: int(row["frequency"]) for row in tables["concepts"]} == _frequencies(graph)
+    assert sorted((ids["questions"][r["question"]], ids["papers"][r["paper"]]) for r in tables["part_of"]) == _edges(
+        graph, "PART_OF"
+    )
+    assert sorted((ids["questions"][r["question"]], ids["concepts"][r["concept"]]) for r in tables["mentions"]) == (
+        _edges(graph, "MENTIONS")
+    )
+    co_occurs = sorted(
+        (ids["concepts"][r["concept"]], ids["concepts"][r["other"]], int(r["weight"])) for r in tables["co_occurs"]
+    )
+    assert co_occurs == _edges(graph, graph_store.CO_OCCURS, weighted=True)
+
+
+def test_parquet_export_rows_resolve_to_node_ids():
+    pytest.importorskip("pyarrow")
+    import pyarrow.parquet as pq
+
+    graph = _graph()
+    manifest = exporter.export_graph(CompactGraph.from_networkx(graph), "out", "parquet")
+
+    tables = {table: pq.read_table(os.path.join("out", f"{table}.parquet")).to_pylist() for table in manifest["tables"]}
+    assert {table: len(rows) for table, rows in tables.items()} == {
+        table: info["rows"] for table, info in manifest["tables"].items()
+    }
+    assert {row["id"]: row["frequency"] for row in tables["concepts"]} == _frequencies(graph)
+    assert sorted((row["question"], row["concept"]) for row in tables["mentions"]) == _edges(graph, "MENTIONS")
+    assert sorted((row["concept"], row["other"], row["weight"]) for row in tables["co_occurs"]) == _edges(
+        graph, graph_store.CO_OCCURS, weighted=True
+    )
@@ -0,0 +1,37 @@
+import glob
+import os
+import sqlite3
+
+from past_paper_analyzer import graph_history, graph_store
+
+
+def _add(node_id, **attrs):
+    return lambda graph: graph.add_node(node_id, type="Note", **attrs)
+
+
+def test_versions_can_be_rebuilt_and_compared():
+    graph_store.commit_changes(_add("a", label="one"), "g.graphml")
+    graph_store.commit_changes(_add("b"), "g.graphml")
+    graph_store.commit_changes(lambda g: (g.remove_node("b"), g.add_node("a", label="two")), "g.graphml")
+
+    conn = graph_history.connect("g.graphml")
+    assert [row["version"] for row in graph_history.list_versions(conn)] == [3, 2, 1]
+    assert set(graph_history.load_version(conn, 2).nodes) == {"a", "b"}
+    changes = graph_history.diff(conn, 1, 3)
+    assert changes["nodes"]["changed"]["a"] == ({"type": "Note", "label": "one"}, {"type": "Note", "label": "two"})
+    assert not changes["nodes"]["added"] and not changes["nodes"]["removed"]
+    assert set(graph_history.diff(conn, 3, 2)["nodes"]["added"]) == {"b"}
+
+
+def test_older_version_number_archives_the_history_instead_of_dropping_it():
+    graph_store.commit_changes(_add("a"), "g.graphml")
+    graph_store.commit_changes(_add("b"), "g.graphml")
+    os.remove("g.graphml.version")  # The graph now saves as version 1 again
+    graph_store.commit_changes(_add("c"), "g.graphml")
+
+    conn = graph_history.connect("g.graphml")
+    assert [row["version"] for row in graph_history.list_versions(conn)] == [1]
+    [archived] = glob.glob("g.graphml.history-v2-*.sqlite")
+    archive = sqlite3.connect(archived)
+    archive.row_factory = sqlite3.Row
+    assert [row["version"] for row in graph_history.list_versions(archive)] == [2, 1]
@@ -0,0 +1,113 @@
+from past_paper_analyzer import graph_store
+from past_paper_analyzer.compact_graph import CompactGraph
+
+
+def _add(node_id):
+    return lambda graph: graph.add_node(node_id, type="Note")
+
+
+def test_commit_changes_bumps_version_and_embeds_it():
+    graph_store.commit_changes(_add("a"), "g.graphml")
+    graph = graph_store.commit_changes(_add("b"), "g.graphml")
+    assert graph.graph["version"] == 2
+    loaded = graph_store.load_graph("g.graphml")
+    assert loaded.graph["version"] == 2
+    assert set(loaded.nodes) == {"a", "b"}
+    assert graph_store.load_compact_graph("g.graphml").version == 2
+
+
+def test_commit_changes_replays_onto_newer_graph():
+    graph_store.commit_changes(_add("a"), "g.graphml")
+    stale = graph_store.load_graph("g.graphml")
+    graph_store.commit_changes(_add("other-writer"), "g.graphml")
+
+    graph = graph_store.commit_changes(_add("mine"), "g.graphml", graph=stale)
+    assert {"a", "other-writer", "mine"} <= set(graph.nodes)
+    assert graph.graph["version"] == 3
+
+
+def test_commit_changes_gives_up_when_lock_is_held():
+    with graph_store.graph_lock("g.graphml"):
+        assert graph_store.commit_changes(_add("a"), "g.graphml", timeout=0.05) is None
+    assert graph_store.commit_changes(_add("a"), "g.graphml") is not None
+
+
+def test_commit_changes_leaves_an_unreadable_graph_alone():
+    graph_store.commit_changes(_add("a"), "g.graphml")
+    with open("g.graphml", "w") as f:
+        f.write("<graphml>truncated")
+
+    assert graph_store.commit_changes(_add("b"), "g.graphml") is None
+    # Also when the caller holds the empty graph load_graph gave for the unreadable file
+    empty = graph_store.load_graph("g.graphml")
+    assert graph_store.commit_changes(_add("b"), "g.graphml", graph=empty) is None
+    with open("g.graphml") as f:
+        assert f.read() == "<graphml>truncated"
+    assert graph_store._read_version("g.graphml") == 1
+
+
+def test_load_graph_never_tags_old_content_with_a_newer_version(monkeypatch):
+    graph_store.commit_changes(_add("a"), "g.graphml")
+    read_graphml = graph_store.nx.read_graphml
+
+    def read_then_concurrent_save(path, *args, **kwargs):
+        graph = read_graphml(path, *args, **kwargs)
+        monkeypatch.setattr(graph_store.nx, "read_graphml", read_graphml)
+        # Another writer saves after the content was read but before any version is checked
+        graph_store.commit_changes(_add("other-writer"), "g.graphml")
+        return graph
+
+    monkeypatch.setattr(graph_store.nx, "read_graphml", read_then_concurrent_save)
+    loaded = graph_store.load_graph("g.graphml")
+    assert set(loaded.nodes) == {"a"}
+    assert loaded.graph["version"] == 1
+
+    graph = graph_store.commit_changes(_add("mine"), "g.graphml", graph=loaded)
+    assert {"a", "other-writer", "mine"} <= set(graph.nodes)
+
+
+def test_compact_graph_round_trips_to_networkx():
+    graph = graph_store.load_graph("g.graphml")
+    graph_store.ingest_extraction(
+        graph,
+        {"year": 2022, "paper_code": "p06", "question_num": "q01"},
+        [{"concept_name": "Sorting", "definition": "Ordering items."}, {"concept_name": "Heaps"}],
+        course_module="Algorithms",
+    )
+    graph.add_node("note", type="Note", extra=1.5)
+    graph.add_node("other-note", type="Note", extra=2.5)
+    graph.add_node("untyped", label="x")
+    graph.add_edge("note", "other-note", type="SEE_ALSO")
+    assert graph_store.save_graph(graph, "g.graphml")
+
+    expected = graph_store.load_graph("g.graphml")
+    restored = graph_store.load_compact_graph("g.graphml").to_networkx()
+    # read_graphml also adds empty node_default/edge_default dicts
+    assert restored.graph == {k: v for k, v in expected.graph.items() if not k.endswith("_default")}
+    assert graph_store.has_co_occurrence(restored)
+    assert dict(restored.nodes(data=True)) == dict(expected.nodes(data=True))
+    assert restored.nodes["note"] == {"type": "Note", "extra": 1.5}
+    assert sorted(restored.edges(data=True)) == sorted(expected.edges(data=True))
+
+
+def test_compact_graph_keeps_equal_values_of_different_types_apart():
+    graph = graph_store.nx.DiGraph()
+    graph.add_node("a", type="Note", flag=1)
+    graph.add_node("b", type="Note", flag=True)
+    graph.add_node("c", type="Note", flag=1.0)
+
+    restored = CompactGraph.from_networkx(graph).to_networkx()
+    assert [type(restored.nodes[n]["flag"]) for n in "abc"] == [int, bool, float]
+
+
+def test_compact_graph_warns_about_edge_data_it_drops(caplog):
+    graph = graph_store.nx.DiGraph()
+    graph.add_nodes_from(["a", "b", "c"], type="Note")
+    graph.add_edge("a", "b", type="SEE_ALSO", note="x")
+    graph.add_edge("b", "c")
+    graph_store.save_graph(graph, "g.graphml")
+
+    compact = graph_store.load_compact_graph("g.graphml")
+    assert list(compact.edges("SEE_ALSO")) == [(0, 1)]
+    assert "Dropped 1 edge(s) without a type" in caplog.text
+    assert "note (1 edge(s))" in caplog.text
@@ -0,0 +1,60 @@
+from past_paper_analyzer import config, job_queue
+
+
+def _spec(question_num="q01", course_hint=None):
+    return {"year": 2022, "paper_code": "p06", "question_num": question_num, "course_hint": course_hint}
+
+
+def test_enqueue_skips_jobs_already_queued():
+    conn = job_queue.connect(":memory:")
+    assert job_queue.enqueue(conn, [_spec("q01"), _spec("q02")]) == 2
+    assert job_queue.enqueue(conn, [_spec("q02"), _spec("q03")]) == 1
+    pending = job_queue.jobs_in_state(conn, job_queue.STATE_PENDING)
+    assert [job["question_num"] for job in pending] == ["q01", "q02", "q03"]
+
+
+def test_advance_stores_results_and_clears_failures():
+    conn = job_queue.connect(":memory:")
+    job_queue.enqueue(conn, [_spec()])
+    job = job_queue.jobs_in_state(conn, job_queue.STATE_PENDING)[0]
+    job_queue.record_failure(conn, job, "download failed")
+
+    job_queue.advance(conn, job, job_queue.STATE_DOWNLOADED, pdf_path="downloads/x.pdf")
+    job_queue.advance(conn, job, job_queue.STATE_EXTRACTED, concepts=[{"concept_name": "Recursion"}])
+    [extracted] = job_queue.jobs_in_state(conn, job_queue.STATE_EXTRACTED)
+    assert extracted["pdf_path"] == "downloads/x.pdf"  # Kept when a later stage passes no path
+    assert extracted["concepts"] == [{"concept_name": "Recursion"}]
+    assert extracted["attempts"] == 0
+    assert extracted["error"] is None
+
+
+def test_exhausted_jobs_are_skipped_until_reset(monkeypatch):
+    monkeypatch.setattr(config, "JOB_MAX_ATTEMPTS", 2)
+    conn = job_queue.connect(":memory:")
+    job_queue.enqueue(conn, [_spec()])
+    job = job_queue.jobs_in_state(conn, job_queue.STATE_PENDING)[0]
+    job_queue.record_failure(conn, job, "404")
+    assert job_queue.jobs_in_state(conn, job_queue.STATE_PENDING)
+    job_queue.record_failure(conn, job, "404")
+
+    assert job_queue.jobs_in_state(conn, job_queue.STATE_PENDING) == []
+    assert len(job_queue.jobs_in_state(conn, job_queue.STATE_PENDING, include_exhausted=True)) == 1
+    assert job_queue.status_summary(conn)["exhausted"] == 1
+    assert job_queue.failed_jobs(conn)[0]["error"] == "404"
+
+    assert job_queue.reset_attempts(conn) == 1
+    assert job_queue.jobs_in_state(conn, job_queue.STATE_PENDING)
+
+
+def test_status_summary_counts_states_and_throughput():
+    conn = job_queue.connect(":memory:")
+    job_queue.enqueue(conn, [_spec("q01"), _spec("q02"), _spec("q03")])
+    for job in job_queue.jobs_in_state(conn, job_queue.STATE_PENDING)[:2]:
+        job_queue.advance(conn, job, job_queue.STATE_DOWNLOADED)
+    summary = job_queue.status_summary(conn)
+    assert summary["total"] == 3
+    assert summary["counts"][job_queue.STATE_PENDING] == 1
+    assert summary["counts"][job_queue.STATE_DOWNLOADED] == 2
+    # Two transitions within a burst are rated over at least a minute
+    assert summary["throughput"][job_queue.STATE_DOWNLOADED] == 2.0
+    assert summary["throughput"][job_queue.STATE_MERGED] == 0.0
@@ -0,0 +1,67 @@
+import os
+
+import pytest
+
+from past_paper_analyzer import benchmark, config, llm_extractor, metrics
+
+
+@pytest.fixture
+def stand_in(tmp_path, monkeypatch):
+    """Points the OpenAI backend at the benchmark's stand-in server; yields a function that starts one."""
+
+    def start(**options):
+        server = benchmark.StandInServer(str(tmp_path), **options).__enter__()
+        started.append(server)
+        monkeypatch.setattr(config, "LLM_BACKEND", "openai")
+        monkeypatch.setattr(config, "OPENAI_BASE_URL", f"{server.base_url}/v1")
+        monkeypatch.setattr(config, "OPENAI_API_KEY", "test")
+        return server
+
+    started = []
+    metrics.reset()
+    yield start
+    for server in started:
+        server.__exit__(None, None, None)
+
+
+def _messages(filename):
+    return [{"role": "user", "content": [{"type": "text", "text": f"List the concepts.\nSource file: {filename}"}]}]
+
+
+def test_counts_tokens_from_the_usage_event(stand_in):
+    stand_in()
+    answer = "".join(llm_extractor.stream_chat_completion(_messages("y2020p1q1.pdf")))
+
+    counters = metrics.snapshot()["counters"]
+    assert answer.startswith("```json")
+    assert counters["llm.calls"] == 1
+    assert counters["llm.prompt_tokens"] > 0
+    assert counters["llm.completion_tokens"] == counters["llm.stream_chunks"]
+
+
+def test_keeps_the_concepts_completed_before_the_answer_is_cut_off(stand_in, monkeypatch):
+    monkeypatch.setattr(llm_extractor, "prepare_pdf_pages", lambda pdf_path, *args, **kwargs: [])
+    stand_in(truncated={"y2020p1q1.pdf"})
+    concepts = list(llm_extractor.stream_concepts_from_pdf("y2020p1q1.pdf"))
+
+    expected = llm_extractor.fake_extract_concepts("y2020p1q1.pdf")
+    assert 0 < len(concepts) < len(expected)
+    assert concepts == expected[: len(concepts)]
+    report = metrics.snapshot()
+    assert report["counters"]["llm.truncated"] == 1
+    assert report["timers"]["extract.first_concept"]["count"] == 1
+
+
+def _die_on_crash_pdf(pdf_path):
+    if pdf_path == "crash.pdf":
+        os._exit(1)  # Like a worker OOM-killed while rendering
+    return pdf_path, [{"concept_name": pdf_path}], {}
+
+
+def test_batch_yields_empty_results_when_a_worker_dies(monkeypatch):
+    monkeypatch.setattr(llm_extractor, "_extract_worker", _die_on_crash_pdf)
+    paths = ["crash.pdf"] + [f"ok-{i}.pdf" for i in range(5)]
+
+    results = dict(llm_extractor.extract_concepts_batch(paths, workers=2))
+    assert set(results) == set(paths)
+    assert results["crash.pdf"] == []
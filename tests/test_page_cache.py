@@ -0,0 +1,70 @@
+import os
+
+import pytest
+
+from past_paper_analyzer import config, llm_extractor
+
+
+class _FakeImage:
+    """Stands in for a rendered PIL page; `fail` raises while it is being encoded."""
+
+    def __init__(self, fail=False):
+        self.fail = fail
+
+    def convert(self, mode):
+        if self.fail:
+            raise KeyboardInterrupt
+        return self
+
+    def save(self, path, format, quality):
+        with open(path, "wb") as f:
+            f.write(b"\xff\xd8jpeg")
+
+
+@pytest.fixture
+def pdf(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "PAGE_OPTIMIZE", False)
+    path = tmp_path / "2022-p06-q01-solutions.pdf"
+    path.write_bytes(b"%PDF-1.4 test")
+    return str(path)
+
+
+def test_interrupted_render_is_not_cached(pdf, tmp_path, monkeypatch):
+    cache_dir = str(tmp_path / "cache")
+    monkeypatch.setattr(llm_extractor, "convert_from_path", lambda *a, **k: [_FakeImage(), _FakeImage(fail=True)])
+    with pytest.raises(KeyboardInterrupt):
+        llm_extractor.prepare_pdf_pages(pdf, cache_dir)
+    assert os.listdir(cache_dir) == []  # Neither the page directory nor the temporary one is left behind
+
+    monkeypatch.setattr(llm_extractor, "convert_from_path", lambda *a, **k: [_FakeImage(), _FakeImage()])
+    pages = llm_extractor.prepare_pdf_pages(pdf, cache_dir)
+    assert [os.path.basename(p) for p in pages] == ["page-001.jpg", "page-002.jpg"]
+    assert all(os.path.exists(p) for p in pages)
+
+
+def test_cached_pages_are_reused(pdf, tmp_path, monkeypatch):
+    cache_dir = str(tmp_path / "cache")
+    calls = []
+
+    def render(*args, **kwargs):
+        calls.append(args)
+        return [_FakeImage()]
+
+    monkeypatch.setattr(llm_extractor, "convert_from_path", render)
+    first = llm_extractor.prepare_pdf_pages(pdf, cache_dir)
+    second = llm_extractor.prepare_pdf_pages(pdf, cache_dir)
+    assert first == second
+    assert len(calls) == 1
+
+
+def test_optimizer_settings_are_part_of_the_cache_key(pdf, tmp_path, monkeypatch):
+    pytest.importorskip("PIL")
+    from PIL import Image
+
+    cache_dir = str(tmp_path / "cache")
+    monkeypatch.setattr(config, "PAGE_OPTIMIZE", True)
+    monkeypatch.setattr(llm_extractor, "convert_from_path", lambda *a, **k: [Image.new("RGB", (600, 800), "black")])
+    first = llm_extractor.prepare_pdf_pages(pdf, cache_dir)
+    monkeypatch.setattr(config, "PAGE_DUPLICATE_DISTANCE", config.PAGE_DUPLICATE_DISTANCE + 1)
+    second = llm_extractor.prepare_pdf_pages(pdf, cache_dir)
+    assert os.path.dirname(first[0]) != os.path.dirname(second[0])
@@ -0,0 +1,50 @@
+import contextlib
+import threading
+import time
+
+from past_paper_analyzer import graph_store, query_api
+
+
+def _fixed_source():
+    graph = graph_store.load_graph("g.graphml")
+    graph_store.ingest_extraction(graph, {"year": 2022, "paper_code": "p06", "question_num": "q01"}, [{"concept_name": "Heaps"}])
+    return lambda: ("1", graph, contextlib.nullcontext())
+
+
+def test_response_cache_evicts_least_recently_used():
+    service = query_api.QueryService(_fixed_source(), cache_size=2)
+    service.handle("/concepts")
+    service.handle("/courses")
+    service.handle("/concepts")  # Hit: now the most recently used
+    service.handle("/papers")
+    assert [path for _, path, _ in service._cache] == ["/concepts", "/papers"]
+
+
+def test_file_source_reloads_in_the_background(monkeypatch):
+    graph_store.commit_changes(lambda g: g.add_node("a", type="Note"), "g.graphml")
+    source = query_api.file_source("g.graphml", check_interval=0)
+    version, graph, _ = source()
+    assert version == "1"
+
+    loading, release = threading.Event(), threading.Event()
+    load_graph = graph_store.load_graph
+
+    def slow_load(path):
+        loading.set()
+        assert release.wait(5)
+        return load_graph(path)
+
+    time.sleep(0.01)  # Let the sidecar mtime move on coarse-grained filesystems
+    graph_store.commit_changes(lambda g: g.add_node("b", type="Note"), "g.graphml")
+    monkeypatch.setattr(graph_store, "load_graph", slow_load)
+    assert source()[0] == "1"  # The reload started but requests keep the previous graph
+    assert loading.wait(5)
+    assert source()[0] == "1"
+    release.set()
+
+    deadline = time.monotonic() + 5
+    while source()[0] != "2" and time.monotonic() < deadline:
+        time.sleep(0.01)
+    version, graph, _ = source()
+    assert version == "2"
+    assert "b" in graph
@@ -0,0 +1,54 @@
+import pytest
+
+from past_paper_analyzer.stream_parser import ConceptStreamParser, parse_concepts
+
+ITEMS = '[{"concept_name": "Recursion", "definition": "A function calling itself."}, {"concept_name": "Heaps"}]'
+
+
+def _names(concepts):
+    return [concept["concept_name"] for concept in concepts]
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        ITEMS,
+        f"```json\n{ITEMS}\n```",
+        f"Here are the concepts [as JSON]:\n{ITEMS}\nLet me know [if] you need more.",
+        f'{{"note": "see [1] and {{this}}", "concepts": {ITEMS}}}',
+        'Sure! "Quoted" prose first.\n' + ITEMS,
+    ],
+)
+def test_finds_the_concept_array_around_surrounding_text(text):
+    concepts, truncated = parse_concepts(text)
+    assert _names(concepts) == ["Recursion", "Heaps"]
+    assert concepts[0]["definition"] == "A function calling itself."
+    assert not truncated
+
+
+def test_skips_malformed_and_non_object_elements():
+    parser = ConceptStreamParser()
+    concepts = parser.feed('[{"concept_name": "A"}, "note {not an object", [1, 2], {"name": "B"}, {"concept_name": "C ]"}]')
+    parser.close()
+    assert _names(concepts) == ["A", "C ]"]
+    assert parser.rejected == 2
+    assert not parser.truncated
+
+
+def test_truncated_output_keeps_completed_elements():
+    concepts, truncated = parse_concepts('```json\n[{"concept_name": "A"}, {"concept_name": "B", "defin')
+    assert _names(concepts) == ["A"]
+    assert truncated
+
+
+def test_empty_and_missing_arrays():
+    assert parse_concepts("[]") == ([], False)
+    assert parse_concepts("No concepts found.") == ([], True)
+
+
+def test_elements_are_returned_as_their_chunk_completes():
+    parser = ConceptStreamParser()
+    chunks = ['{"concepts": [{"concept_name": "Rec', 'ursion"}, {"concept_name": "He', 'aps"}]}']
+    assert [_names(parser.feed(chunk)) for chunk in chunks] == [[], ["Recursion"], ["Heaps"]]
+    parser.close()
+    assert not parser.truncated